@@ -3,3 +3,4 @@ from . import devices
 from . import vulnerabilities
 from . import platforms
 from . import weaknesses
+from . import platform_products
@@ -1,6 +1,13 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.models.device_match import DeviceMatch
 
+# Filas por sentencia INSERT ... ON CONFLICT (9 columnas × 5000 < 65535 parámetros de PostgreSQL)
+UPSERT_CHUNK_SIZE = 5000
+# Columnas que se refrescan en cada matching; solved y el id se conservan
+UPSERT_UPDATE_COLUMNS = ("matched_vendor", "matched_product", "match_type", "match_score", "needs_review", "timestamp")
+
 def mark_vulnerabilities_as_solved(db: Session, device_id: int, cve_ids: list[str]):
     db.query(DeviceMatch).filter(
         DeviceMatch.device_id == device_id,
@@ -23,3 +30,20 @@ def get_solved_cves_for_device(db: Session, device_id: int) -> list[str]:
         DeviceMatch.solved == True
     ).all()
     return [row.cve_id for row in results]
+
+
+def upsert_matches(db: Session, rows: list[dict]) -> int:
+    """
+    Inserta o actualiza coincidencias por (device_config_id, cve_name, cpe_uri)
+    en bloques, resolviendo los conflictos en la base de datos. No hace commit.
+    """
+    insert = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    affected = 0
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(DeviceMatch).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["device_config_id", "cve_name", "cpe_uri"],
+            set_={column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS}
+        )
+        affected += db.execute(stmt).rowcount
+    return affected
@@ -0,0 +1,86 @@
+# backend/app/crud/platform_products.py
+from sqlalchemy import select, func, distinct, literal, literal_column, delete, insert, update, DateTime
+from sqlalchemy.orm import Session
+from app.models.platform import Platform
+from app.models.cpe_title import CpeTitle
+from app.models.platform_product import PlatformProduct
+from datetime import datetime
+from app.services.normalization import preprocess, extended_normalize
+
+# Filas por lote al guardar las formas normalizadas
+NORMALIZE_BATCH_SIZE = 5000
+
+
+def refresh_platform_products(db: Session) -> int:
+    """Regenera el catálogo (vendor, product) a partir de platforms y cpe_titles."""
+    # literal_column para que SELECT y GROUP BY rendericen exactamente la misma expresión
+    product = func.coalesce(Platform.product, literal_column("''"))
+    if db.bind.dialect.name == "postgresql":
+        titles = func.string_agg(distinct(CpeTitle.value), literal("\n"))
+    else:
+        titles = func.group_concat(CpeTitle.value, "\n")
+
+    source = (
+        select(Platform.vendor, product, titles, literal(datetime.utcnow(), DateTime))
+        .select_from(Platform)
+        .outerjoin(CpeTitle, CpeTitle.platform_id == Platform.id)
+        .where(Platform.vendor.isnot(None))
+        .group_by(Platform.vendor, product)
+        .order_by(Platform.vendor, product)
+    )
+
+    db.execute(delete(PlatformProduct))
+    db.execute(
+        insert(PlatformProduct).from_select(
+            ["vendor", "product", "titles", "refreshed_at"], source
+        )
+    )
+    normalize_platform_products(db)
+    db.commit()
+    return db.query(func.count(PlatformProduct.id)).scalar()
+
+
+def normalize_platform_products(db: Session, only_missing: bool = False) -> int:
+    """
+    Calcula y guarda las formas normalizadas de vendor, product y títulos del
+    catálogo, para que el matching no tenga que normalizar el diccionario.
+    """
+    query = db.query(PlatformProduct.id, PlatformProduct.vendor, PlatformProduct.product, PlatformProduct.titles)
+    if only_missing:
+        query = query.filter(PlatformProduct.normalized_vendor.is_(None))
+
+    rows = []
+    for product_id, vendor, product, titles in query.yield_per(NORMALIZE_BATCH_SIZE):
+        normalized_titles = dict.fromkeys(
+            preprocess(title) for title in (titles or "").split("\n") if title
+        )
+        rows.append({
+            "id": product_id,
+            "normalized_vendor": preprocess(vendor),
+            "extended_vendor": extended_normalize(vendor),
+            "normalized_product": preprocess(product or ""),
+            "extended_product": extended_normalize(product or ""),
+            "normalized_titles": "\n".join(t for t in normalized_titles if t),
+        })
+
+    for start in range(0, len(rows), NORMALIZE_BATCH_SIZE):
+        db.execute(update(PlatformProduct), rows[start:start + NORMALIZE_BATCH_SIZE])
+    return len(rows)
+
+
+def is_empty(db: Session) -> bool:
+    return db.query(PlatformProduct.id).first() is None
+
+
+def get_refreshed_at(db: Session):
+    """Fecha de la última regeneración del catálogo (UTC)."""
+    return db.query(func.max(PlatformProduct.refreshed_at)).scalar()
+
+
+def get_vendor_products(db: Session, vendor: str):
+    return (
+        db.query(PlatformProduct.product, PlatformProduct.normalized_product, PlatformProduct.normalized_titles)
+        .filter(PlatformProduct.vendor == vendor)
+        .order_by(PlatformProduct.id)
+        .all()
+    )
@@ -0,0 +1,19 @@
+# backend/app/crud/sync_watermarks.py
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.models.sync_watermark import SyncWatermark
+
+
+def get_watermark(db: Session, name: str) -> datetime | None:
+    watermark = db.get(SyncWatermark, name)
+    return watermark.value if watermark else None
+
+
+def set_watermark(db: Session, name: str, value: datetime) -> None:
+    """Guarda la marca de agua (UTC) y hace commit."""
+    watermark = db.get(SyncWatermark, name)
+    if watermark is None:
+        db.add(SyncWatermark(name=name, value=value))
+    else:
+        watermark.value = value
+    db.commit()
@@ -8,11 +8,13 @@ from app.models import device_config
 import logging
 from rich.logging import RichHandler
 from app.routes import weaknesses
+from app.migrations import run_migrations
 
 
 
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 app = FastAPI(title="API de Identificación de Vulnerabilidades", version="1.0")
 
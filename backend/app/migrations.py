@@ -0,0 +1,191 @@
+# backend/app/migrations.py
+"""
+Migraciones ligeras e idempotentes que se ejecutan al arrancar, justo después
+de Base.metadata.create_all (que crea tablas nuevas pero no añade columnas ni
+índices a tablas que ya existen).
+"""
+from datetime import datetime
+from sqlalchemy import func, inspect, or_, text, update
+from sqlalchemy.orm import Session
+from app.database import Base
+from app.models.cve_cpe import CveCpe
+from app.crud import sync_watermarks as crud_watermarks
+from app.crud.platform_products import normalize_platform_products
+from app.services.utils import parse_cpe_components, CPE_COMPONENTS, version_range_keys
+
+# Filas por lote al rellenar columnas calculadas en Python
+BACKFILL_BATCH_SIZE = 5000
+# Marca en sync_watermarks de que el precálculo de rangos de versión ya se hizo
+VERSION_RANGE_KEYS_MARKER = "migration:version_range_keys"
+
+
+def add_missing_columns(engine, table_name: str, columns: list[str]) -> list[str]:
+    existing = {c["name"] for c in inspect(engine).get_columns(table_name)}
+    table = Base.metadata.tables[table_name]
+    added = []
+    with engine.begin() as conn:
+        for name in columns:
+            if name in existing:
+                continue
+            col_type = table.c[name].type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {col_type}"))
+            added.append(name)
+    if added:
+        print(f"🛠️ [MIGRATION] {table_name}: columnas añadidas {added}")
+    return added
+
+
+def create_missing_indexes(engine, table_name: str):
+    for index in Base.metadata.tables[table_name].indexes:
+        index.create(bind=engine, checkfirst=True)
+
+
+def _backfill_components_in_python(conn, table_name: str, pending_column: str):
+    uris = [row[0] for row in conn.execute(text(
+        f"SELECT DISTINCT cpe_uri FROM {table_name} WHERE {pending_column} IS NULL AND cpe_uri IS NOT NULL"
+    ))]
+    if not uris:
+        return
+    assignments = ", ".join(f"{c} = :{c}" for c in CPE_COMPONENTS)
+    rows = []
+    for uri in uris:
+        components = parse_cpe_components(uri)
+        # '' marca el CPE como ya procesado aunque no tenga el formato esperado
+        rows.append({"uri": uri, **{k: v if v is not None else "" for k, v in components.items()}})
+    conn.execute(text(f"UPDATE {table_name} SET {assignments} WHERE cpe_uri = :uri"), rows)
+    print(f"🛠️ [MIGRATION] {table_name}: {len(rows)} CPEs descompuestos en Python")
+
+
+def backfill_cpe_components(engine, table_name: str, pending_column: str):
+    """
+    Rellena part/vendor/product/version/target_sw/target_hw a partir de cpe_uri.
+    En PostgreSQL se hace con split_part; los CPE con ':' escapados y el resto
+    de motores pasan por parse_cpe_components.
+    """
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            positions = {"part": 3, "vendor": 4, "product": 5, "version": 6, "target_sw": 11, "target_hw": 12}
+            assignments = ", ".join(f"{c} = split_part(cpe_uri, ':', {positions[c]})" for c in CPE_COMPONENTS)
+            result = conn.execute(text(
+                f"UPDATE {table_name} SET {assignments} "
+                f"WHERE {pending_column} IS NULL AND strpos(cpe_uri, :escaped_colon) = 0"
+            ), {"escaped_colon": "\\:"})
+            if result.rowcount:
+                print(f"🛠️ [MIGRATION] {table_name}: {result.rowcount} filas rellenadas con split_part")
+        _backfill_components_in_python(conn, table_name, pending_column)
+
+
+def migrate_cpe_components(engine):
+    add_missing_columns(engine, "cve_cpe", list(CPE_COMPONENTS))
+    add_missing_columns(engine, "platforms", ["part", "target_sw", "target_hw"])
+    backfill_cpe_components(engine, "cve_cpe", "vendor")
+    backfill_cpe_components(engine, "platforms", "part")
+    create_missing_indexes(engine, "cve_cpe")
+    create_missing_indexes(engine, "platforms")
+
+
+def backfill_version_range_keys(engine):
+    """
+    Precalcula version_start_key/version_end_key de los cve_cpe con límites de
+    versión. Se hace una sola vez: después las escribe el importador, y los
+    límites sin clave posible (comodines) no se releen en cada arranque.
+    """
+    bounds = (
+        CveCpe.version_start_including, CveCpe.version_start_excluding,
+        CveCpe.version_end_including, CveCpe.version_end_excluding,
+    )
+    with Session(engine) as db:
+        if crud_watermarks.get_watermark(db, VERSION_RANGE_KEYS_MARKER) is not None:
+            return
+        query = db.query(CveCpe.cve_name, CveCpe.cpe_uri, *bounds).filter(
+            CveCpe.version_start_key.is_(None),
+            CveCpe.version_end_key.is_(None),
+            or_(*(func.coalesce(column, "") != "" for column in bounds)),
+        )
+        rows, total = [], 0
+        for cve_name, cpe_uri, *row_bounds in query.yield_per(BACKFILL_BATCH_SIZE):
+            rows.append({"cve_name": cve_name, "cpe_uri": cpe_uri, **version_range_keys(*row_bounds)})
+            if len(rows) == BACKFILL_BATCH_SIZE:
+                db.execute(update(CveCpe), rows)
+                total += len(rows)
+                rows = []
+        if rows:
+            db.execute(update(CveCpe), rows)
+            total += len(rows)
+        crud_watermarks.set_watermark(db, VERSION_RANGE_KEYS_MARKER, datetime.utcnow())
+    if total:
+        print(f"🛠️ [MIGRATION] cve_cpe: {total} rangos de versión precalculados")
+
+
+def migrate_version_range_keys(engine):
+    add_missing_columns(engine, "cve_cpe", [
+        "version_start_key", "version_start_inclusive", "version_end_key", "version_end_inclusive"
+    ])
+    backfill_version_range_keys(engine)
+
+
+def migrate_incremental_matching(engine):
+    # Las filas de cve_cpe ya existentes quedan con imported_at NULL (anteriores a cualquier matching)
+    add_missing_columns(engine, "cve_cpe", ["imported_at"])
+    add_missing_columns(engine, "device_config", ["fingerprint", "last_matched_at"])
+    create_missing_indexes(engine, "cve_cpe")
+
+
+def dedupe_device_matches(engine):
+    """
+    Elimina coincidencias repetidas por (device_config_id, cve_name, cpe_uri)
+    antes de crear el índice único; se conserva la más antigua y solved si
+    alguna de las repetidas estaba marcada.
+    """
+    existing = {index["name"] for index in inspect(engine).get_indexes("device_matches")}
+    if "uq_device_matches_config_cve_cpe" in existing:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE device_matches SET solved = TRUE WHERE solved = FALSE AND EXISTS ("
+            "SELECT 1 FROM device_matches d WHERE d.device_config_id = device_matches.device_config_id "
+            "AND d.cve_name = device_matches.cve_name AND d.cpe_uri = device_matches.cpe_uri AND d.solved = TRUE)"
+        ))
+        result = conn.execute(text(
+            "DELETE FROM device_matches WHERE id NOT IN ("
+            "SELECT MIN(id) FROM device_matches GROUP BY device_config_id, cve_name, cpe_uri)"
+        ))
+    if result.rowcount:
+        print(f"🛠️ [MIGRATION] device_matches: {result.rowcount} coincidencias duplicadas eliminadas")
+
+
+def migrate_device_match_uniqueness(engine):
+    dedupe_device_matches(engine)
+    create_missing_indexes(engine, "device_matches")
+
+
+def migrate_normalized_catalogue(engine):
+    add_missing_columns(engine, "platform_products", [
+        "normalized_vendor", "extended_vendor", "normalized_product", "extended_product", "normalized_titles"
+    ])
+    create_missing_indexes(engine, "platform_products")
+    with Session(engine) as db:
+        normalized = normalize_platform_products(db, only_missing=True)
+        db.commit()
+    if normalized:
+        print(f"🛠️ [MIGRATION] platform_products: {normalized} productos normalizados")
+
+
+def migrate_cpe_content_hash(engine):
+    # Las plataformas ya importadas quedan con hash NULL y se reescriben en la primera sincronización delta
+    add_missing_columns(engine, "platforms", ["content_hash"])
+
+
+MIGRATIONS = [
+    migrate_cpe_components,
+    migrate_version_range_keys,
+    migrate_incremental_matching,
+    migrate_device_match_uniqueness,
+    migrate_normalized_catalogue,
+    migrate_cpe_content_hash,
+]
+
+
+def run_migrations(engine):
+    for migration in MIGRATIONS:
+        migration(engine)
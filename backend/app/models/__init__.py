@@ -13,3 +13,5 @@ from .vulnerability import Vulnerability
 from .weakness import Weakness
 from .user import User
 from app.models.device_match import DeviceMatch
+from .platform_product import PlatformProduct
+from .sync_watermark import SyncWatermark
@@ -1,5 +1,9 @@
-from sqlalchemy import Column, String, ForeignKey, PrimaryKeyConstraint
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, PrimaryKeyConstraint, Index
 from app.database import Base
+from datetime import datetime
+
+# Las claves de versión se comparan byte a byte; en PostgreSQL se fuerza la collation "C"
+VersionKey = String().with_variant(String(collation="C"), "postgresql")
 
 class CveCpe(Base):
     __tablename__ = "cve_cpe"
@@ -11,6 +15,24 @@ class CveCpe(Base):
     version_end_including = Column(String, nullable=True)
     version_end_excluding = Column(String, nullable=True)
 
+    # Componentes del cpe_uri, rellenados al importar para buscar por igualdad
+    part = Column(String, nullable=True)
+    vendor = Column(String, nullable=True)
+    product = Column(String, nullable=True)
+    version = Column(String, nullable=True)
+    target_sw = Column(String, nullable=True)
+    target_hw = Column(String, nullable=True)
+
+    # Límites de versión precalculados con version_sort_key para filtrar rangos en SQL
+    version_start_key = Column(VersionKey, nullable=True)
+    version_start_inclusive = Column(Boolean, nullable=True)
+    version_end_key = Column(VersionKey, nullable=True)
+    version_end_inclusive = Column(Boolean, nullable=True)
+
+    # Marca de agua para el rematch incremental: solo se evalúan filas nuevas
+    imported_at = Column(DateTime, default=datetime.utcnow, index=True)
+
     __table_args__ = (
         PrimaryKeyConstraint("cve_name", "cpe_uri"),
+        Index("ix_cve_cpe_vendor_product_version", "vendor", "product", "version"),
     )
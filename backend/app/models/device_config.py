@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -12,6 +12,10 @@ class DeviceConfig(Base):
     product = Column(String, nullable=False)
     version = Column(String, nullable=True)
 
+    # Huella de (vendor, product, version) y fecha del último matching, para el rematch incremental
+    fingerprint = Column(String, nullable=True)
+    last_matched_at = Column(DateTime, nullable=True)
+
     # Relaciones
     device = relationship("Device", back_populates="config")
     matches = relationship("DeviceMatch", back_populates="device_config", cascade="all, delete-orphan")
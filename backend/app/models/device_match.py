@@ -1,7 +1,7 @@
 # Paso 1: Crear modelo `DeviceMatch`
 # Archivo: backend/app/models/device_match.py
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from sqlalchemy import ForeignKeyConstraint
@@ -37,5 +37,7 @@ class DeviceMatch(Base):
             ["cve_cpe.cve_name", "cve_cpe.cpe_uri"],
             ondelete="CASCADE"
         ),
+        # Una coincidencia por configuración y CPE vulnerable; destino del upsert del matching
+        Index("uq_device_matches_config_cve_cpe", "device_config_id", "cve_name", "cpe_uri", unique=True),
     )
 
@@ -1,5 +1,5 @@
 # backend/app/models/platform.py
-from sqlalchemy import Column, Integer, String, Boolean, Table, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Table, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -10,11 +10,15 @@ class Platform(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     cpe_uri = Column(String, unique=True, index=True)  # cpe.cpeName
+    part = Column(String, nullable=True)
     vendor = Column(String, index=True)
     product = Column(String, index=True)
     version = Column(String, index=True)
+    target_sw = Column(String, nullable=True)
+    target_hw = Column(String, nullable=True)
     deprecated = Column(Boolean, default=False)         # deprecated
     imported_at = Column(DateTime, default=datetime.utcnow)
+    content_hash = Column(String, nullable=True)        # sha1 del cpe-item (sincronización delta)
 
     vulnerabilities = relationship(
         "Vulnerability",
@@ -31,5 +35,6 @@ class Platform(Base):
         cascade="all, delete-orphan"
     )
 
-
-
+    __table_args__ = (
+        Index("ix_platforms_vendor_product_version", "vendor", "product", "version"),
+    )
@@ -0,0 +1,30 @@
+# backend/app/models/platform_product.py
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint
+from app.database import Base
+from datetime import datetime
+
+
+class PlatformProduct(Base):
+    """
+    Catálogo materializado de pares (vendor, product) distintos del diccionario CPE.
+    Lo regenera el importador de CPEs; el matching trabaja sobre él en lugar de
+    sobre una fila por versión en `platforms`.
+    """
+    __tablename__ = "platform_products"
+
+    id = Column(Integer, primary_key=True, index=True)
+    vendor = Column(String, nullable=False, index=True)
+    product = Column(String, nullable=False)
+    titles = Column(Text, nullable=True)  # títulos de todas las versiones, separados por salto de línea
+
+    # Formas normalizadas (preprocess / extended_normalize) calculadas al regenerar el catálogo
+    normalized_vendor = Column(String, nullable=True, index=True)
+    extended_vendor = Column(String, nullable=True)
+    normalized_product = Column(String, nullable=True)
+    extended_product = Column(String, nullable=True)
+    normalized_titles = Column(Text, nullable=True)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("vendor", "product", name="uq_platform_products_vendor_product"),
+    )
@@ -0,0 +1,16 @@
+# backend/app/models/sync_watermark.py
+from sqlalchemy import Column, String, DateTime
+from app.database import Base
+from datetime import datetime
+
+
+class SyncWatermark(Base):
+    """
+    Marca de agua de una sincronización incremental con una fuente externa
+    (p. ej. la fecha lastModified de NVD hasta la que ya se han traído CVEs).
+    """
+    __tablename__ = "sync_watermarks"
+
+    name = Column(String, primary_key=True)
+    value = Column(DateTime, nullable=False)  # UTC
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
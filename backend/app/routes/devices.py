@@ -16,11 +16,11 @@ from app.models.device_match import DeviceMatch
 from app.models.device_config import DeviceConfig
 from sqlalchemy import func
 from app.models.vulnerability import Vulnerability
-from app.schemas.device import CVEMarkRequest
+from app.schemas.device import CVEMarkRequest, FleetMatchRequest
 from fastapi import status
 from sqlalchemy import desc
 from app.services import import_status_matching
-from fastapi import BackgroundTasks
+from app.services import matching_jobs
 
 
 router = APIRouter()
@@ -118,6 +118,7 @@ def get_device_matches(device_id: int, db: Session = Depends(get_db), current_us
 @router.post("/devices/{device_id}/match-platforms/refresh")
 def refresh_device_matches(
     device_id: int,
+    incremental: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -125,7 +126,7 @@ def refresh_device_matches(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    result = match_platforms_for_device(device_id, db)
+    result = match_platforms_for_device(device_id, db, incremental=incremental)
     print(f"🔁 Matching ejecutado: {len(result['results'])} configs procesadas")
     return result["summary"]
 
@@ -244,13 +245,21 @@ def get_last_device_matching(device_id: int, db: Session = Depends(get_db), curr
 
 @router.get("/devices/{device_id}/match-status")
 def get_match_status(device_id: int):
-    from app.services import import_status_matching
-    return {"running": import_status_matching.is_matching_active(device_id)}
+    job = matching_jobs.executor.get_job(device_id)
+    return {
+        "running": import_status_matching.is_matching_active(device_id),
+        "status": job.status if job else None,
+    }
+
+@router.get("/devices/match-cache/stats")
+def get_match_cache_stats(current_user: User = Depends(get_current_user)):
+    from app.services import match_cache
+    return match_cache.get_cache_stats()
 
 @router.post("/devices/{device_id}/match-start")
 def start_matching_background(
     device_id: int,
-    background_tasks: BackgroundTasks,
+    incremental: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -258,29 +267,40 @@ def start_matching_background(
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
 
-    if import_status_matching.is_matching_active(device_id):
+    job = matching_jobs.executor.submit([device_id], priority=matching_jobs.PRIORITY_INTERACTIVE, incremental=incremental)
+    if job is None:
         return {"status": "already_running"}
+    return {"status": "started", "job_id": job.job_id}
 
-    import_status_matching.set_matching_active(device_id, True)
-    import_status_matching.reset_matching_progress(device_id)
-
-    def run_matching():
-        try:
-            generator = match_platforms_for_device(device_id, db, yield_progress=True)
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            async def consume():
-                async for msg in generator:
-                    import_status_matching.append_matching_progress(device_id, msg)
-            loop.run_until_complete(consume())
-        except Exception as e:
-            import_status_matching.append_matching_progress(device_id, f"[ERROR] {str(e)}")
-        finally:
-            import_status_matching.clear_matching_status(device_id)
-            import_status_matching.append_matching_progress(device_id, "[DONE]")
-
-    background_tasks.add_task(run_matching)
-    return {"status": "started"}
+@router.post("/devices/{device_id}/match-cancel")
+def cancel_matching(
+    device_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    device = db.query(models.Device).filter_by(id=device_id, user_id=current_user.id).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Device not found")
+
+    if not matching_jobs.executor.cancel_device(device_id):
+        return {"status": "not_running"}
+    return {"status": "cancelling"}
+
+@router.post("/devices/match-all")
+def start_fleet_matching_background(
+    request: FleetMatchRequest = Body(default=FleetMatchRequest()),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    query = db.query(models.Device.id).filter_by(user_id=current_user.id)
+    if request.device_ids:
+        query = query.filter(models.Device.id.in_(request.device_ids))
+    device_ids = [device_id for (device_id,) in query.all()]
+
+    job = matching_jobs.executor.submit(device_ids, priority=matching_jobs.PRIORITY_FLEET, incremental=request.incremental)
+    if job is None:
+        return {"status": "no_devices", "devices": []}
+    return {"status": "started", "job_id": job.job_id, "devices": job.device_ids}
 
 @router.get("/devices/{device_id}/config/with-cves", response_model=list[dict])
 def get_configs_with_cves(
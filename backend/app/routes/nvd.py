@@ -18,10 +18,14 @@ from app.models.user import User
 from app.services import import_status_cve
 import json
 import asyncio
+from functools import partial
 from sqlalchemy import text
 from app.services import import_status_cpe
 from app.services import import_status_cwe
 from app.services import import_all_cwes_stream
+from app.services.matching_index import invalidate_matching_index
+from app.crud import platform_products as crud_platform_products
+from app.services import match_cache
 
 
 from app.services.importer import import_all_cpes_stream  # asegúrate de crear esta función
@@ -62,6 +66,8 @@ def delete_cpes_background():
     try:
         deleted = db.query(Platform).delete()
         db.commit()
+        crud_platform_products.refresh_platform_products(db)
+        invalidate_matching_index()
         print(f"🧹 [DEBUG] Eliminados {deleted} CPEs en background.")
     finally:
         db.close()
@@ -78,8 +84,9 @@ def list_cpes():
 
 
 @router.post("/cpe-import-all-from-xml", status_code=status.HTTP_202_ACCEPTED)
-def import_all_cpes_from_xml_ep():
-    imported_count = import_cpes_from_xml()
+def import_all_cpes_from_xml_ep(delta: bool = False):
+    # Endpoint síncrono: FastAPI lo ejecuta en su threadpool y espera al pipeline completo
+    imported_count = import_cpes_from_xml(delta=delta)
     return JSONResponse(
         status_code=status.HTTP_202_ACCEPTED,
         content={"message": f"{imported_count} CPEs imported successfully from XML."}
@@ -139,6 +146,7 @@ def delete_all_cves():
     try:
         db.execute(text("TRUNCATE TABLE vulnerabilities CASCADE"))
         db.commit()
+        match_cache.bump_cve_generation()
         return {"message": "Todos los CVEs eliminados correctamente."}
     except Exception as e:
         db.rollback()
@@ -172,7 +180,7 @@ async def stream_cpe_import(request: Request):
 import threading
 
 @router.post("/cpe-import-start", status_code=status.HTTP_202_ACCEPTED)
-async def launch_cpe_import():
+async def launch_cpe_import(delta: bool = False):
     from app.services.cpe_importer import import_all_cpes_stream
 
     if import_status_cpe.is_running():
@@ -184,7 +192,7 @@ async def launch_cpe_import():
         # Si tu función espera corutinas, crea un event loop aquí:
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(import_status_cpe.start_background_import(import_all_cpes_stream))
+        loop.run_until_complete(import_status_cpe.start_background_import(partial(import_all_cpes_stream, delta=delta)))
         loop.close()
 
     thread = threading.Thread(target=run_import, daemon=True)
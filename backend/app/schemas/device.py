@@ -46,4 +46,8 @@ class Config:
 
 class CVEMarkRequest(BaseModel):
     cve_ids: List[str]
-    
\ No newline at end of file
+
+
+class FleetMatchRequest(BaseModel):
+    device_ids: Optional[List[int]] = None
+    incremental: bool = False
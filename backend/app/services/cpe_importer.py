@@ -1,24 +1,25 @@
 from .imports import *
+import io
 import os
+import json
+import hashlib
 import requests
-import gzip
+import zlib
 import xml.etree.ElementTree as ET
-import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import multiprocessing
 from app.services import import_status_cpe
+from app.services.matching_index import invalidate_matching_index
+from app.services.cpe_loader import load_cpe_batch
 import asyncio
 from datetime import datetime
 
 
 from app.database import SessionLocal
-from app.crud import platforms as crud_platforms
-from app.crud import cpe_titles as crud_titles
-from app.crud import cpe_references as crud_references
-from app.crud import cpe_deprecated_by as crud_deprecated
+from app.crud import platform_products as crud_platform_products
 from app.models.platform import Platform
-from app.schemas.cpe_deprecated_by import CpeDeprecatedByCreate
-from app.schemas.cpe_reference import CPEReferenceCreate
-from app.schemas.cpe_title import CpeTitleCreate
-from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime
 import xml.etree.ElementTree as ET
 
@@ -27,9 +28,28 @@ import logging
 logger = logging.getLogger(__name__)
 
 CPE_XML_URL = "https://nvd.nist.gov/feeds/xml/cpe/dictionary/official-cpe-dictionary_v2.3.xml.gz"
-CPE_XML_GZ_PATH = "data/official-cpe-dictionary_v2.3.xml.gz"
 CPE_XML_PATH = "data/official-cpe-dictionary_v2.3.xml"
 
+# Trozos de la descarga del diccionario (comprimidos) que se descomprimen de una vez
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+# cpe-items que se parsean y guardan de una vez durante la importación
+CPE_IMPORT_BATCH_SIZE = 10000
+
+# Parseo en paralelo: procesos del pool y bytes de XML (cpe-items completos) por tarea.
+# Con un solo proceso se parsea en el propio hilo con iterparse.
+CPE_PARSE_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+CPE_PARSE_CHUNK_BYTES = 4 * 1024 * 1024
+
+CPE_NS = {
+    'cpe-23': 'http://scap.nist.gov/schema/cpe-extension/2.3',
+    'cpe-lang': 'http://cpe.mitre.org/dictionary/2.0'
+}
+CPE_ITEM_TAG = '{http://cpe.mitre.org/dictionary/2.0}cpe-item'
+CPE_ITEM_END = b'</cpe-item>'
+XML_LANG = '{http://www.w3.org/XML/1998/namespace}lang'
+
 
 def parse_cpe_uri(uri: str) -> tuple[str, str, str]:
     try:
@@ -65,21 +85,78 @@ def extract_cpes_from_node(node: dict) -> list[str]:
     return cpes
 
 
-def download_cpe_xml_if_needed():
-    from datetime import datetime
-    import os
-    import requests
-    import gzip
-
-    def log(msg):
-        print(f"[CPE XML] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {msg}")
-
-    os.makedirs('data', exist_ok=True)
+class GunzipResponseReader(io.RawIOBase):
+    """
+    Fichero binario de solo lectura que descomprime al vuelo una respuesta HTTP
+    gzip descargada por trozos. Opcionalmente copia el XML descomprimido en
+    `tee_path`; la copia solo se renombra a su ruta final si se leyó entera.
+    """
+
+    def __init__(self, response, tee_path: str | None = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        self._response = response
+        self._chunks = response.iter_content(chunk_size=chunk_size)
+        # 16 + MAX_WBITS: formato gzip (cabecera y CRC), no zlib crudo
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = b''
+        self._eof = False
+        self.compressed_total = int(response.headers.get('Content-Length') or 0)
+        self.compressed_read = 0
+        self._tee_path = tee_path
+        self._tee = open(tee_path + '.part', 'wb') if tee_path else None
+
+    def readable(self):
+        return True
+
+    def fraction(self) -> float:
+        if not self.compressed_total:
+            return 0.0
+        return min(1.0, self.compressed_read / self.compressed_total)
+
+    def _fill(self):
+        for chunk in self._chunks:
+            self.compressed_read += len(chunk)
+            data = self._decompressor.decompress(chunk)
+            # Ficheros con varios miembros gzip concatenados
+            while self._decompressor.unused_data:
+                rest = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                data += self._decompressor.decompress(rest)
+            if data:
+                return data
+        self._eof = True
+        return self._decompressor.flush()
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer and not self._eof:
+            self._buffer = self._fill()
+            if self._tee and self._buffer:
+                self._tee.write(self._buffer)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        self._response.close()
+        if self._tee:
+            self._tee.close()
+            if self._eof:
+                os.replace(self._tee_path + '.part', self._tee_path)
+            else:
+                os.remove(self._tee_path + '.part')
+        super().close()
+
+
+def request_cpe_xml(url: str = CPE_XML_URL, path: str = CPE_XML_PATH, log=print):
+    """
+    Pide el diccionario gzip a NVD en modo streaming. Devuelve la respuesta
+    abierta si hay una versión más reciente que el XML local, o None si no.
+    """
     last_modified_local = None
-
-    log("Comprobando existencia de archivo XML local...")
-    if os.path.exists(CPE_XML_PATH):
-        last_modified_timestamp = os.path.getmtime(CPE_XML_PATH)
+    if os.path.exists(path):
+        last_modified_timestamp = os.path.getmtime(path)
         last_modified_local = datetime.utcfromtimestamp(last_modified_timestamp).strftime('%a, %d %b %Y %H:%M:%S GMT')
         log('📄 Archivo XML local ya existe. Comprobando si hay versión nueva en NVD...')
     else:
@@ -89,177 +166,386 @@ def download_cpe_xml_if_needed():
     if last_modified_local:
         headers['If-Modified-Since'] = last_modified_local
 
-    log(f"Realizando petición HTTP a {CPE_XML_URL} con If-Modified-Since: {headers.get('If-Modified-Since', 'NO')}")
-    response = requests.get(CPE_XML_URL, headers=headers)
+    log(f"Realizando petición HTTP a {url} con If-Modified-Since: {headers.get('If-Modified-Since', 'NO')}")
+    response = requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT)
 
     if response.status_code == 304:
+        response.close()
         log('✅ No hay versión nueva del CPE XML en NVD. No se descarga de nuevo.')
-        return
+        return None
 
     if response.status_code != 200:
+        response.close()
         log(f"❌ Error HTTP al descargar el XML de CPE: {response.status_code}")
         raise Exception(f'❌ Error al descargar el XML de CPE: {response.status_code}')
 
-    log('Descarga completada. Guardando archivo .gz temporal...')
-    with open(CPE_XML_GZ_PATH, 'wb') as f:
-        f.write(response.content)
+    return response
 
-    log('📦 Descomprimiendo archivo .gz...')
-    with gzip.open(CPE_XML_GZ_PATH, 'rb') as f_in:
-        with open(CPE_XML_PATH, 'wb') as f_out:
-            f_out.write(f_in.read())
-    os.remove(CPE_XML_GZ_PATH)
-    log('✅ Nueva versión de CPE XML descargada, descomprimida y lista para usar.')
 
+def download_cpe_xml_if_needed(url: str = CPE_XML_URL, path: str = CPE_XML_PATH):
+    def log(msg):
+        print(f"[CPE XML] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} {msg}")
 
-async def import_cpes_from_xml(filepath: str = CPE_XML_PATH) -> int:
-    print("🚀 Iniciando importación de CPEs...")
-    download_cpe_xml_if_needed()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    log("Comprobando existencia de archivo XML local...")
+    response = request_cpe_xml(url, path, log)
+    if response is None:
+        return
 
-    print("📥 Parseando XML...")
-    tree = ET.parse(filepath)
-    root = tree.getroot()
-    ns = {
-        'cpe-23': 'http://scap.nist.gov/schema/cpe-extension/2.3',
-        'cpe-lang': 'http://cpe.mitre.org/dictionary/2.0'
-    }
+    # Descarga y descompresión por trozos directamente al XML, sin .gz intermedio
+    log('📦 Descargando y descomprimiendo por trozos...')
+    with GunzipResponseReader(response, tee_path=path) as reader:
+        while reader.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+    log('✅ Nueva versión de CPE XML descargada, descomprimida y lista para usar.')
 
-    db = SessionLocal()
-    imported = 0
 
+@contextmanager
+def open_cpe_xml(url: str = CPE_XML_URL, path: str = CPE_XML_PATH):
+    """
+    Abre el diccionario para parsearlo. Si NVD tiene una versión nueva, el
+    parser lee directamente de la descarga (mientras se guarda en `path`), sin
+    esperar a que termine; si no, lee el XML local.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    response = request_cpe_xml(url, path, lambda msg: print(f"[CPE XML] {msg}"))
+    source = GunzipResponseReader(response, tee_path=path) if response is not None else open(path, 'rb')
     try:
-        print("📋 Obteniendo URIs ya existentes en BD...")
-        existing_cpes = set((p.cpe_uri for p in crud_platforms.get_all_uris(db)))
-
-        platforms_to_insert = []
-        titles_to_insert = []
-        references_to_insert = []
-        deprecated_by_to_insert = []
-
-        print("🔍 Buscando cpe-items en XML...")
-        items = root.findall('.//{*}cpe-item')
-        total = len(items)
-        print(f'📦 Total CPEs en XML: {total}')
-
-        print("🛠️ Fase 1: Extrayendo plataformas nuevas...")
-        for idx, item in enumerate(items, start=1):
-            if idx % 10000 == 0:
-                print(f"  🔸 Analizados {idx}/{total} cpe-items...")
-
-            cpe_23 = item.find('cpe-23:cpe23-item', ns)
-            if cpe_23 is None:
-                continue
-            cpe_name = cpe_23.attrib.get('name')
-            if not cpe_name or not cpe_name.startswith('cpe:2.3:'):
-                continue
-            if cpe_name not in existing_cpes:
-                vendor, product, version = parse_cpe_uri(cpe_name)
-                platforms_to_insert.append({
-                    'cpe_uri': cpe_name,
-                    'vendor': vendor,
-                    'product': product,
-                    'version': version,
-                    'deprecated': item.attrib.get('deprecated', 'false') == 'true'
-                })
-
-        print(f"📨 Plataformas a insertar: {len(platforms_to_insert)}")
-        if platforms_to_insert:
-            print("📥 Insertando plataformas en BD por bloques...")
-            batch_size = 1000
-            inserted_count = 0
-            total = len(platforms_to_insert)
-
-            for i in range(0, total, batch_size):
-                batch = platforms_to_insert[i:i+batch_size]
-                stmt = insert(Platform).values(batch)
-                stmt = stmt.on_conflict_do_nothing(index_elements=['cpe_uri'])
-                result = db.execute(stmt)
-                db.commit()
-
-                inserted_now = result.rowcount or len(batch)
-                inserted_count += inserted_now
-
-
-                print(f"🧩 Insertadas {inserted_count}/{total} plataformas...")
-
-            imported = inserted_count
-            print(f'✅ Plataformas insertadas: {imported}')
-
-
-        print("📌 Cargando todas las plataformas para mapear IDs...")
-        all_platforms = db.query(Platform).all()
-        platforms_by_uri = {p.cpe_uri: p.id for p in all_platforms}
-        print(f'📚 Total plataformas en BD: {len(platforms_by_uri)}')
-
-        print("🛠️ Fase 2: Extrayendo titles, references y deprecated-by...")
-        for idx, item in enumerate(items, start=1):
-            if idx % 100 == 0:
-                print(f"🧩 Procesando entrada {idx} de {total}")
-            if idx % 1000 == 0 or idx == total:
-                print(f"🔄 Procesando CPEs {idx - 999} a {idx} de {total}...")
-
-
-            cpe_23 = item.find('cpe-23:cpe23-item', ns)
-            if cpe_23 is None:
-                continue
-            cpe_name = cpe_23.attrib.get('name')
-            if not cpe_name or not cpe_name.startswith('cpe:2.3:'):
-                continue
-
-            platform_id = platforms_by_uri.get(cpe_name)
-            if platform_id is None:
-                logger.warning(f'❗ No se encontró platform_id para {cpe_name}')
+        yield source
+    finally:
+        source.close()
+
+
+def read_fraction(xml_file) -> float:
+    """Fracción ya leída del XML (descarga comprimida o fichero local)."""
+    if isinstance(xml_file, GunzipResponseReader):
+        return xml_file.fraction()
+    size = os.fstat(xml_file.fileno()).st_size
+    return xml_file.tell() / size if size else 1.0
+
+
+def parse_cpe_item(item) -> dict | None:
+    """Extrae platform, titles, references y deprecated-by de un <cpe-item>."""
+    cpe_23 = item.find('cpe-23:cpe23-item', CPE_NS)
+    if cpe_23 is None:
+        return None
+    cpe_name = cpe_23.attrib.get('name')
+    if not cpe_name or not cpe_name.startswith('cpe:2.3:'):
+        return None
+
+    titles = [
+        (t.attrib.get(XML_LANG, 'en'), t.text or '')
+        for t in item.findall('cpe-lang:title', CPE_NS)
+    ]
+    references = []
+    refs_parent = item.find('cpe-lang:references', CPE_NS)
+    if refs_parent is not None:
+        for ref in refs_parent.findall('cpe-lang:reference', CPE_NS):
+            href = ref.attrib.get('href')
+            if href:
+                references.append((href, ref.text or ''))
+    deprecated_by = []
+    deprecation = cpe_23.find('cpe-23:deprecation', CPE_NS)
+    if deprecation is not None:
+        for dep in deprecation.findall('cpe-23:deprecated-by', CPE_NS):
+            name = dep.attrib.get('name')
+            if name:
+                deprecated_by.append(name)
+
+    parsed = {
+        'cpe_uri': cpe_name,
+        'deprecated': item.attrib.get('deprecated', 'false') == 'true',
+        'titles': titles,
+        'references': references,
+        'deprecated_by': deprecated_by,
+    }
+    parsed['content_hash'] = cpe_item_hash(parsed)
+    return parsed
+
+
+def cpe_item_hash(item: dict) -> str:
+    """Huella del contenido de un cpe-item para detectar cambios en la sincronización delta."""
+    content = json.dumps(
+        [item['deprecated'], item['titles'], item['references'], item['deprecated_by']],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def iter_cpe_items(source):
+    """
+    Recorre los <cpe-item> del diccionario con iterparse sin construir el árbol
+    completo: cada item se libera en cuanto se ha extraído, así que la memoria
+    no depende del tamaño del XML. `source` es una ruta o un fichero binario.
+    """
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end' or elem.tag != CPE_ITEM_TAG:
+            continue
+        parsed = parse_cpe_item(elem)
+        # Vacía la raíz para soltar el item y los hijos ya procesados
+        root.clear()
+        if parsed is not None:
+            yield parsed
+
+
+def iter_cpe_batches(source, batch_size: int = CPE_IMPORT_BATCH_SIZE):
+    batch = []
+    for item in iter_cpe_items(source):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_cpe_chunks(source, chunk_bytes: int = CPE_PARSE_CHUNK_BYTES, read_size: int = DOWNLOAD_CHUNK_SIZE):
+    """
+    Trocea el XML en documentos independientes con cpe-items completos, sin
+    parsearlo: cada trozo se corta tras el último </cpe-item> que cabe en
+    chunk_bytes (salvo que un solo cpe-item sea mayor) y se envuelve con la
+    etiqueta <cpe-list ...> original para conservar los espacios de nombres.
+    """
+    buffer = bytearray()
+    header = None
+    while True:
+        block = source.read(read_size)
+        if block:
+            buffer += block
+        if header is None:
+            start = buffer.find(b'<cpe-list')
+            end = buffer.find(b'>', start) if start != -1 else -1
+            if end == -1:
+                if not block:
+                    return
                 continue
+            header = bytes(buffer[start:end + 1])
+            del buffer[:end + 1]
+        while len(buffer) >= chunk_bytes or (not block and buffer):
+            cut = buffer.rfind(CPE_ITEM_END, 0, chunk_bytes)
+            if cut == -1:
+                # Un cpe-item mayor que chunk_bytes va solo en su trozo
+                cut = buffer.find(CPE_ITEM_END)
+                if cut == -1:
+                    break
+            cut += len(CPE_ITEM_END)
+            yield header + bytes(buffer[:cut]) + b'</cpe-list>'
+            del buffer[:cut]
+        if not block:
+            return
+
+
+def parse_cpe_chunk(chunk: bytes) -> list[dict]:
+    """Parsea un trozo de iter_cpe_chunks (se ejecuta en los procesos del pool)."""
+    root = ET.fromstring(chunk)
+    items = (parse_cpe_item(item) for item in root.iter(CPE_ITEM_TAG))
+    return [item for item in items if item is not None]
+
+
+def rebatch(batches, batch_size: int):
+    """Reagrupa bloques de tamaño variable en bloques de batch_size (el último puede ser menor)."""
+    buffer = []
+    for batch in batches:
+        buffer.extend(batch)
+        while len(buffer) >= batch_size:
+            yield buffer[:batch_size]
+            del buffer[:batch_size]
+    if buffer:
+        yield buffer
+
+
+def iter_parsed_chunks(source, workers: int, chunk_bytes: int):
+    """Trozos de iter_cpe_chunks parseados en un pool de procesos, en orden."""
+    # spawn: el proceso de la API tiene hilos (matching, SSE) y fork no es seguro con ellos
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    pending = deque()
+    try:
+        for chunk in iter_cpe_chunks(source, chunk_bytes):
+            pending.append(pool.submit(parse_cpe_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def iter_parsed_batches(
+    source,
+    workers: int = CPE_PARSE_WORKERS,
+    batch_size: int = CPE_IMPORT_BATCH_SIZE,
+    chunk_bytes: int = CPE_PARSE_CHUNK_BYTES,
+):
+    """
+    Bloques de batch_size cpe-items parseados del XML. Con varios procesos, el
+    hilo que llama solo lee bytes y guarda resultados: los trozos (de como mucho
+    chunk_bytes) se parsean en un pool con un número acotado de tareas en vuelo
+    (memoria constante) y se entregan en orden, de modo que el parseo del
+    siguiente trozo se solapa con la escritura del anterior.
+    """
+    if workers <= 1:
+        yield from iter_cpe_batches(source, batch_size)
+        return
+    yield from rebatch(iter_parsed_chunks(source, workers, chunk_bytes), batch_size)
+
+
+class CpeImportPipeline:
+    """
+    Importación del diccionario CPE por etapas, común a todos los endpoints:
+    descarga → parseo → normalización → carga → refresco del catálogo y del
+    índice de matching. Las etapas trabajan por bloques en streaming y el
+    progreso se notifica con `progress(event)` (los mismos eventos que el SSE).
+    El método run() es bloqueante.
+    """
+
+    def __init__(
+        self,
+        filepath: str | None = None,
+        delta: bool = False,
+        batch_size: int = CPE_IMPORT_BATCH_SIZE,
+        chunk_bytes: int = CPE_PARSE_CHUNK_BYTES,
+        workers: int = CPE_PARSE_WORKERS,
+        progress=None,
+        should_stop=None,
+    ):
+        self.filepath = filepath
+        self.delta = delta
+        self.batch_size = batch_size
+        self.chunk_bytes = chunk_bytes
+        self.workers = workers
+        self.progress = progress
+        self.should_stop = should_stop or (lambda: False)
+        self.stats = {"processed": 0, "platforms": 0, "titles": 0, "references": 0, "deprecated_by": 0, "stopped": False}
+
+    def emit(self, event: dict):
+        if self.progress is not None:
+            self.progress(event)
+
+    @property
+    def inserted_rows(self) -> int:
+        return sum(self.stats[key] for key in ("platforms", "titles", "references", "deprecated_by"))
+
+    # 1️⃣ Descarga: XML local indicado o diccionario de NVD (parseado mientras se descarga)
+    def download(self):
+        if self.filepath:
+            return open(self.filepath, 'rb')
+        return open_cpe_xml()
+
+    # 2️⃣ Parseo en bloques de cpe-items
+    def parse(self, source):
+        return iter_parsed_batches(source, self.workers, self.batch_size, self.chunk_bytes)
+
+    # 3️⃣ Normalización: un cpe_uri repetido dentro del bloque se guarda una vez (el último)
+    @staticmethod
+    def normalize(batch: list[dict]) -> list[dict]:
+        return list({item['cpe_uri'].strip(): item for item in batch}.values())
+
+    # 4️⃣ Carga en BD
+    def load(self, db, batch: list[dict]):
+        counts = load_cpe_batch(db, batch, delta=self.delta)
+        for key, value in counts.items():
+            self.stats[key] += value
+
+    # 5️⃣ Catálogo (vendor, product) e índice de matching
+    def refresh(self, db):
+        print("[CPE IMPORT] 🟡 Regenerando catálogo (vendor, product)...")
+        crud_platform_products.refresh_platform_products(db)
+        invalidate_matching_index()
+
+    def run(self) -> dict:
+        from sqlalchemy import func
 
-            for t in item.findall('cpe-lang:title', ns):
-                lang = t.attrib.get('{http://www.w3.org/XML/1998/namespace}lang', 'en')
-                value = t.text or ''
-                titles_to_insert.append(CpeTitleCreate(platform_id=platform_id, lang=lang, value=value))
-
-            refs_parent = item.find('cpe-lang:references', ns)
-            if refs_parent is not None:
-                for ref in refs_parent.findall('cpe-lang:reference', ns):
-                    href = ref.attrib.get('href')
-                    text = ref.text or ''
-                    if not href:
-                        continue
-                    references_to_insert.append(CPEReferenceCreate(platform_id=platform_id, ref=href, type=text))
-
-            deprecated = cpe_23.find('cpe-23:deprecation', ns)
-            if deprecated is not None:
-                for dep in deprecated.findall('cpe-23:deprecated-by', ns):
-                    name = dep.attrib.get('name')
-                    if not name:
-                        continue
-                    deprecated_by_to_insert.append(CpeDeprecatedByCreate(platform_id=platform_id, cpe_uri=name))
-
-        print(f'📝 Titles: {len(titles_to_insert)} | 🔗 References: {len(references_to_insert)} | ⚠️ DeprecatedBy: {len(deprecated_by_to_insert)}')
-
-        if titles_to_insert:
-            print("📥 Insertando titles...")
-            crud_titles.create_multi(db, titles_to_insert)
-
-        references_valid = [r for r in references_to_insert if r.platform_id is not None]
-        if references_valid:
-            print("🔗 Insertando referencias...")
-            crud_references.create_multi(db, references_valid)
-
-        deprecated_valid = [d for d in deprecated_by_to_insert if d.platform_id is not None]
-        if deprecated_valid:
-            print("⚠️ Insertando relaciones deprecated-by...")
-            crud_deprecated.create_multi(db, deprecated_valid)
-
-        db.commit()
-        print('🎉 Importación de titles, references y deprecated-by completada.')
+        db = SessionLocal()
+        try:
+            print("[CPE IMPORT] 🟡 Contando CPEs existentes en BD...")
+            self.emit({"label": "cpe.getting_existing"})
+            existing_count = db.query(func.count(Platform.id)).scalar()
+            if existing_count == 0:
+                print("[CPE IMPORT] 🟡 Ningún CPE detectado en la BD.")
+                self.emit({"label": "cpe.no_cpes_found"})
+            else:
+                print(f"[CPE IMPORT] 🟡 {miles(existing_count)} CPEs detectados en la BD.")
+                self.emit({"label": "cpe.existing_count", "count": miles(existing_count)})
+
+            print(f"[CPE IMPORT] 🟢 Descargando/validando XML{' (delta)' if self.delta else ''}")
+            self.emit({"label": "cpe.downloading_xml"})
+            with self.download() as source:
+                self.emit({"label": "cpe.xml_checked"})
+                print("[CPE IMPORT] 🟡 Parseando XML e insertando CPEs por bloques...")
+                self.emit({"label": "cpe.parsing_xml"})
+                # Progreso porcentual sobre lo leído: el total de items no se conoce de antemano
+                self.emit({
+                    "type": "start_inserting",
+                    "label": "cpe.inserting_items",
+                    "total_to_insert": 100,
+                    "imported": 0,
+                    "count": 0,
+                    "percentage": 0,
+                })
 
+                batches = self.parse(source)
+                try:
+                    for batch in batches:
+                        if self.should_stop():
+                            print("[CPE IMPORT] 🛑 Importación detenida por el usuario")
+                            self.stats["stopped"] = True
+                            break
+                        self.load(db, self.normalize(batch))
+                        self.stats["processed"] += len(batch)
+                        percent = int(read_fraction(source) * 100)
+                        print(f"[CPE IMPORT]   ... procesados {self.stats['processed']} items, {self.inserted_rows} filas insertadas ({percent}%)")
+                        self.emit({
+                            "type": "start_inserting",
+                            "imported": self.inserted_rows,
+                            "total_to_insert": 100,
+                            "count": miles(self.stats["processed"]),
+                            "percentage": percent,
+                            "label": "cpe.inserting_items"
+                        })
+                finally:
+                    batches.close()
+
+            if self.stats["stopped"]:
+                # Importación parcial: no se regenera el catálogo ni el índice a partir de ella
+                print(f"[CPE IMPORT] 🛑 Importación parcial, sin regenerar el catálogo: {self.stats}")
+                self.emit({
+                    "type": "done",
+                    "label": "cpe.aborted_by_user",
+                    "stage": "stopped",
+                    "imported": self.inserted_rows,
+                    "count": miles(self.stats["processed"]),
+                })
+                return self.stats
+
+            self.refresh(db)
+            print(f"[CPE IMPORT] 🟢 Importación completada: {self.stats}")
+            return self.stats
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def import_cpes_from_xml(filepath: str | None = None, delta: bool = False) -> int:
+    """
+    Front end síncrono del pipeline: importa el diccionario CPE (de NVD, o del
+    XML local indicado) y devuelve las plataformas insertadas o actualizadas.
+    Con delta=True también reescribe las plataformas cuyo content_hash cambió.
+    """
+    print(f"🚀 Iniciando importación de CPEs{' (delta)' if delta else ''}...")
+    pipeline = CpeImportPipeline(filepath=filepath, delta=delta)
+    try:
+        pipeline.run()
     except Exception as e:
         logger.exception(f'❌ Error durante la importación de CPEs: {e}')
-        db.rollback()
-    finally:
-        db.close()
-
-    print("✅ Proceso completo de importación finalizado.")
-    return imported
+    if pipeline.stats["stopped"]:
+        print("🛑 Importación de CPEs detenida: resultado parcial.")
+    else:
+        print("✅ Proceso completo de importación finalizado.")
+    return pipeline.stats["platforms"]
 
 
 
@@ -293,202 +579,23 @@ def miles(n):
     return f"{n:,}".replace(",", ".")            
 
 
-async def import_all_cpes_stream():
-    import os
-    import xml.etree.ElementTree as ET
-    from app.crud.platforms import get_all_uris
-    from app.crud.cpe_titles import create_multi as create_titles_multi
-    from app.crud.cpe_references import create_multi as create_refs_multi
-    from app.crud.cpe_deprecated_by import create_multi as create_deprecated_multi
-    from app.models.platform import Platform
-    from app.schemas.cpe_deprecated_by import CpeDeprecatedByCreate
-    from app.schemas.cpe_reference import CPEReferenceCreate
-    from app.schemas.cpe_title import CpeTitleCreate
-    from sqlalchemy.dialects.postgresql import insert
+async def import_all_cpes_stream(delta: bool = False):
+    """Front end con progreso por SSE: el pipeline corre en un hilo y publica sus eventos en este loop."""
+    loop = asyncio.get_running_loop()
+
+    def progress(event: dict):
+        asyncio.run_coroutine_threadsafe(import_status_cpe.publish(event), loop).result()
 
     try:
         print("[CPE IMPORT] 🟢 Paso 1: Spinner y mensaje de conexión")
         import_status_cpe.start(resource="cpe", label="cpe.connecting_nvd")
 
-        print("[CPE IMPORT] 🟢 Paso 2: Descargando/validando XML y parseando")
-        await import_status_cpe.publish({"label": "cpe.downloading_xml"})
-        download_cpe_xml_if_needed()
-        await import_status_cpe.publish({"label": "cpe.xml_checked"})
-        print("[CPE IMPORT] 🟢 XML comprobado/descargado")
-
-        print("[CPE IMPORT] 🟡 Parseando XML...")
-        await import_status_cpe.publish({"label": "cpe.parsing_xml"})
-
-        tree = ET.parse(CPE_XML_PATH)
-        root = tree.getroot()
-        items = root.findall('.//{*}cpe-item')
-        await import_status_cpe.publish({
-            "label": "cpe.parsing_completed",
-            "count": miles(len(items))
-        })
-        print(f"[CPE IMPORT] 🟢 Parseo completado: {len(items)} items encontrados")
-
-        from app.database import SessionLocal
-        db = SessionLocal()
-        print("[CPE IMPORT] 🟡 Obteniendo CPEs existentes en BD...")
-        await import_status_cpe.publish({"label": "cpe.getting_existing"})
-        existing_cpes = set([row[0] for row in get_all_uris(db)])
-        print(f"[CPE IMPORT] 🟢 CPEs existentes en BD: {len(existing_cpes)}")
-        if len(existing_cpes) == 0:
-            print("[CPE IMPORT] 🟡 Ningún CPE detectado en la BD.")
-            await import_status_cpe.publish({
-                "label": "cpe.no_cpes_found"
-            })
+        pipeline = CpeImportPipeline(delta=delta, progress=progress, should_stop=import_status_cpe.should_stop)
+        stats = await asyncio.to_thread(pipeline.run)
+        if stats["stopped"]:
+            import_status_cpe.stopped(resource="cpe", imported=pipeline.inserted_rows, total=stats["processed"], label="cpe.aborted_by_user")
         else:
-            print(f"[CPE IMPORT] 🟡 {miles(len(existing_cpes))} CPEs detectados en la BD.")
-            await import_status_cpe.publish({
-                "label": "cpe.existing_count",
-                "count": miles(len(existing_cpes))
-            })
-
-        platforms_to_insert = []
-        titles_to_insert = []
-        references_to_insert = []
-        deprecated_by_to_insert = []
-
-        ns = {
-            'cpe-23': 'http://scap.nist.gov/schema/cpe-extension/2.3',
-            'cpe-lang': 'http://cpe.mitre.org/dictionary/2.0'
-        }
-
-        print("[CPE IMPORT] 🟡 Recorriendo items del XML (solo nuevos CPEs)...")
-        for idx, item in enumerate(items, start=1):
-            if idx % 100000 == 0:
-                print(f"[CPE IMPORT]   ... procesados {idx}/{len(items)}")
-                await import_status_cpe.publish({"label": "cpe.processing_items", "count": miles(idx), "total": miles(len(items))})
-            cpe_23 = item.find('cpe-23:cpe23-item', ns)
-            if cpe_23 is None:
-                continue
-            cpe_name = cpe_23.attrib.get('name')
-            if not cpe_name or not cpe_name.startswith('cpe:2.3:'):
-                continue
-            if cpe_name not in existing_cpes:
-                vendor, product, version = "", "", ""
-                try:
-                    parts = cpe_name.split(":")
-                    vendor, product, version = parts[3], parts[4], parts[5]
-                except Exception:
-                    pass
-                platforms_to_insert.append({
-                    'cpe_uri': cpe_name,
-                    'vendor': vendor,
-                    'product': product,
-                    'version': version,
-                    'deprecated': item.attrib.get('deprecated', 'false') == 'true'
-                })
-                for t in item.findall('cpe-lang:title', ns):
-                    lang = t.attrib.get('{http://www.w3.org/XML/1998/namespace}lang', 'en')
-                    value = t.text or ''
-                    titles_to_insert.append({'cpe_uri': cpe_name, 'lang': lang, 'value': value})
-                refs_parent = item.find('cpe-lang:references', ns)
-                if refs_parent is not None:
-                    for ref in refs_parent.findall('cpe-lang:reference', ns):
-                        href = ref.attrib.get('href')
-                        text = ref.text or ''
-                        if not href:
-                            continue
-                        references_to_insert.append({'cpe_uri': cpe_name, 'ref': href, 'type': text})
-                deprecated = cpe_23.find('cpe-23:deprecation', ns)
-                if deprecated is not None:
-                    for dep in deprecated.findall('cpe-23:deprecated-by', ns):
-                        name = dep.attrib.get('name')
-                        if not name:
-                            continue
-                        deprecated_by_to_insert.append({'cpe_uri': cpe_name, 'cpe_uri_by': name})
-
-        total_platforms = len(platforms_to_insert)
-        total_titles = len(titles_to_insert)
-        total_refs = len(references_to_insert)
-        total_deprecated = len(deprecated_by_to_insert)
-        TOTAL_TO_INSERT = total_platforms + total_titles + total_refs + total_deprecated
-
-        BATCH_SIZE = 10000
-        imported_total = 0
-        progress_total = 0  # Acumulado de todo lo insertado
-
-        # Nueva barra de progreso global para la inserción
-        async def send_progress():
-            percent = int(progress_total / TOTAL_TO_INSERT * 100) if TOTAL_TO_INSERT else 100
-            await import_status_cpe.publish({
-                "type": "start_inserting",
-                "imported": progress_total,
-                "total_to_insert": TOTAL_TO_INSERT,
-                "percentage": percent,
-                "label": "cpe.inserting_items"
-            })
-
-        await import_status_cpe.publish({
-            "type": "start_inserting",
-            "label": "cpe.inserting_items",
-            "total_to_insert": TOTAL_TO_INSERT,
-            "imported": 0,
-            "percentage": 0,
-        })
-
-        # PLATFORMS
-        print("[CPE IMPORT] 🟡 Insertando platforms en BD...")
-        for i in range(0, total_platforms, BATCH_SIZE):
-            batch = platforms_to_insert[i:i+BATCH_SIZE]
-            stmt = insert(Platform).values(batch)
-            stmt = stmt.on_conflict_do_nothing(index_elements=['cpe_uri'])
-            result = db.execute(stmt)
-            db.commit()
-            imported_now = result.rowcount or len(batch)
-            imported_total += imported_now
-            progress_total += imported_now
-            await send_progress()
-
-        # Remapeo IDs (igual que antes)
-        all_platforms = db.query(Platform).all()
-        platforms_by_uri = {p.cpe_uri: p.id for p in all_platforms}
-
-        # TITLES
-        titles_objs = []
-        for t in titles_to_insert:
-            pid = platforms_by_uri.get(t['cpe_uri'])
-            if pid is not None:
-                titles_objs.append(CpeTitleCreate(platform_id=pid, lang=t['lang'], value=t['value']))
-        print(f"[CPE IMPORT] 🟡 Insertando titles en BD ({len(titles_objs)})...")
-        for i in range(0, len(titles_objs), BATCH_SIZE):
-            batch = titles_objs[i:i+BATCH_SIZE]
-            create_titles_multi(db, batch)
-            progress_total += len(batch)
-            await send_progress()
-
-        # REFERENCES
-        refs_objs = []
-        for r in references_to_insert:
-            pid = platforms_by_uri.get(r['cpe_uri'])
-            if pid is not None:
-                refs_objs.append(CPEReferenceCreate(platform_id=pid, ref=r['ref'], type=r['type']))
-        print(f"[CPE IMPORT] 🟡 Insertando references en BD ({len(refs_objs)})...")
-        for i in range(0, len(refs_objs), BATCH_SIZE):
-            batch = refs_objs[i:i+BATCH_SIZE]
-            create_refs_multi(db, batch)
-            progress_total += len(batch)
-            await send_progress()
-
-        # DEPRECATED-BY
-        deprecated_objs = []
-        for d in deprecated_by_to_insert:
-            pid = platforms_by_uri.get(d['cpe_uri'])
-            if pid is not None:
-                deprecated_objs.append(CpeDeprecatedByCreate(platform_id=pid, cpe_uri=d['cpe_uri_by']))
-        print(f"[CPE IMPORT] 🟡 Insertando deprecated-by en BD ({len(deprecated_objs)})...")
-        for i in range(0, len(deprecated_objs), BATCH_SIZE):
-            batch = deprecated_objs[i:i+BATCH_SIZE]
-            create_deprecated_multi(db, batch)
-            progress_total += len(batch)
-            await send_progress()
-
-        db.commit()
-        print("[CPE IMPORT] 🟢 Importación completada.")
-        import_status_cpe.finish(resource="cpe", imported=progress_total, total=TOTAL_TO_INSERT, label="cpe.import_completed")
+            import_status_cpe.finish(resource="cpe", imported=pipeline.inserted_rows, total=stats["processed"], label="cpe.import_completed")
 
     except Exception as e:
         print(f"[CPE IMPORT] ❌ Error: {str(e)}")
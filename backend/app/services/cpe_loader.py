@@ -0,0 +1,214 @@
+# backend/app/services/cpe_loader.py
+"""
+Carga masiva de bloques del diccionario CPE (platforms, cpe_titles,
+cpe_references y cpe_deprecated_by).
+
+En PostgreSQL cada bloque se vuelca con COPY FROM STDIN a tablas temporales de
+staging y se integra con SQL por conjuntos: las plataformas nuevas se insertan
+con ON CONFLICT DO NOTHING y las filas hijas se resuelven con un JOIN por
+cpe_uri contra los ids devueltos. En SQLite (pruebas y benchmarks) se inserta
+con ON CONFLICT DO NOTHING ... RETURNING y las filas hijas con executemany.
+En ningún caso se recarga la tabla platforms para mapear cpe_uri -> id.
+
+En modo delta las plataformas existentes cuyo content_hash ha cambiado también
+se actualizan y sus filas hijas se reescriben; las que no cambian no se tocan.
+"""
+import io
+from datetime import datetime
+from sqlalchemy import delete, insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.platform import Platform
+from app.models.cpe_title import CpeTitle
+from app.models.cpe_reference import CPEReference
+from app.models.cpe_deprecated_by import CpeDeprecatedBy
+from app.services.utils import parse_cpe_components
+
+# Filas por INSERT ... RETURNING (11 columnas × 2500 < 32766 parámetros de SQLite)
+RETURNING_CHUNK_SIZE = 2500
+
+PLATFORM_COLUMNS = ("cpe_uri", "part", "vendor", "product", "version", "target_sw", "target_hw", "deprecated", "content_hash")
+# Columnas que cambian al actualizar una plataforma existente en modo delta
+DELTA_UPDATE_COLUMNS = ("deprecated", "content_hash", "imported_at")
+CHILD_TABLES = ("cpe_titles", "cpe_references", "cpe_deprecated_by")
+
+# Tablas temporales de la sesión; ON COMMIT DELETE ROWS las vacía tras cada bloque
+STAGING_TABLES = {
+    "cpe_stage_platforms": (
+        "cpe_uri text, part text, vendor text, product text, version text, "
+        "target_sw text, target_hw text, deprecated boolean, content_hash text"
+    ),
+    "cpe_stage_titles": "cpe_uri text, lang text, value text",
+    "cpe_stage_references": "cpe_uri text, ref text, type text",
+    "cpe_stage_deprecated_by": "cpe_uri text, cpe_uri_by text",
+    "cpe_stage_new": "id integer, cpe_uri text",
+}
+
+MERGE_PLATFORMS = """
+    WITH inserted AS (
+        INSERT INTO platforms (cpe_uri, part, vendor, product, version, target_sw, target_hw, deprecated, content_hash, imported_at)
+        SELECT DISTINCT ON (cpe_uri) cpe_uri, part, vendor, product, version, target_sw, target_hw, deprecated, content_hash, :imported_at
+        FROM cpe_stage_platforms
+        {on_conflict}
+        RETURNING id, cpe_uri
+    )
+    INSERT INTO cpe_stage_new (id, cpe_uri) SELECT id, cpe_uri FROM inserted
+"""
+ON_CONFLICT_INSERT = "ON CONFLICT (cpe_uri) DO NOTHING"
+ON_CONFLICT_DELTA = (
+    "ON CONFLICT (cpe_uri) DO UPDATE SET "
+    + ", ".join(f"{c} = EXCLUDED.{c}" for c in DELTA_UPDATE_COLUMNS)
+    + " WHERE platforms.content_hash IS DISTINCT FROM EXCLUDED.content_hash"
+)
+MERGE_CHILDREN = {
+    "titles": """
+        INSERT INTO cpe_titles (platform_id, lang, value)
+        SELECT n.id, s.lang, s.value FROM cpe_stage_titles s JOIN cpe_stage_new n ON n.cpe_uri = s.cpe_uri
+    """,
+    "references": """
+        INSERT INTO cpe_references (platform_id, ref, type)
+        SELECT n.id, s.ref, s.type FROM cpe_stage_references s JOIN cpe_stage_new n ON n.cpe_uri = s.cpe_uri
+    """,
+    "deprecated_by": """
+        INSERT INTO cpe_deprecated_by (platform_id, cpe_uri)
+        SELECT n.id, s.cpe_uri_by FROM cpe_stage_deprecated_by s JOIN cpe_stage_new n ON n.cpe_uri = s.cpe_uri
+    """,
+}
+
+
+def platform_row(item: dict) -> dict:
+    return {
+        "cpe_uri": item["cpe_uri"],
+        **parse_cpe_components(item["cpe_uri"]),
+        "deprecated": item["deprecated"],
+        "content_hash": item.get("content_hash"),
+    }
+
+
+def child_rows(item: dict) -> dict:
+    """Filas hijas de un cpe-item, aún con cpe_uri en lugar de platform_id."""
+    uri = item["cpe_uri"]
+    return {
+        "titles": [(uri, lang, value) for lang, value in item["titles"]],
+        "references": [(uri, href, ref_type) for href, ref_type in item["references"]],
+        "deprecated_by": [(uri, name) for name in item["deprecated_by"]],
+    }
+
+
+def _copy_value(value) -> str:
+    """Valor en el formato text de COPY (\\N para NULL, escapes con barra invertida)."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_rows(cursor, table: str, columns: tuple, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(v) for v in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _ensure_staging_tables(db: Session):
+    for table, columns in STAGING_TABLES.items():
+        db.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {table} ({columns}) ON COMMIT DELETE ROWS"))
+
+
+def _load_batch_copy(db: Session, batch: list[dict], delta: bool) -> dict:
+    _ensure_staging_tables(db)
+    children = {"titles": [], "references": [], "deprecated_by": []}
+    for item in batch:
+        for key, rows in child_rows(item).items():
+            children[key].extend(rows)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        _copy_rows(
+            cursor, "cpe_stage_platforms", PLATFORM_COLUMNS,
+            (tuple(platform_row(item)[c] for c in PLATFORM_COLUMNS) for item in batch),
+        )
+        _copy_rows(cursor, "cpe_stage_titles", ("cpe_uri", "lang", "value"), children["titles"])
+        _copy_rows(cursor, "cpe_stage_references", ("cpe_uri", "ref", "type"), children["references"])
+        _copy_rows(cursor, "cpe_stage_deprecated_by", ("cpe_uri", "cpe_uri_by"), children["deprecated_by"])
+    finally:
+        cursor.close()
+
+    merge = MERGE_PLATFORMS.format(on_conflict=ON_CONFLICT_DELTA if delta else ON_CONFLICT_INSERT)
+    counts = {"platforms": db.execute(text(merge), {"imported_at": datetime.utcnow()}).rowcount}
+    if delta:
+        # Las plataformas actualizadas se quedan con las filas hijas del XML actual
+        for table in CHILD_TABLES:
+            db.execute(text(f"DELETE FROM {table} WHERE platform_id IN (SELECT id FROM cpe_stage_new)"))
+    for key, sql in MERGE_CHILDREN.items():
+        counts[key] = db.execute(text(sql)).rowcount
+    db.commit()
+    return counts
+
+
+def _load_batch_returning(db: Session, batch: list[dict], delta: bool) -> dict:
+    """
+    Una sola pasada sin COPY: las plataformas se insertan con ON CONFLICT DO
+    NOTHING ... RETURNING y los ids devueltos resuelven las filas hijas.
+    """
+    imported_at = datetime.utcnow()
+    platforms = [{**platform_row(item), "imported_at": imported_at} for item in batch]
+    platforms_by_uri = {}
+    for start in range(0, len(platforms), RETURNING_CHUNK_SIZE):
+        stmt = sqlite_insert(Platform.__table__).values(platforms[start:start + RETURNING_CHUNK_SIZE])
+        if delta:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["cpe_uri"],
+                set_={column: stmt.excluded[column] for column in DELTA_UPDATE_COLUMNS},
+                where=Platform.__table__.c.content_hash.is_distinct_from(stmt.excluded.content_hash),
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["cpe_uri"])
+        stmt = stmt.returning(Platform.id, Platform.cpe_uri)
+        platforms_by_uri.update((uri, platform_id) for platform_id, uri in db.execute(stmt))
+    counts = {"platforms": len(platforms_by_uri)}
+
+    if delta and platforms_by_uri:
+        ids = list(platforms_by_uri.values())
+        for model in (CpeTitle, CPEReference, CpeDeprecatedBy):
+            for start in range(0, len(ids), RETURNING_CHUNK_SIZE):
+                db.execute(delete(model).where(model.platform_id.in_(ids[start:start + RETURNING_CHUNK_SIZE])))
+
+    children = {"titles": [], "references": [], "deprecated_by": []}
+    for item in batch:
+        platform_id = platforms_by_uri.pop(item["cpe_uri"], None)
+        if platform_id is None:
+            continue  # ya existía sin cambios (o repetido dentro del bloque)
+        children["titles"].extend({"platform_id": platform_id, "lang": lang, "value": value} for lang, value in item["titles"])
+        children["references"].extend({"platform_id": platform_id, "ref": href, "type": ref_type} for href, ref_type in item["references"])
+        children["deprecated_by"].extend({"platform_id": platform_id, "cpe_uri": name} for name in item["deprecated_by"])
+
+    for model, key in ((CpeTitle, "titles"), (CPEReference, "references"), (CpeDeprecatedBy, "deprecated_by")):
+        if children[key]:
+            db.execute(insert(model.__table__), children[key])
+        counts[key] = len(children[key])
+    db.commit()
+    return counts
+
+
+def load_cpe_batch(db: Session, batch: list[dict], delta: bool = False) -> dict:
+    """
+    Guarda los cpe-items del bloque (de iter_cpe_items) que aún no están en
+    platforms, con sus titles, references y deprecated-by, en una transacción.
+    Con delta=True también reescribe los que han cambiado. Devuelve las filas
+    insertadas por tabla.
+    """
+    if not batch:
+        return {"platforms": 0, "titles": 0, "references": 0, "deprecated_by": 0}
+    if db.get_bind().dialect.name == "postgresql":
+        return _load_batch_copy(db, batch, delta)
+    return _load_batch_returning(db, batch, delta)
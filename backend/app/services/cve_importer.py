@@ -1,10 +1,11 @@
-import os
+import asyncio
 import json
 from datetime import datetime
 from typing import List, Tuple
-from sqlalchemy import select, text, func
+from sqlalchemy import select, text, func, or_, tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from app.database import SessionLocal
 from app.models.vulnerability import Vulnerability
@@ -12,14 +13,17 @@ from app.models.cve_description import CveDescription
 from app.models.cve_reference import CveReference
 from app.models.cve_cpe import CveCpe
 from app.models.cve_cwe import CveCwe
+from app.models.device_match import DeviceMatch
 from app.schemas.vulnerability import VulnerabilityCreate
 from app.services.nvd import (
-    get_all_cve_ids,
     get_total_cve_count_from_nvd,
-    get_cves_by_id,
-    get_cves_by_page
+    iter_cve_pages,
+    iter_modified_cve_pages
 )
+from app.crud import sync_watermarks as crud_watermarks
 from app.services import import_status_cve
+from app.services import match_cache
+from app.services.utils import parse_cpe_components, version_range_keys
 from app.services.imports import (
     extract_all_cpes,
     extract_cvss_data,
@@ -27,6 +31,16 @@ from app.services.imports import (
 )
 
 
+# Marca de agua de la sincronización delta: lastModified de NVD hasta la que ya se ha sincronizado
+CVE_SYNC_WATERMARK = "nvd_cves_last_modified"
+# Filas por sentencia de upsert (27 columnas × 500 < 32766 parámetros de SQLite)
+CVE_UPSERT_CHUNK_SIZE = 500
+CVE_RANGE_COLUMNS = (
+    "version_start_including", "version_start_excluding", "version_end_including", "version_end_excluding",
+    "version_start_key", "version_start_inclusive", "version_end_key", "version_end_inclusive",
+)
+
+
 def log(msg: str):
     """Registra mensajes con timestamp."""
     print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}")
@@ -93,6 +107,55 @@ def parse_cves_from_nvd(data: dict) -> List[Tuple[VulnerabilityCreate, list, lis
     return results
 
 
+def is_new_or_modified(item: dict, stored_last_modified: dict) -> bool:
+    """Si el CVE de la página no está guardado o NVD lo ha modificado después de guardarlo."""
+    cve_data = item.get("cve", {})
+    cve_id = cve_data.get("id", "").strip().upper()
+    if cve_id not in stored_last_modified:
+        return True
+    stored = stored_last_modified[cve_id]
+    last_modified = cve_data.get("lastModified")
+    if stored is None or not last_modified:
+        return stored is None and bool(last_modified)
+    try:
+        return datetime.fromisoformat(last_modified) > stored
+    except (ValueError, TypeError):
+        return True
+
+
+def parse_cve_items(items: list) -> Tuple[List[Tuple[VulnerabilityCreate, list, list, list, list]], List[str]]:
+    """
+    parse_cves_from_nvd CVE a CVE, para que un registro inválido no haga
+    perder el resto de la página. Devuelve los parseados y los ids descartados.
+    """
+    parsed, failed = [], []
+    for item in items:
+        try:
+            parsed.extend(parse_cves_from_nvd({"vulnerabilities": [item]}))
+        except (ValueError, KeyError, TypeError) as e:
+            cve_id = item.get("cve", {}).get("id")
+            log(f"⚠️ Se descarta {cve_id}: no se pudo parsear el registro de NVD ({e})")
+            failed.append(cve_id)
+    return parsed, failed
+
+
+def cve_cpe_row(cve_name: str, cpe: dict) -> dict:
+    uri = cpe["cpe_uri"]
+    return {
+        "cve_name": cve_name,
+        "cpe_uri": uri,
+        "version_start_including": cpe.get("version_start_including"),
+        "version_start_excluding": cpe.get("version_start_excluding"),
+        "version_end_including": cpe.get("version_end_including"),
+        "version_end_excluding": cpe.get("version_end_excluding"),
+        **parse_cpe_components(uri),
+        **version_range_keys(
+            cpe.get("version_start_including"), cpe.get("version_start_excluding"),
+            cpe.get("version_end_including"), cpe.get("version_end_excluding")
+        ),
+    }
+
+
 def save_cves_to_db(db: Session, data: List[Tuple[VulnerabilityCreate, list, list, list, list]]) -> int:
     imported = 0
     cve_id_map = {}
@@ -139,14 +202,7 @@ def save_cves_to_db(db: Session, data: List[Tuple[VulnerabilityCreate, list, lis
             key = (cve_name, uri)
             if key not in seen_cpes:
                 seen_cpes.add(key)
-                all_cpes.append({
-                    "cve_name": cve_name,
-                    "cpe_uri": uri,
-                    "version_start_including": cpe.get("version_start_including"),
-                    "version_start_excluding": cpe.get("version_start_excluding"),
-                    "version_end_including": cpe.get("version_end_including"),
-                    "version_end_excluding": cpe.get("version_end_excluding"),
-                })
+                all_cpes.append(cve_cpe_row(cve_name, cpe))
 
         seen_cwes = set()
         for cwe in cwe_ids:
@@ -162,26 +218,143 @@ def save_cves_to_db(db: Session, data: List[Tuple[VulnerabilityCreate, list, lis
         db.bulk_insert_mappings(CveReference, all_refs)
 
     if all_cpes:
-        stmt = insert(CveCpe).values(all_cpes)
+        stmt = pg_insert(CveCpe).values(all_cpes)
         stmt = stmt.on_conflict_do_nothing(index_elements=["cve_name", "cpe_uri"])
         db.execute(stmt)
 
     if all_cwes:
-        stmt = insert(CveCwe).values(all_cwes)
+        stmt = pg_insert(CveCwe).values(all_cwes)
         stmt = stmt.on_conflict_do_nothing(index_elements=["cve_name", "cwe_id"])
         db.execute(stmt)
 
     db.commit()
+    if imported:
+        match_cache.bump_cve_generation()
     return imported
 
 
-async def import_all_cves_stream(results_per_page: int = 2000):
-    from fastapi import Request
-    import asyncio
+def upsert_cves_to_db(db: Session, data: List[Tuple[VulnerabilityCreate, list, list, list, list]]) -> dict:
+    """
+    Inserta los CVEs nuevos y actualiza los existentes (sincronización delta).
+    Descripciones, referencias y CWEs se reemplazan. Las parejas (cve, cpe) de
+    cve_cpe que siguen igual no se tocan, de modo que sus DeviceMatch (y su
+    estado solved) se conservan. Las que NVD ya no lista se borran con sus
+    DeviceMatch; las que cambian de rango se actualizan, pierden sus DeviceMatch
+    (calculados con el rango anterior) y reciben imported_at actual para que el
+    rematch incremental las vuelva a evaluar.
+    """
+    insert_for = pg_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+    # Un CVE repetido entre páginas (modificado durante la sincronización) se guarda una vez
+    data = list({vuln.cve_id: (vuln, *rest) for vuln, *rest in data}.values())
+    if not data:
+        return {"new": 0, "updated": 0}
+    cve_names = [vuln.cve_id for vuln, *_ in data]
+
+    existing = {
+        cve_id for (cve_id,) in db.query(Vulnerability.cve_id).filter(Vulnerability.cve_id.in_(cve_names))
+    }
+    vuln_rows = [vuln.model_dump(exclude={"descriptions"}) for vuln, *_ in data]
+    ids_by_name = {}
+    for start in range(0, len(vuln_rows), CVE_UPSERT_CHUNK_SIZE):
+        stmt = insert_for(Vulnerability.__table__).values(vuln_rows[start:start + CVE_UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cve_id"],
+            set_={column: stmt.excluded[column] for column in vuln_rows[0] if column != "cve_id"},
+        ).returning(Vulnerability.id, Vulnerability.cve_id)
+        ids_by_name.update((cve_id, vuln_id) for vuln_id, cve_id in db.execute(stmt))
+    vuln_ids = list(ids_by_name.values())
+
+    # Descripciones, referencias y CWEs: se sustituyen por las de NVD
+    db.execute(CveDescription.__table__.delete().where(CveDescription.cve_id.in_(vuln_ids)))
+    db.execute(CveReference.__table__.delete().where(CveReference.cve_id.in_(vuln_ids)))
+    db.execute(CveCwe.__table__.delete().where(CveCwe.cve_name.in_(cve_names)))
+
+    descs, refs, cwes, cpes = [], [], [], {}
+    for vuln, desc_dicts, ref_dicts, cpe_list, cwe_ids in data:
+        vuln_id = ids_by_name[vuln.cve_id]
+        descs.extend({"cve_id": vuln_id, "lang": d["lang"], "value": d["value"]} for d in desc_dicts)
+        seen_urls = set()
+        for r in ref_dicts:
+            if r["url"] not in seen_urls:
+                seen_urls.add(r["url"])
+                refs.append({"cve_id": vuln_id, "url": r["url"], "name": r.get("name"), "tags": r.get("tags")})
+        cwes.extend({"cve_name": vuln.cve_id, "cwe_id": cwe} for cwe in dict.fromkeys(cwe_ids))
+        for cpe in cpe_list:
+            cpes.setdefault((vuln.cve_id, cpe["cpe_uri"]), cve_cpe_row(vuln.cve_id, cpe))
+
+    if descs:
+        db.execute(CveDescription.__table__.insert(), descs)
+    if refs:
+        db.execute(CveReference.__table__.insert(), refs)
+    if cwes:
+        db.execute(CveCwe.__table__.insert(), cwes)
+
+    # cve_cpe: parejas que ya no están (sus DeviceMatch caen en cascada) y upsert del resto
+    current = {tuple(row) for row in db.query(CveCpe.cve_name, CveCpe.cpe_uri).filter(CveCpe.cve_name.in_(cve_names))}
+    stale = list(current - set(cpes))
+    for start in range(0, len(stale), CVE_UPSERT_CHUNK_SIZE):
+        db.execute(CveCpe.__table__.delete().where(
+            tuple_(CveCpe.cve_name, CveCpe.cpe_uri).in_(stale[start:start + CVE_UPSERT_CHUNK_SIZE])
+        ))
+
+    cpe_rows = list(cpes.values())
+    imported_at = datetime.utcnow()
+    table = CveCpe.__table__
+    written = set()
+    for start in range(0, len(cpe_rows), CVE_UPSERT_CHUNK_SIZE):
+        stmt = insert_for(table).values([{**row, "imported_at": imported_at} for row in cpe_rows[start:start + CVE_UPSERT_CHUNK_SIZE]])
+        changed = [table.c[column].is_distinct_from(stmt.excluded[column]) for column in CVE_RANGE_COLUMNS]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cve_name", "cpe_uri"],
+            set_={column: stmt.excluded[column] for column in (*CVE_RANGE_COLUMNS, "imported_at")},
+            where=or_(*changed),
+        ).returning(table.c.cve_name, table.c.cpe_uri)
+        written.update(tuple(row) for row in db.execute(stmt))
+
+    # Parejas ya existentes cuyo rango ha cambiado: sus DeviceMatch pueden no aplicar ya
+    range_changed = list(written & current)
+    for start in range(0, len(range_changed), CVE_UPSERT_CHUNK_SIZE):
+        db.execute(DeviceMatch.__table__.delete().where(
+            tuple_(DeviceMatch.cve_name, DeviceMatch.cpe_uri).in_(range_changed[start:start + CVE_UPSERT_CHUNK_SIZE])
+        ))
 
+    db.commit()
+    match_cache.bump_cve_generation()
+    return {"new": len(set(cve_names) - existing), "updated": len(existing)}
+
+
+def sync_modified_cves(db: Session, since: datetime, results_per_page: int = 2000, should_stop=None):
+    """
+    Sincronización delta: trae de NVD los CVEs modificados desde `since` por
+    ventanas de lastModified y los inserta/actualiza página a página. Devuelve
+    un generador de contadores acumulados; al terminar sin detenerse guarda la
+    marca de agua con la hora de inicio de la sincronización.
+    """
+    started_at = datetime.utcnow()
+    totals = {"new": 0, "updated": 0, "pages": 0}
+    for data in iter_modified_cve_pages(since, started_at, results_per_page, should_stop=should_stop):
+        counts = upsert_cves_to_db(db, parse_cves_from_nvd(data))
+        totals["new"] += counts["new"]
+        totals["updated"] += counts["updated"]
+        totals["pages"] += 1
+        window_total = data.get("totalResults", 0)
+        window_done = data.get("startIndex", 0) + len(data.get("vulnerabilities", []))
+        yield {**totals, "window_fraction": window_done / window_total if window_total else 1.0}
+    if not (should_stop and should_stop()):
+        crud_watermarks.set_watermark(db, CVE_SYNC_WATERMARK, started_at)
+
+
+def iter_cve_import_events(results_per_page: int = 2000):
+    """
+    Importación de CVEs como generador síncrono de eventos JSON para SSE. Es
+    bloqueante (peticiones a NVD con limitador y reintentos, escritura en BD):
+    se ejecuta en un hilo desde import_all_cves_stream.
+    """
     db = SessionLocal()
     total_imported = 0
     EXCESSIVE_NEW_CVES_THRESHOLD = 1000
+    # Tras una importación completa la sincronización delta parte de esta hora
+    run_started = datetime.utcnow()
 
     try:
         existing_count = db.execute(text("SELECT COUNT(*) FROM vulnerabilities")).scalar()
@@ -189,13 +362,11 @@ async def import_all_cves_stream(results_per_page: int = 2000):
         if existing_count == 0:
             total_results = get_total_cve_count_from_nvd()
             yield json.dumps({"type": "start", "total": total_results, "label": "Cargando..."})
-            total_pages = (total_results // results_per_page) + 1
-            for page in range(total_pages):
+            # Las páginas se piden en paralelo dentro de la cuota de NVD y llegan en orden
+            for data in iter_cve_pages(results_per_page, should_stop=import_status_cve.should_stop):
                 if import_status_cve.should_stop():
                     yield json.dumps({"type": "done", "imported": total_imported, "label": "Importación detenida por el usuario"})
                     return
-                start_index = page * results_per_page
-                data = get_cves_by_page(start_index=start_index, results_per_page=results_per_page)
                 vulns_data_parsed = parse_cves_from_nvd(data)
                 for i in range(0, len(vulns_data_parsed), 50):
                     if import_status_cve.should_stop():
@@ -205,62 +376,73 @@ async def import_all_cves_stream(results_per_page: int = 2000):
                     imported_in_subbatch = save_cves_to_db(db, sub_batch)
                     total_imported += imported_in_subbatch
                     yield json.dumps({"type": "progress", "imported": total_imported, "total": total_results})
-                    await asyncio.sleep(0.001)
+            if import_status_cve.should_stop():
+                yield json.dumps({"type": "done", "imported": total_imported, "label": "Importación detenida por el usuario"})
+                return
+            crud_watermarks.set_watermark(db, CVE_SYNC_WATERMARK, run_started)
             yield json.dumps({"type": "done", "imported": total_imported, "label": "Importación completada."})
             return
 
+        watermark = crud_watermarks.get_watermark(db, CVE_SYNC_WATERMARK)
+        if watermark is not None:
+            # Sincronización delta: solo los CVEs nuevos o modificados desde la última vez
+            yield json.dumps({"type": "start", "total": 100, "label": f"Sincronizando CVEs modificados desde {watermark:%Y-%m-%d %H:%M}...", "percentage": 0, "stage": "delta_sync"})
+            counts = {"new": 0, "updated": 0}
+            for counts in sync_modified_cves(db, watermark, results_per_page, should_stop=import_status_cve.should_stop):
+                current_percentage = min(99, round(counts["window_fraction"] * 100))
+                yield json.dumps({"type": "progress", "imported": counts["new"], "updated": counts["updated"], "total": 100, "percentage": current_percentage, "label": f"{counts['new']} CVEs nuevos, {counts['updated']} actualizados", "stage": "delta_sync"})
+            if import_status_cve.should_stop():
+                yield json.dumps({"type": "done", "imported": counts["new"], "updated": counts["updated"], "label": "Importación detenida por el usuario"})
+                return
+            yield json.dumps({"type": "done", "imported": counts["new"], "updated": counts["updated"], "label": f"Sincronización completada: {counts['new']} CVEs nuevos, {counts['updated']} actualizados."})
+            return
+
         nvd_total_results = get_total_cve_count_from_nvd()
         db_total_results = db.execute(select(func.count(Vulnerability.cve_id))).scalar()
         estimated_to_import = nvd_total_results - db_total_results
 
         if estimated_to_import > EXCESSIVE_NEW_CVES_THRESHOLD:
             yield json.dumps({"type": "start", "total": estimated_to_import, "label": "Demasiados CVEs nuevos detectados", "stage": "check_estimation"})
-            await asyncio.sleep(0.01)
             yield json.dumps({"type": "warning", "code": "too_many_new_cves"})
             return
 
-        if nvd_total_results == db_total_results:
-            yield json.dumps({"type": "done", "imported": 0, "label": "No hay nuevos CVEs que importar."})
-            return
-
+        # Pasada por páginas (aún no hay marca de agua): las páginas traen el CVE
+        # completo, así que se insertan los que faltan y se actualizan los que NVD
+        # ha modificado después de guardarlos. Solo así puede la sincronización
+        # delta partir después de la hora de inicio de esta pasada
+        stored_last_modified = dict(db.execute(select(Vulnerability.cve_id, Vulnerability.last_modified)).all())
         estimated_nvd_pages = (nvd_total_results // results_per_page) + 1
-        yield json.dumps({"type": "start", "total": estimated_nvd_pages, "label": "Obteniendo lista de CVEs desde NVD para comparación...", "percentage": 0, "stage": "fetching_ids"})
+        yield json.dumps({"type": "start", "total": estimated_nvd_pages, "label": "Obteniendo CVEs desde NVD para comparación...", "percentage": 0, "stage": "fetching_ids"})
 
-        all_nvd_ids = []
+        discarded = []
+        total_updated = 0
         page_processed_count = 0
-        for page_ids_batch in get_all_cve_ids(results_per_page=results_per_page):
-            all_nvd_ids.extend(page_ids_batch)
+        for data in iter_cve_pages(results_per_page, should_stop=import_status_cve.should_stop):
+            changed = [item for item in data.get("vulnerabilities", []) if is_new_or_modified(item, stored_last_modified)]
+            vulns_data_parsed, failed_ids = parse_cve_items(changed)
+            discarded.extend(failed_ids)
+            if vulns_data_parsed:
+                counts = upsert_cves_to_db(db, vulns_data_parsed)
+                total_imported += counts["new"]
+                total_updated += counts["updated"]
+            # Un CVE puede repetirse entre páginas si NVD publica otros durante la descarga
+            stored_last_modified.update((vuln.cve_id, vuln.last_modified) for vuln, *_ in vulns_data_parsed)
             page_processed_count += 1
-            current_percentage = round((page_processed_count / estimated_nvd_pages) * 100) if estimated_nvd_pages > 0 else 0
-            yield json.dumps({"type": "progress", "imported": page_processed_count, "total": estimated_nvd_pages, "percentage": current_percentage, "label": "Obteniendo lista de CVEs desde NVD...", "stage": "fetching_ids"})
-            await asyncio.sleep(0.001)
-
-        db_cve_ids = set(db.execute(select(Vulnerability.cve_id)).scalars().all())
-        new_cve_ids = [cve_id for cve_id in all_nvd_ids if cve_id.strip().upper() not in db_cve_ids]
-        total_to_import = len(new_cve_ids)
+            current_percentage = min(100, round((page_processed_count / estimated_nvd_pages) * 100))
+            yield json.dumps({"type": "progress", "imported": page_processed_count, "total": estimated_nvd_pages, "percentage": current_percentage, "label": f"Obteniendo CVEs desde NVD ({total_imported} nuevos, {total_updated} actualizados)...", "stage": "fetching_ids"})
 
-        if total_to_import == 0:
-            yield json.dumps({"type": "done", "imported": 0, "label": "No hay nuevos CVEs que importar."})
+        if import_status_cve.should_stop():
+            yield json.dumps({"type": "done", "imported": total_imported, "updated": total_updated, "label": "Importación detenida por el usuario"})
             return
 
-        yield json.dumps({"type": "start", "total": total_to_import, "label": "Importando CVEs faltantes...", "percentage": 0, "stage": "importing_cves"})
+        if discarded:
+            log(f"⚠️ {len(discarded)} CVEs descartados por registros inválidos: {', '.join(map(str, discarded[:20]))}")
 
-        current_imported = 0
-        for i in range(0, total_to_import, 10):
-            if import_status_cve.should_stop():
-                break
-            batch_ids = new_cve_ids[i:i + 10]
-            data_from_nvd = get_cves_by_id(batch_ids)
-            vulns_data_parsed = parse_cves_from_nvd(data_from_nvd)
-            if vulns_data_parsed:
-                imported_in_batch = save_cves_to_db(db, vulns_data_parsed)
-                total_imported += imported_in_batch
-                current_imported += imported_in_batch
-            current_percentage = round((current_imported / total_to_import) * 100) if total_to_import > 0 else 0
-            yield json.dumps({"type": "progress", "imported": current_imported, "total": total_to_import, "percentage": current_percentage, "label": f"Importando CVEs faltantes ({current_percentage}% completado)", "stage": "importing_cves"})
-            await asyncio.sleep(0.001)
-
-        yield json.dumps({"type": "done", "imported": total_imported, "label": "Importación completada."})
+        crud_watermarks.set_watermark(db, CVE_SYNC_WATERMARK, run_started)
+        if total_imported == 0 and total_updated == 0:
+            yield json.dumps({"type": "done", "imported": 0, "updated": 0, "discarded": len(discarded), "label": "No hay nuevos CVEs que importar."})
+            return
+        yield json.dumps({"type": "done", "imported": total_imported, "updated": total_updated, "discarded": len(discarded), "label": "Importación completada."})
 
     except Exception as e:
         error_msg = f"Error durante la importación: {str(e)}"
@@ -268,3 +450,27 @@ async def import_all_cves_stream(results_per_page: int = 2000):
         db.rollback()
     finally:
         db.close()
+
+
+async def import_all_cves_stream(results_per_page: int = 2000):
+    """
+    Front end para SSE: iter_cve_import_events corre entero en un hilo y sus
+    eventos se reenvían a este loop, que sigue atendiendo peticiones (entre
+    ellas la de detener la importación) durante esperas y reintentos.
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    finished = object()
+
+    def run():
+        try:
+            for event in iter_cve_import_events(results_per_page):
+                loop.call_soon_threadsafe(events.put_nowait, event)
+        finally:
+            loop.call_soon_threadsafe(events.put_nowait, finished)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(run))
+    import_status_cve.set_worker(worker)
+    while (event := await events.get()) is not finished:
+        yield event
+    await worker
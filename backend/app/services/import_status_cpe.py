@@ -119,6 +119,18 @@ def finish(resource: str, imported: int, total: int, label: str = ""):
         "percentage": 100
     })
 
+def stopped(resource: str, imported: int, total: int, label: str = ""):
+    """Marca la importación como detenida por el usuario (parcial)."""
+    _log(f"Importación de {resource} detenida por el usuario.")
+    _status.update({
+        "running": False,
+        "imported": imported,
+        "total": total,
+        "label": label or f"Importación de {resource} detenida por el usuario",
+        "done": False,
+        "stage": "stopped",
+    })
+
 async def start_background_import(import_function):
     """
     Gestiona la ejecución de una función de importación en segundo plano,
@@ -20,6 +20,8 @@ _status = {
 _event_queue: asyncio.Queue = asyncio.Queue()
 _stop_event = asyncio.Event()
 current_task: Optional[asyncio.Task] = None
+# Hilo de la importación: puede seguir vivo un momento tras cancelar current_task
+current_worker: Optional[asyncio.Future] = None
 
 def _log(message: str):
     """Registra un log con marca de tiempo."""
@@ -67,22 +69,29 @@ def stop_import():
     _status["running"] = False
     _status["label"] = "Importación detenida por el usuario"
 
-# Devuelve si hay una tarea en curso
+# Devuelve si hay una tarea (o su hilo) en curso
 def is_running():
-    return current_task is not None and not current_task.done()
+    task_running = current_task is not None and not current_task.done()
+    worker_running = current_worker is not None and not current_worker.done()
+    return task_running or worker_running
 
 # Asigna la tarea actual
 def set_task(task: asyncio.Task):
     global current_task
     current_task = task
 
+# Asigna el hilo que ejecuta la importación
+def set_worker(worker: asyncio.Future):
+    global current_worker
+    current_worker = worker
+
 # Permite actualizar el estado dinámicamente
 def update_status(key: str, value):
     _status[key] = value
 
 # Ejecuta la función de importación en segundo plano
 async def start_background_import(import_function):
-    global _event_queue, _stop_event
+    global _event_queue
     _log("Inicio de importación de CVEs en segundo plano.")
 
     if _status["running"]:
@@ -164,6 +173,7 @@ async def start_background_import(import_function):
         reset_status()
 
     finally:
-        # Restablecimiento para futuras importaciones
-        _stop_event = asyncio.Event()
+        # Restablecimiento para futuras importaciones. _stop_event no se sustituye:
+        # el hilo de la importación puede seguir consultándolo hasta terminar su
+        # paso actual, y se limpia al empezar la siguiente importación
         _event_queue = asyncio.Queue()
@@ -10,7 +10,6 @@ from app.crud import (
     cpe_deprecated_by as crud_deprecated,
     cpe_references as crud_references,
     cpe_titles as crud_titles,
-    cve_cpe as crud_cve_cpe,
     cve_cwe as crud_cve_cwe,
     cve_descriptions as crud_desc,
     cve_references as crud_refs,
@@ -0,0 +1,72 @@
+# backend/app/services/match_cache.py
+
+from collections import OrderedDict
+from threading import Lock
+
+# Número máximo de ternas (vendor, product, version) cacheadas
+MATCH_CACHE_MAX_SIZE = 20000
+
+_cache = OrderedDict()
+_lock = Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+# Generación del dataset de CVEs; cambia con cada importación de CVEs
+_cve_generation = 0
+
+
+def get_cve_generation() -> int:
+    with _lock:
+        return _cve_generation
+
+
+def bump_cve_generation():
+    """Invalida todos los resultados cacheados tras importar CVEs."""
+    global _cve_generation
+    with _lock:
+        _cve_generation += 1
+        _cache.clear()
+        _stats["invalidations"] += 1
+
+
+def get_cached_match(key: tuple, tag: tuple):
+    """
+    Devuelve el resultado cacheado para la terna, o None si no existe o se
+    calculó con otra generación del diccionario CPE / dataset de CVEs.
+    """
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None or entry[0] != tag:
+            if entry is not None:
+                del _cache[key]
+            _stats["misses"] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def store_match(key: tuple, tag: tuple, result: dict):
+    with _lock:
+        _cache[key] = (tag, result)
+        _cache.move_to_end(key)
+        while len(_cache) > MATCH_CACHE_MAX_SIZE:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def clear_match_cache():
+    with _lock:
+        _cache.clear()
+        _stats["invalidations"] += 1
+
+
+def get_cache_stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_cache),
+            "max_size": MATCH_CACHE_MAX_SIZE,
+            "hit_rate": round(_stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "cve_generation": _cve_generation,
+        }
@@ -0,0 +1,204 @@
+# backend/app/services/matching_index.py
+
+from threading import Lock
+from collections import defaultdict, Counter
+from sqlalchemy.orm import Session
+from app.models.platform import Platform
+from app.models.platform_product import PlatformProduct
+from app.crud import platform_products as crud_platform_products
+
+
+# Tamaño de la preselección de candidatos que se puntúa con fuzzy matching
+CANDIDATE_SHORTLIST_SIZE = 50
+# Máximo de entradas de posting que se recorren por consulta; se empieza por
+# los n-gramas más raros, que son los que más discriminan
+MAX_POSTINGS_SCANNED = 20000
+
+
+def text_grams(text: str) -> set[str]:
+    """Tokens completos y trigramas de cada token de un texto ya normalizado."""
+    grams = set()
+    for token in text.split():
+        grams.add(f"#{token}")
+        padded = f" {token} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class ProductCandidates:
+    """
+    Productos y títulos normalizados de un vendor, con un índice invertido de
+    tokens/trigramas para preseleccionar candidatos antes del fuzzy matching.
+    """
+
+    def __init__(self):
+        self.choices = []
+        self.products = []
+        self.postings = defaultdict(list)
+        self._index_by_text = {}
+
+    def add(self, text: str, product: str):
+        if not text or text in self._index_by_text:
+            return
+        idx = len(self.choices)
+        self._index_by_text[text] = idx
+        self.choices.append(text)
+        self.products.append(product)
+        for gram in text_grams(text):
+            self.postings[gram].append(idx)
+
+    def shortlist(self, query: str, limit: int = CANDIDATE_SHORTLIST_SIZE) -> list[int]:
+        if len(self.choices) <= limit:
+            return list(range(len(self.choices)))
+
+        postings = sorted(
+            (self.postings[gram] for gram in text_grams(query) if gram in self.postings),
+            key=len
+        )
+        counts = Counter()
+        scanned = 0
+        for posting in postings:
+            if counts and scanned + len(posting) > MAX_POSTINGS_SCANNED:
+                break
+            counts.update(posting)
+            scanned += len(posting)
+
+        if not counts:
+            return list(range(len(self.choices)))
+        top = {idx for idx, _ in counts.most_common(limit)}
+        # El candidato idéntico a la consulta entra aunque empate en n-gramas con muchos otros
+        exact = self._index_by_text.get(query)
+        if exact is not None:
+            top.add(exact)
+        # Se conserva el orden original para desempatar igual que el recorrido completo
+        return sorted(top)
+
+
+class PhraseTrie:
+    """
+    Trie de tokens sobre frases normalizadas (vendors o productos). Encuentra
+    en una sola pasada la frase conocida más larga contenida en una lista de
+    palabras; a igual longitud gana la que empieza antes.
+    """
+
+    _END = None  # clave del valor en un nodo; los tokens siempre son str
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, phrase: str, value):
+        words = phrase.split()
+        if not words:
+            return
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        node[self._END] = value
+
+    def longest_match(self, words: list[str]):
+        best, best_length = None, 0
+        for start in range(len(words)):
+            node = self.root
+            for end in range(start, len(words)):
+                node = node.get(words[end])
+                if node is None:
+                    break
+                if self._END in node and end - start + 1 > best_length:
+                    best, best_length = node[self._END], end - start + 1
+            if len(words) - start - 1 <= best_length:
+                break
+        return best
+
+
+class MatchingIndex:
+    """
+    Diccionario CPE preprocesado para el matching.
+    Se construye una sola vez por proceso y se comparte entre peticiones.
+    """
+
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.vendors = set()
+        self.platform_vendor_map = defaultdict(list)
+        self.product_to_vendor = defaultdict(list)
+        self.vendor_candidates = {}
+        self.vendor_phrases = PhraseTrie()
+        self.product_phrases = PhraseTrie()
+        self._vendor_lock = Lock()
+
+    def get_vendor_candidates(self, vendor: str, db: Session) -> ProductCandidates:
+        """Candidatos de producto del vendor; se construyen la primera vez que se piden."""
+        with self._vendor_lock:
+            candidates = self.vendor_candidates.get(vendor)
+        if candidates is not None:
+            return candidates
+
+        # Se construyen fuera del lock para no bloquear a otros vendors durante la consulta;
+        # si dos hilos construyen el mismo vendor a la vez, se queda el primero que lo guarda
+        candidates = ProductCandidates()
+        for product, normalized_product, normalized_titles in crud_platform_products.get_vendor_products(db, vendor):
+            if product:
+                candidates.add(normalized_product, product)
+            for title in (normalized_titles or "").split("\n"):
+                candidates.add(title, product)
+
+        with self._vendor_lock:
+            return self.vendor_candidates.setdefault(vendor, candidates)
+
+
+# Índice compartido por todo el proceso
+_index = None
+_generation = 0
+_lock = Lock()
+
+
+def build_matching_index(db: Session, generation: int = 0) -> MatchingIndex:
+    print("📚 Construyendo índice de matching a partir del catálogo de productos CPE...")
+    if crud_platform_products.is_empty(db) and db.query(Platform.id).first() is not None:
+        print("🗂️ Catálogo (vendor, product) vacío; regenerándolo desde platforms...")
+        crud_platform_products.refresh_platform_products(db)
+
+    index = MatchingIndex(generation)
+
+    rows = db.query(
+        PlatformProduct.vendor, PlatformProduct.normalized_vendor, PlatformProduct.extended_vendor,
+        PlatformProduct.normalized_product, PlatformProduct.extended_product
+    ).order_by(PlatformProduct.id)
+
+    for vend, norm, alt, norm_prod, alt_prod in rows:
+        if vend not in index.vendors:
+            index.vendors.add(vend)
+            index.platform_vendor_map[norm].append(vend)
+            if norm != alt:
+                index.platform_vendor_map[alt].append(vend)
+
+        index.product_to_vendor[norm_prod].append(vend)
+        if norm_prod != alt_prod:
+            index.product_to_vendor[alt_prod].append(vend)
+
+    for phrase, vendors in index.platform_vendor_map.items():
+        index.vendor_phrases.add(phrase, vendors)
+    for phrase, vendors in index.product_to_vendor.items():
+        index.product_phrases.add(phrase, vendors)
+
+    print(f"✅ Índice de matching listo (generación {generation}): {len(index.platform_vendor_map)} vendors")
+    return index
+
+
+def get_matching_index(db: Session) -> MatchingIndex:
+    """Devuelve el índice compartido, construyéndolo la primera vez que se necesita."""
+    global _index
+    with _lock:
+        if _index is None or _index.generation != _generation:
+            _index = build_matching_index(db, _generation)
+        return _index
+
+
+def invalidate_matching_index():
+    """Descarta el índice actual; se reconstruirá en el siguiente matching."""
+    global _index, _generation
+    with _lock:
+        _generation += 1
+        _index = None
+    print(f"♻️ Índice de matching invalidado (generación {_generation})")
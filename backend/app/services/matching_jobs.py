@@ -0,0 +1,170 @@
+# backend/app/services/matching_jobs.py
+
+import os
+import itertools
+from queue import PriorityQueue
+from threading import Event, Lock, Thread
+from app.database import SessionLocal
+from app.services import import_status_matching
+
+# Hilos de matching; la puntuación en lote (rapidfuzz) y la E/S de BD liberan el GIL
+MATCHING_WORKERS = min(4, os.cpu_count() or 1)
+
+# Menor valor = se atiende antes
+PRIORITY_INTERACTIVE = 0
+PRIORITY_FLEET = 10
+
+
+class MatchingCancelled(Exception):
+    pass
+
+
+class MatchingJob:
+    """Trabajo de matching encolado para uno o varios dispositivos."""
+
+    def __init__(self, job_id: int, device_ids: list[int], priority: int, incremental: bool = False):
+        self.job_id = job_id
+        self.device_ids = list(device_ids)
+        self.priority = priority
+        self.incremental = incremental
+        self.status = "queued"
+        self._cancel = Event()
+        self._dropped = set()
+        self._dropped_lock = Lock()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def drop_device(self, device_id: int):
+        """
+        Retira un dispositivo del trabajo: no se guarda nada suyo y el resto
+        sigue. Si ya no queda ninguno, se cancela el trabajo entero.
+        """
+        with self._dropped_lock:
+            self._dropped.add(device_id)
+            if self._dropped.issuperset(self.device_ids):
+                self.cancel()
+
+    def is_dropped(self, device_id: int) -> bool:
+        with self._dropped_lock:
+            return device_id in self._dropped
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise MatchingCancelled()
+
+
+class MatchingExecutor:
+    """
+    Cola con prioridad de trabajos de matching atendida por un pool acotado de
+    hilos. Cada trabajo abre su propia sesión de BD, independiente de la petición
+    que lo encoló.
+    """
+
+    def __init__(self, workers: int = MATCHING_WORKERS):
+        self.workers = workers
+        self._queue = PriorityQueue()
+        self._sequence = itertools.count()
+        self._jobs_by_device = {}
+        self._lock = Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = Thread(target=self._worker, name=f"matching-worker-{n}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, device_ids: list[int], priority: int = PRIORITY_INTERACTIVE, incremental: bool = False) -> MatchingJob | None:
+        """Encola el matching de los dispositivos que no tengan ya un trabajo activo."""
+        with self._lock:
+            device_ids = [d for d in device_ids if d not in self._jobs_by_device]
+            if not device_ids:
+                return None
+            sequence = next(self._sequence)
+            job = MatchingJob(sequence, device_ids, priority, incremental)
+            for device_id in device_ids:
+                self._jobs_by_device[device_id] = job
+                import_status_matching.set_matching_active(device_id, True)
+                import_status_matching.reset_matching_progress(device_id)
+            # La secuencia desempata por orden de llegada dentro de la misma prioridad
+            self._queue.put((priority, sequence, job))
+
+        self._ensure_workers()
+        return job
+
+    def cancel_device(self, device_id: int) -> bool:
+        """Cancela el matching del dispositivo sin afectar a los demás de un trabajo de flota."""
+        with self._lock:
+            job = self._jobs_by_device.get(device_id)
+        if job is None:
+            return False
+        job.drop_device(device_id)
+        return True
+
+    def get_job(self, device_id: int) -> MatchingJob | None:
+        with self._lock:
+            return self._jobs_by_device.get(device_id)
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                with self._lock:
+                    for device_id in job.device_ids:
+                        if self._jobs_by_device.get(device_id) is job:
+                            del self._jobs_by_device[device_id]
+                self._queue.task_done()
+
+    def _run(self, job: MatchingJob):
+        from app.services.matching_service import match_platforms_for_device, match_platforms_for_devices
+
+        db = SessionLocal()
+        try:
+            job.check_cancelled()
+            job.status = "running"
+            if len(job.device_ids) == 1:
+                device_id = job.device_ids[0]
+                progress = match_platforms_for_device(
+                    device_id, db, yield_progress=True, should_cancel=job.check_cancelled, incremental=job.incremental
+                )
+                for msg in progress:
+                    import_status_matching.append_matching_progress(device_id, msg)
+            else:
+                result = match_platforms_for_devices(
+                    job.device_ids, db, should_cancel=job.check_cancelled, incremental=job.incremental,
+                    is_dropped=job.is_dropped
+                )
+                print(f"🚚 Matching de flota completado: {result['summary']}")
+                for device_id in result["dropped_devices"]:
+                    import_status_matching.append_matching_progress(device_id, "[CANCELLED]")
+            job.status = "done"
+        except MatchingCancelled:
+            db.rollback()
+            job.status = "cancelled"
+            print(f"🛑 Matching cancelado: dispositivos {job.device_ids}")
+            for device_id in job.device_ids:
+                import_status_matching.append_matching_progress(device_id, "[CANCELLED]")
+        except Exception as e:
+            db.rollback()
+            job.status = "error"
+            for device_id in job.device_ids:
+                import_status_matching.append_matching_progress(device_id, f"[ERROR] {str(e)}")
+        finally:
+            db.close()
+            for device_id in job.device_ids:
+                import_status_matching.clear_matching_status(device_id)
+                import_status_matching.append_matching_progress(device_id, "[DONE]")
+
+
+# Ejecutor compartido por todo el proceso
+executor = MatchingExecutor()
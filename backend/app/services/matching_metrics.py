@@ -0,0 +1,97 @@
+# backend/app/services/matching_metrics.py
+
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Configuraciones más lentas que se guardan en el resumen de cada matching
+SLOW_CONFIG_LOG_SIZE = 10
+# A partir de este tiempo una configuración se registra en el log
+SLOW_CONFIG_THRESHOLD_MS = 500
+
+# Métricas del matching en curso en este hilo/contexto
+_current = ContextVar("matching_metrics", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(*args, **kwargs):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.queries += 1
+
+
+class MatchingMetrics:
+    """
+    Tiempos y número de sentencias SQL por fase de un matching (índice, vendor,
+    fuzzy, consulta de cve_cpe, guardado...) y log de configuraciones lentas.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.stages = {}
+        self.configs = 0
+        self._slow = []
+
+    def add(self, name: str, seconds: float, queries: int = 0):
+        stage = self.stages.setdefault(name, {"seconds": 0.0, "queries": 0, "calls": 0})
+        stage["seconds"] += seconds
+        stage["queries"] += queries
+        stage["calls"] += 1
+
+    def record_config(self, key: tuple, seconds: float):
+        self.configs += 1
+        entry = (seconds, key)
+        if len(self._slow) < SLOW_CONFIG_LOG_SIZE:
+            heapq.heappush(self._slow, entry)
+        else:
+            heapq.heappushpop(self._slow, entry)
+        if seconds * 1000 >= SLOW_CONFIG_THRESHOLD_MS:
+            print(f"🐢 Configuración lenta ({seconds * 1000:.0f} ms): vendor={key[0]!r}, product={key[1]!r}, version={key[2]!r}")
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "queries": self.queries,
+            "configs_resolved": self.configs,
+            "stages": {
+                name: {**stage, "seconds": round(stage["seconds"], 3)}
+                for name, stage in self.stages.items()
+            },
+            "slow_configs": [
+                {"vendor": key[0], "product": key[1], "version": key[2], "ms": round(seconds * 1000, 1)}
+                for seconds, key in sorted(self._slow, reverse=True)
+            ],
+        }
+
+
+@contextmanager
+def collecting(metrics: MatchingMetrics):
+    """Asocia las métricas al matching que se ejecuta dentro del bloque."""
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def current_metrics() -> MatchingMetrics | None:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Acumula tiempo y consultas SQL del bloque en la fase indicada (sin efecto fuera de un matching)."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    queries = metrics.queries
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start, metrics.queries - queries)
@@ -1,18 +1,32 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select, distinct
+from sqlalchemy import func, and_, or_
 from app.models.device_config import DeviceConfig
-from app.models.platform import Platform
-from app.models.cpe_title import CpeTitle
 from app.models.cve_cpe import CveCpe
 from app.models.device_match import DeviceMatch
 import re
+import time
+import json
+import hashlib
+from datetime import datetime, timedelta, timezone
 from collections import Counter, defaultdict
-from rapidfuzz import fuzz
-import asyncio
-from packaging.version import Version, InvalidVersion
+from rapidfuzz import fuzz, process
+from app.services.utils import version_sort_key, version_range_keys
+from app.services.normalization import preprocess, extended_normalize, get_acronym
+from app.services.matching_index import get_matching_index
+from app.services import match_cache
+from app.services import matching_metrics
+from app.crud import platform_products as crud_platform_products
+from app.crud import device_matches as crud_device_matches
 
 
 MIN_MATCH_SCORE = 60
+# Configuraciones que se resuelven juntas en el matching con progreso
+PROGRESS_CHUNK_SIZE = 25
+# Ternas por bloque en resolve_config_batch; entre bloques se comprueba la cancelación
+BATCH_CHUNK_SIZE = 250
+# imported_at se fija antes del commit de la importación: un matching que empiece
+# entre ambos no ve esas filas, así que el rematch incremental mira algo más atrás
+IMPORT_COMMIT_SLACK = timedelta(minutes=5)
 
 VALID_HW = {'*', '-', 'x86', 'x64', 'amd64', 'i386', 'i686', 'unknown'}
 INVALID_SW = {
@@ -22,342 +36,529 @@ INVALID_SW = {
     "tvos", "esx", "chromeos", "qnx", "iphone_os", "edge"
 }
 
-def normalize_separators(text: str) -> str:
-    return re.sub(r'[\s\-_\.]+', ' ', text).strip()
-
-def translate_symbols(text: str) -> str:
-    replacements = {
-        '+': ' plus ',
-        '&': ' and '
-    }
-    for symbol, word in replacements.items():
-        text = text.replace(symbol, word)
-    return text
-
-def normalize(text: str) -> str:
-    if not text:
-        return ""
-    return re.sub(r'[^\w\s-]', '', text.strip().lower())
-
-def preprocess(text: str) -> str:
-    return normalize_separators(normalize(translate_symbols(text)))
-
-def extended_normalize(text: str) -> str:
-    return re.sub(r'[^\w\s]', '', preprocess(text))
-
-def get_acronym(text: str) -> str:
-    words = normalize(text).split()
-    return ''.join(w[0] for w in words if w)
+YEAR_PATTERN = re.compile(r'(19\d{2}|20\d{2}|2100)')
+TRAILING_DIGITS = re.compile(r'\d+$')
 
 def extract_version(product_name: str, config_version: str) -> str:
-    year_match = re.search(r'(19\d{2}|20\d{2}|2100)', product_name)
+    year_match = YEAR_PATTERN.search(product_name)
     if year_match:
         return year_match.group(1)
     if config_version:
         return config_version.strip()
     return None
 
-def normalize_field(text: str) -> str:
-    text = text.replace('\\', '').replace("'", '').replace('-', '_')
-    return normalize(text)
-
-def escape_like(text: str) -> str:
-    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
-
 def version_in_range(v: str, start_incl=None, start_excl=None, end_incl=None, end_excl=None) -> bool:
-    try:
-        version = Version(v)
-    except InvalidVersion:
+    key = version_sort_key(v)
+    if key is None:
+        return False
+    bounds = version_range_keys(start_incl, start_excl, end_incl, end_excl)
+    start, end = bounds["version_start_key"], bounds["version_end_key"]
+    if start is not None and (key < start or (key == start and not bounds["version_start_inclusive"])):
         return False
-    try:
-        if start_incl and version < Version(start_incl):
-            return False
-        if start_excl and version <= Version(start_excl):
-            return False
-        if end_incl and version > Version(end_incl):
-            return False
-        if end_excl and version >= Version(end_excl):
-            return False
-    except InvalidVersion:
+    if end is not None and (key > end or (key == end and not bounds["version_end_inclusive"])):
         return False
     return True
 
-def filter_cpes_by_version(cpes, config_version):
-    filtered = []
-    for cpe in cpes:
-        if version_in_range(
-            config_version,
-            cpe.version_start_including,
-            cpe.version_start_excluding,
-            cpe.version_end_including,
-            cpe.version_end_excluding
-        ):
-            filtered.append(cpe)
-        else:
-            if 'chrome' in (cpe.cpe_uri or '').lower():
-                print(f"⛔️ Filtrado por rango: {cpe.cpe_uri} (version={config_version})")
-    return filtered
-
-def match_version_with_cpe_uri(matched_vendor: str, matched_product: str, target_major_version: str, db: Session):
+def version_range_filter(version_key: str):
+    """Condición SQL: la versión (ya convertida con version_sort_key) cae dentro del rango del cve_cpe."""
+    return and_(
+        or_(
+            CveCpe.version_start_key.is_(None),
+            CveCpe.version_start_key < version_key,
+            and_(CveCpe.version_start_key == version_key, CveCpe.version_start_inclusive.is_(True)),
+        ),
+        or_(
+            CveCpe.version_end_key.is_(None),
+            CveCpe.version_end_key > version_key,
+            and_(CveCpe.version_end_key == version_key, CveCpe.version_end_inclusive.is_(True)),
+        ),
+    )
+
+def match_version_with_cpe_uri(matched_vendor: str, matched_product: str, target_major_version: str, db: Session, config_version: str = None, imported_since: datetime = None):
     if not (matched_vendor and matched_product and target_major_version):
         return []
 
-    norm_vendor = normalize_field(matched_vendor)
-    norm_product = normalize_field(matched_product)
+    # La versión del dispositivo se compara con los límites precalculados al importar
+    version_key = version_sort_key(config_version)
+    if version_key is None:
+        return []
 
-    escaped_vendor = escape_like(matched_vendor)
-    escaped_product = escape_like(matched_product)
+    # Búsqueda por igualdad sobre las columnas indexadas (vendor, product, version)
+    query = db.query(CveCpe).filter(
+        CveCpe.vendor == matched_vendor,
+        CveCpe.product == matched_product,
+        CveCpe.version.in_(['*', '-', target_major_version]),
+        func.lower(CveCpe.target_hw).in_(VALID_HW),
+        func.lower(CveCpe.target_sw).notin_(INVALID_SW),
+        version_range_filter(version_key)
+    )
+    if imported_since is not None:
+        # Rematch incremental: solo los cve_cpe importados desde el último matching
+        query = query.filter(CveCpe.imported_at > imported_since)
+    matched = query.all()
 
-    like_expr = f"cpe:2.3:%:{escaped_vendor}:{escaped_product}:%"
-    candidates = db.query(CveCpe).filter(CveCpe.cpe_uri.like(like_expr, escape='\\')).all()
+    if not matched:
+        print(f"⚠️ No se encontró ningún CPE para {matched_vendor}:{matched_product} con versión {target_major_version}")
 
-    matched = []
-    for cpe in candidates:
-        parts = cpe.cpe_uri.split(':')
-        if len(parts) >= 13:
-            vendor = normalize_field(parts[3])
-            product = normalize_field(parts[4])
-            version = parts[5]
-            target_sw = parts[10].lower()
-            target_hw = parts[11].lower()
+    return matched
 
-            if vendor != norm_vendor or product != norm_product:
-                continue
+def match_phrases(target_words: list[str], phrases, source: str):
+    """Frase conocida más larga dentro de las palabras (ver PhraseTrie.longest_match)."""
+    matches = phrases.longest_match(target_words)
+    if matches:
+        return matches, f"exact_{source}"
+    return None, None
 
-            if target_hw not in VALID_HW or target_sw in INVALID_SW:
-                continue
 
-            if version in ('*', '-'):
-                matched.append(cpe)
-                continue
+def config_key(vendor: str, product: str, version: str) -> tuple[str, str, str]:
+    """Clave normalizada (vendor, product, version) de una configuración de dispositivo."""
+    return (
+        (vendor or "").strip().lower(),
+        (product or "").strip().lower(),
+        (version or "").strip(),
+    )
+
+
+def resolve_vendor(raw_vendor: str, index) -> tuple:
+    """Devuelve (matched_vendor, match_type) para el vendor de una configuración."""
+    platform_vendor_map = index.platform_vendor_map
+    vendor_phrases = index.vendor_phrases
+
+    normalized_vendor = preprocess(raw_vendor)
+    extended_vendor = extended_normalize(raw_vendor)
+
+    vendor_words = normalized_vendor.split()
+    alt_vendor_words = extended_vendor.split()
+    vendor_acronym = get_acronym(raw_vendor)
+
+    vendor_matches, match_type = match_phrases(vendor_words, vendor_phrases, "vendor")
+    if not vendor_matches:
+        vendor_matches, match_type = match_phrases(alt_vendor_words, vendor_phrases, "vendor_cleaned")
+    if not vendor_matches:
+        simplified_words = [TRAILING_DIGITS.sub('', w) for w in alt_vendor_words]
+        vendor_matches, match_type = match_phrases(simplified_words, vendor_phrases, "vendor_simplified")
+
+    if vendor_matches:
+        return vendor_matches[0], match_type
+    if vendor_acronym in platform_vendor_map:
+        return platform_vendor_map[vendor_acronym][0], "acronym"
+
+    vendor_matches, match_type = match_phrases(alt_vendor_words, index.product_phrases, "product_as_vendor")
+    if vendor_matches:
+        return vendor_matches[0], match_type
+    return None, match_type
+
+
+def score_products_batch(queries: list[str], candidates) -> list[tuple]:
+    """
+    Puntúa todas las consultas de un mismo vendor contra sus candidatos en una
+    única llamada a rapidfuzz.process.cdist (multihilo) y devuelve, por consulta,
+    (mejor puntuación, producto).
+    """
+    shortlist = sorted(set().union(*(candidates.shortlist(q) for q in queries)))
+    if not shortlist:
+        return [(0.0, None)] * len(queries)
+
+    choices = [candidates.choices[i] for i in shortlist]
+    scores = process.cdist(queries, choices, scorer=fuzz.token_sort_ratio, workers=-1)
+    # argmax devuelve el primer máximo. Los candidatos siguen el orden del catálogo
+    # (producto alfabético, nombre antes que títulos): a igual puntuación gana el primero
+    best_columns = scores.argmax(axis=1)
+    return [
+        (float(scores[row, col]), candidates.products[shortlist[col]])
+        for row, col in enumerate(best_columns)
+    ]
+
+
+def resolve_configs(triples: list[tuple], index, db: Session, imported_since: datetime = None) -> dict:
+    """
+    Resuelve vendor, producto y CPEs vulnerables para varias ternas
+    (vendor, product, version) a la vez. Las ternas que comparten vendor se
+    puntúan juntas con score_products_batch.
+    El resultado solo depende del diccionario CPE y de los CVEs, no del dispositivo.
+    """
+    metrics = matching_metrics.current_metrics()
+    elapsed = defaultdict(float)
+
+    vendors = {}
+    by_vendor = defaultdict(list)
+    for raw_vendor, raw_product, config_version in triples:
+        key = config_key(raw_vendor, raw_product, config_version)
+        start = time.perf_counter()
+        with matching_metrics.stage("vendor"):
+            matched_vendor, match_type = resolve_vendor(raw_vendor, index)
+        elapsed[key] += time.perf_counter() - start
+        vendors[key] = (matched_vendor, match_type)
+        if matched_vendor:
+            by_vendor[matched_vendor].append(key)
+
+    best = {}
+    for matched_vendor, keys in by_vendor.items():
+        start = time.perf_counter()
+        with matching_metrics.stage("candidates"):
+            candidates = index.get_vendor_candidates(matched_vendor, db)
+        with matching_metrics.stage("fuzzy"):
+            queries = [preprocess(key[1]) for key in keys]
+            scored_batch = score_products_batch(queries, candidates)
+        # El coste del lote se reparte entre las ternas que lo comparten
+        share = (time.perf_counter() - start) / len(keys)
+        for key, scored in zip(keys, scored_batch):
+            best[key] = scored
+            elapsed[key] += share
+
+    resolved = {}
+    for raw_vendor, raw_product, config_version in triples:
+        key = config_key(raw_vendor, raw_product, config_version)
+        matched_vendor, match_type = vendors[key]
+        match_found = matched_vendor is not None
+        best_score, matched_product = best.get(key, (0.0, None))
+        match_score = 0.0
+        needs_review = False
+
+        if best_score >= MIN_MATCH_SCORE:
+            match_found = True
+            match_score = round(best_score, 2)
+            match_type = match_type or "product_match"
+            if best_score < 75:
+                needs_review = True
+        else:
+            matched_product = None
 
-            if version == target_major_version:
-                matched.append(cpe)
+        target_version = extract_version(raw_product or "", config_version)
+        start = time.perf_counter()
+        # Incluye el filtro de rangos de versión, que se resuelve en la misma consulta
+        with matching_metrics.stage("cve_query"):
+            matched_cpes = match_version_with_cpe_uri(matched_vendor, matched_product, target_version, db, config_version, imported_since)
+        elapsed[key] += time.perf_counter() - start
+        if metrics is not None:
+            metrics.record_config(key, elapsed[key])
+
+        resolved[key] = {
+            "matched_vendor": matched_vendor,
+            "match": match_found,
+            "match_type": match_type,
+            "matched_product": matched_product,
+            "match_score": match_score,
+            "needs_review": needs_review,
+            "matched_cpe_uris": [
+                {"cve_name": c.cve_name, "cpe_uri": c.cpe_uri}
+                for c in matched_cpes
+            ]
+        }
+    return resolved
+
+
+def resolve_config(raw_vendor: str, raw_product: str, config_version: str, index, db: Session) -> dict:
+    key = config_key(raw_vendor, raw_product, config_version)
+    return resolve_configs([(raw_vendor, raw_product, config_version)], index, db)[key]
+
+
+def resolve_configs_cached(triples: list[tuple], index, db: Session) -> dict:
+    """resolve_configs memoizado por terna normalizada y generación del diccionario/CVEs."""
+    tag = (index.generation, match_cache.get_cve_generation())
+    resolved = {}
+    pending = {}
+    for triple in triples:
+        key = config_key(*triple)
+        if key in resolved or key in pending:
+            continue
+        cached = match_cache.get_cached_match(key, tag)
+        if cached is not None:
+            resolved[key] = cached
+        else:
+            pending[key] = triple
+
+    if pending:
+        fresh = resolve_configs(list(pending.values()), index, db)
+        for key, result in fresh.items():
+            match_cache.store_match(key, tag, result)
+        resolved.update(fresh)
+    return resolved
+
+
+def config_triple(config: DeviceConfig) -> tuple[str, str, str]:
+    return (config.vendor or "", config.product or "", config.version or "")
+
+
+def config_fingerprint(config: DeviceConfig) -> str:
+    """Huella de la terna normalizada; cambia cuando se edita la configuración."""
+    return hashlib.sha1("\x1f".join(config_key(*config_triple(config))).encode("utf-8")).hexdigest()
+
+
+def plan_incremental_configs(configs: list[DeviceConfig], db: Session) -> tuple[dict, list]:
+    """
+    Clasifica las configuraciones para el rematch incremental. Devuelve
+    {config.id: imported_since} de las que hay que procesar (None = matching
+    completo) y la lista de configuraciones que se pueden omitir.
+    - Completo: nuevas, editadas o matcheadas antes de regenerar el diccionario CPE.
+    - Solo cve_cpe nuevos: sin cambios desde su último matching; se miran los
+      importados desde IMPORT_COMMIT_SLACK antes de ese matching.
+    - Omitidas: sin cambios y sin cve_cpe importados desde entonces.
+    """
+    dictionary_refreshed_at = crud_platform_products.get_refreshed_at(db)
+    cve_watermark = db.query(func.max(CveCpe.imported_at)).scalar()
+
+    since_by_config = {}
+    skipped = []
+    for config in configs:
+        last = config.last_matched_at
+        unchanged = last is not None and config.fingerprint == config_fingerprint(config)
+        if not unchanged or (dictionary_refreshed_at is not None and dictionary_refreshed_at > last):
+            since_by_config[config.id] = None
+        elif cve_watermark is not None and cve_watermark > last - IMPORT_COMMIT_SLACK:
+            since_by_config[config.id] = last - IMPORT_COMMIT_SLACK
+        else:
+            skipped.append(config)
+    return since_by_config, skipped
+
+
+def resolve_config_batch(configs: list[DeviceConfig], index, db: Session, since_by_config: dict = None, should_cancel=None) -> dict:
+    """
+    Resuelve varias configuraciones y devuelve {config.id: resultado}. Las de
+    matching completo pasan por la caché; las incrementales consultan solo los
+    cve_cpe importados desde su imported_since. Las ternas se resuelven por
+    bloques de BATCH_CHUNK_SIZE y should_cancel se llama antes de cada bloque.
+    """
+    since_by_config = since_by_config or {}
+    groups = defaultdict(list)
+    for config in configs:
+        groups[since_by_config.get(config.id)].append(config)
+
+    resolved = {}
+    for since, group in groups.items():
+        triples = list({config_key(*config_triple(c)): config_triple(c) for c in group}.values())
+        by_key = {}
+        for start in range(0, len(triples), BATCH_CHUNK_SIZE):
+            if should_cancel:
+                should_cancel()
+            chunk = triples[start:start + BATCH_CHUNK_SIZE]
+            if since is None:
+                by_key.update(resolve_configs_cached(chunk, index, db))
+            else:
+                by_key.update(resolve_configs(chunk, index, db, imported_since=since))
+        for config in group:
+            resolved[config.id] = by_key[config_key(*config_triple(config))]
+    return resolved
+
+
+def record_matched_configs(configs: list[DeviceConfig], matched_at: datetime, db: Session):
+    """
+    Guarda huella y fecha de matching de las configuraciones procesadas. Las
+    coincidencias de configuraciones editadas desde el último matching se
+    descartan, ya que se calcularon para otro vendor/product/version.
+    """
+    edited = [c.id for c in configs if c.fingerprint and c.fingerprint != config_fingerprint(c)]
+    if edited:
+        db.query(DeviceMatch).filter(DeviceMatch.device_config_id.in_(edited)).delete(synchronize_session=False)
+    for config in configs:
+        config.fingerprint = config_fingerprint(config)
+        config.last_matched_at = matched_at
+
+
+def build_incremental_summary(since_by_config: dict, skipped: list) -> dict:
+    full = sum(1 for since in since_by_config.values() if since is None)
+    return {
+        "full": full,
+        "new_cves_only": len(since_by_config) - full,
+        "unchanged": len(skipped),
+    }
 
-    if not matched:
-        print(f"⚠️ No se encontró ningún CPE para {matched_vendor}:{matched_product} con versión {target_major_version}")
 
-    return matched
+def build_config_result(config: DeviceConfig, resolved: dict) -> dict:
+    return {
+        "device_config_id": config.id,
+        "original_vendor": config.vendor or "",
+        "original_product": config.product or "",
+        "device_config_version": config.version or "",
+        **resolved
+    }
 
-def match_progressively(target_words: list[str], candidate_map: dict, source: str):
-    for i in range(len(target_words)):
-        for j in range(i + 1, len(target_words) + 1):
-            phrase = ' '.join(target_words[i:j])
-            if phrase in candidate_map:
-                return candidate_map[phrase], f"exact_{source}"
-    return None, None
 
+def save_device_matches(results: list[dict], db: Session) -> int:
+    """Upsert por bloques de las coincidencias; conserva solved de las ya existentes."""
+    now = datetime.now(timezone.utc)
+    rows = {}
+    for result in results:
+        for cpe_data in result["matched_cpe_uris"]:
+            key = (result["device_config_id"], cpe_data["cve_name"], cpe_data["cpe_uri"])
+            rows[key] = {
+                "device_config_id": result["device_config_id"],
+                "cve_name": cpe_data["cve_name"],
+                "cpe_uri": cpe_data["cpe_uri"],
+                "matched_vendor": result["matched_vendor"],
+                "matched_product": result["matched_product"],
+                "match_type": result["match_type"],
+                "match_score": result["match_score"],
+                "needs_review": result["needs_review"],
+                "timestamp": now,
+            }
+
+    saved = crud_device_matches.upsert_matches(db, list(rows.values()))
+    db.commit()
+    return saved
+
+
+def build_summary(total: int, match_types_counter: Counter) -> dict:
+    matched = total - match_types_counter["none"]
+    return {
+        "total_configs": total,
+        "matched": matched,
+        "unmatched": match_types_counter["none"],
+        "match_percentage": round((matched / total) * 100, 2) if total else 0.0,
+        "by_type": dict(match_types_counter)
+    }
+
+
+def timings_event(metrics) -> str:
+    return f"[TIMINGS] {json.dumps(metrics.as_dict())}"
+
+
+def match_platforms_for_device(device_id: int, db: Session, yield_progress: bool = False, should_cancel=None, incremental: bool = False):
+    """
+    Matching de un dispositivo. Con yield_progress devuelve un generador que
+    emite un mensaje por configuración (y los tiempos por fase tras cada bloque)
+    y guarda los resultados al agotarse.
+    should_cancel se llama entre configuraciones y lanza una excepción para abortar.
+    Con incremental solo se procesan las configuraciones nuevas o editadas y,
+    para el resto, los cve_cpe importados desde su último matching.
+    """
+    metrics = matching_metrics.MatchingMetrics()
+    with matching_metrics.collecting(metrics):
+        with matching_metrics.stage("index"):
+            index = get_matching_index(db)
+        started_at = datetime.utcnow()
+
+        with matching_metrics.stage("load_configs"):
+            device_configs = db.query(DeviceConfig).filter(DeviceConfig.device_id == device_id).all()
+        with matching_metrics.stage("plan"):
+            if incremental:
+                since_by_config, skipped = plan_incremental_configs(device_configs, db)
+            else:
+                since_by_config, skipped = {c.id: None for c in device_configs}, []
+    pending = [c for c in device_configs if c.id in since_by_config]
 
-def match_platforms_for_device(device_id: int, db: Session, yield_progress: bool = False):
-    from collections import defaultdict, Counter
-    import re
-    from sqlalchemy import select, distinct
-    from app.models import Platform, CpeTitle, DeviceConfig, DeviceMatch
-    from fuzzywuzzy import fuzz
-
-    platform_vendor_map = defaultdict(list)
-    product_to_vendor = defaultdict(list)
-
-    for v in db.scalars(select(distinct(Platform.vendor))):
-        norm = preprocess(v)
-        alt = extended_normalize(v)
-        platform_vendor_map[norm].append(v)
-        if norm != alt:
-            platform_vendor_map[alt].append(v)
-
-    for prod, vend in db.query(distinct(Platform.product), Platform.vendor).all():
-        norm_prod = preprocess(prod or "")
-        alt_prod = extended_normalize(prod or "")
-        product_to_vendor[norm_prod].append(vend)
-        if norm_prod != alt_prod:
-            product_to_vendor[alt_prod].append(vend)
-
-    cpe_titles_by_platform = defaultdict(list)
-    for t in db.query(CpeTitle).all():
-        norm = preprocess(t.value)
-        cpe_titles_by_platform[t.platform_id].append(norm)
-
-    device_configs = db.query(DeviceConfig).filter(DeviceConfig.device_id == device_id).all()
     results = []
     match_types_counter = Counter()
-    total = len(device_configs)
+    if skipped:
+        match_types_counter["unchanged"] = len(skipped)
+    total = len(pending)
 
     def process_configs():
-        for idx, config in enumerate(device_configs, 1):
-            raw_vendor = config.vendor or ""
-            raw_product = config.product or ""
-            config_version = config.version or ""
-
-            normalized_vendor = preprocess(raw_vendor)
-            extended_vendor = extended_normalize(raw_vendor)
-            normalized_product = preprocess(raw_product)
-
-            vendor_words = normalized_vendor.split()
-            alt_vendor_words = extended_vendor.split()
-            vendor_acronym = get_acronym(raw_vendor)
-
-            match_found = False
-            matched_vendor = None
-            match_type = "none"
-            matched_product = None
-            match_score = 0.0
-            needs_review = False
-
-            vendor_matches, match_type = match_progressively(vendor_words, platform_vendor_map, "vendor")
-            if not vendor_matches:
-                vendor_matches, match_type = match_progressively(alt_vendor_words, platform_vendor_map, "vendor_cleaned")
-            if not vendor_matches:
-                simplified_words = [re.sub(r'\d+$', '', w) for w in alt_vendor_words]
-                vendor_matches, match_type = match_progressively(simplified_words, platform_vendor_map, "vendor_simplified")
-
-            if vendor_matches:
-                matched_vendor = vendor_matches[0]
-                match_found = True
-            elif vendor_acronym in platform_vendor_map:
-                matched_vendor = platform_vendor_map[vendor_acronym][0]
-                match_type = "acronym"
-                match_found = True
-            else:
-                vendor_matches, match_type = match_progressively(alt_vendor_words, product_to_vendor, "product_as_vendor")
-                if vendor_matches:
-                    matched_vendor = vendor_matches[0]
-                    match_found = True
-
-            best_score = 0.0
-            if matched_vendor:
-                vendor_platforms = db.query(Platform).filter(Platform.vendor == matched_vendor).all()
-                for platform in vendor_platforms:
-                    scores = []
-
-                    if platform.product:
-                        norm_prod = preprocess(platform.product)
-                        scores.append(fuzz.token_sort_ratio(normalized_product, norm_prod))
-
-                    for title in cpe_titles_by_platform.get(platform.id, []):
-                        scores.append(fuzz.token_sort_ratio(normalized_product, title))
-
-                    total_score = max(scores) if scores else 0
-
-                    if total_score > best_score:
-                        best_score = total_score
-                        matched_product = platform.product
-
-            if best_score >= MIN_MATCH_SCORE:
-                match_found = True
-                match_score = round(best_score, 2)
-                match_type = match_type or "product_match"
-                if best_score < 75:
-                    needs_review = True
-            else:
-                matched_product = None
-
-            target_version = extract_version(raw_product or "", config_version)
-            matched_cpes = match_version_with_cpe_uri(matched_vendor, matched_product, target_version, db)
-            matched_cpes = filter_cpes_by_version(matched_cpes, config_version)
-
-            match_types_counter[match_type] += 1
-
-            results.append({
-                "device_config_id": config.id,
-                "original_vendor": raw_vendor,
-                "original_product": raw_product,
-                "device_config_version": config_version,
-                "matched_vendor": matched_vendor,
-                "match": match_found,
-                "match_type": match_type,
-                "matched_product": matched_product,
-                "match_score": match_score,
-                "needs_review": needs_review,
-                "matched_cpe_uris": [
-                    {"cve_name": c.cve_name, "cpe_uri": c.cpe_uri}
-                    for c in matched_cpes
-                ]
-            })
-
+        # Se resuelve por bloques para puntuar en lote sin perder el progreso por configuración
+        for start in range(0, total, PROGRESS_CHUNK_SIZE):
+            chunk = pending[start:start + PROGRESS_CHUNK_SIZE]
+            with matching_metrics.collecting(metrics):
+                resolved_by_config = resolve_config_batch(chunk, index, db, since_by_config)
+            for idx, config in enumerate(chunk, start + 1):
+                if should_cancel:
+                    should_cancel()
+                resolved = resolved_by_config[config.id]
+                match_types_counter[resolved["match_type"]] += 1
+                results.append(build_config_result(config, resolved))
+
+                if yield_progress:
+                    msg = f"{idx}/{total} Procesando: Vendor={config.vendor}, Product={config.product}, Version={config.version}"
+                    yield msg
             if yield_progress:
-                msg = f"{idx}/{total} Procesando: Vendor={config.vendor}, Product={config.product}, Version={config.version}"
-                yield msg
+                yield timings_event(metrics)
 
-    if yield_progress:
-        async def generator():
-            for message in process_configs():
-                yield message
-                await asyncio.sleep(0.05)  # opcional, da margen al cliente
-
-            existing = db.query(DeviceMatch.cve_name, DeviceMatch.cpe_uri).filter(
-                DeviceMatch.device_config_id.in_([r["device_config_id"] for r in results])
-            ).all()
-            existing_set = set(existing)
-
-            to_save = []
-            for result in results:
-                for cpe_data in result["matched_cpe_uris"]:
-                    key = (cpe_data["cve_name"], cpe_data["cpe_uri"])
-                    if key not in existing_set:
-                        to_save.append(DeviceMatch(
-                            device_config_id=result["device_config_id"],
-                            cve_name=cpe_data["cve_name"],
-                            cpe_uri=cpe_data["cpe_uri"],
-                            matched_vendor=result["matched_vendor"],
-                            matched_product=result["matched_product"],
-                            match_type=result["match_type"],
-                            match_score=result["match_score"],
-                            needs_review=result["needs_review"]
-                        ))
-
-            db.bulk_save_objects(to_save)
-            db.commit()
-
-            matched = total - match_types_counter["none"]
-            summary = {
-                "total_configs": total,
-                "matched": matched,
-                "unmatched": match_types_counter["none"],
-                "match_percentage": round((matched / total) * 100, 2) if total else 0.0,
-                "by_type": dict(match_types_counter)
-            }
+    def save():
+        with matching_metrics.collecting(metrics), matching_metrics.stage("save"):
+            record_matched_configs(pending, started_at, db)
+            save_device_matches(results, db)
 
-            yield "[DONE]"
+    if yield_progress:
+        def generator():
+            yield from process_configs()
+            save()
+            yield timings_event(metrics)
 
         return generator()
 
     else:
         for _ in process_configs():
             pass  # ignorar yield
-        existing = db.query(DeviceMatch.cve_name, DeviceMatch.cpe_uri).filter(
-            DeviceMatch.device_config_id.in_([r["device_config_id"] for r in results])
-        ).all()
-        existing_set = set(existing)
-
-        to_save = []
-        for result in results:
-            for cpe_data in result["matched_cpe_uris"]:
-                key = (cpe_data["cve_name"], cpe_data["cpe_uri"])
-                if key not in existing_set:
-                    to_save.append(DeviceMatch(
-                        device_config_id=result["device_config_id"],
-                        cve_name=cpe_data["cve_name"],
-                        cpe_uri=cpe_data["cpe_uri"],
-                        matched_vendor=result["matched_vendor"],
-                        matched_product=result["matched_product"],
-                        match_type=result["match_type"],
-                        match_score=result["match_score"],
-                        needs_review=result["needs_review"]
-                    ))
-
-        db.bulk_save_objects(to_save)
-        db.commit()
-
-        matched = total - match_types_counter["none"]
-        summary = {
-            "total_configs": total,
-            "matched": matched,
-            "unmatched": match_types_counter["none"],
-            "match_percentage": round((matched / total) * 100, 2) if total else 0.0,
-            "by_type": dict(match_types_counter)
-        }
+        save()
+        summary = build_summary(len(device_configs), match_types_counter)
+        if incremental:
+            summary["incremental"] = build_incremental_summary(since_by_config, skipped)
+        summary["cache"] = match_cache.get_cache_stats()
+        summary["timings"] = metrics.as_dict()
 
         return {
             "results": results,
             "summary": summary
         }
+
+
+def match_platforms_for_devices(device_ids: list[int], db: Session, should_cancel=None, incremental: bool = False, is_dropped=None) -> dict:
+    """
+    Matching de flota: agrupa las configuraciones de todos los dispositivos por
+    terna (vendor, product, version), resuelve cada terna una sola vez y reparte
+    el resultado entre todas las configuraciones que la comparten.
+    should_cancel se llama entre bloques de ternas y lanza una excepción para
+    abortar; is_dropped(device_id) indica los dispositivos retirados del trabajo,
+    de los que no se guarda nada.
+    """
+    metrics = matching_metrics.MatchingMetrics()
+    with matching_metrics.collecting(metrics):
+        with matching_metrics.stage("index"):
+            index = get_matching_index(db)
+        started_at = datetime.utcnow()
+
+        with matching_metrics.stage("load_configs"):
+            device_configs = db.query(DeviceConfig).filter(DeviceConfig.device_id.in_(device_ids)).all()
+        with matching_metrics.stage("plan"):
+            if incremental:
+                since_by_config, skipped = plan_incremental_configs(device_configs, db)
+            else:
+                since_by_config, skipped = {c.id: None for c in device_configs}, []
+        pending = [c for c in device_configs if c.id in since_by_config]
+        unique_triples = len({config_key(*config_triple(c)) for c in pending})
+
+        print(f"🚚 Matching de flota: {len(pending)}/{len(device_configs)} configs en {len(device_ids)} dispositivos, {unique_triples} ternas únicas")
+
+        resolved_by_config = resolve_config_batch(pending, index, db, since_by_config, should_cancel=should_cancel)
+
+        if should_cancel:
+            should_cancel()
+        dropped = {d for d in device_ids if is_dropped(d)} if is_dropped else set()
+        if dropped:
+            device_configs = [c for c in device_configs if c.device_id not in dropped]
+            pending = [c for c in pending if c.device_id not in dropped]
+            skipped = [c for c in skipped if c.device_id not in dropped]
+            since_by_config = {c.id: since_by_config[c.id] for c in pending}
+
+        results = []
+        counters_by_device = defaultdict(Counter)
+        for config in skipped:
+            counters_by_device[config.device_id]["unchanged"] += 1
+        for config in pending:
+            resolved = resolved_by_config[config.id]
+            counters_by_device[config.device_id][resolved["match_type"]] += 1
+            results.append(build_config_result(config, resolved))
+
+        with matching_metrics.stage("save"):
+            record_matched_configs(pending, started_at, db)
+            saved = save_device_matches(results, db)
+
+    total_counter = Counter()
+    for counter in counters_by_device.values():
+        total_counter.update(counter)
+
+    summary = build_summary(len(device_configs), total_counter)
+    summary["unique_triples"] = unique_triples
+    summary["saved_matches"] = saved
+    if incremental:
+        summary["incremental"] = build_incremental_summary(since_by_config, skipped)
+    summary["cache"] = match_cache.get_cache_stats()
+    summary["timings"] = metrics.as_dict()
+
+    return {
+        "summary": summary,
+        "by_device": {
+            device_id: build_summary(sum(counter.values()), counter)
+            for device_id, counter in counters_by_device.items()
+        },
+        "dropped_devices": sorted(dropped),
+    }
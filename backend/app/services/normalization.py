@@ -0,0 +1,45 @@
+# backend/app/services/normalization.py
+"""
+Normalización de vendor/product/títulos para el matching. Los mismos helpers se
+usan al importar el diccionario CPE (columnas precalculadas de platform_products)
+y al normalizar las configuraciones de los dispositivos.
+"""
+import re
+from functools import lru_cache
+
+SEPARATORS = re.compile(r'[\s\-_\.]+')
+NON_WORD_OR_DASH = re.compile(r'[^\w\s-]')
+NON_WORD = re.compile(r'[^\w\s]')
+SYMBOL_REPLACEMENTS = {
+    '+': ' plus ',
+    '&': ' and '
+}
+
+# Tamaño de la caché de cadenas normalizadas (vendors/productos de configuraciones)
+NORMALIZE_CACHE_SIZE = 65536
+
+
+def normalize_separators(text: str) -> str:
+    return SEPARATORS.sub(' ', text).strip()
+
+def translate_symbols(text: str) -> str:
+    for symbol, word in SYMBOL_REPLACEMENTS.items():
+        text = text.replace(symbol, word)
+    return text
+
+def normalize(text: str) -> str:
+    if not text:
+        return ""
+    return NON_WORD_OR_DASH.sub('', text.strip().lower())
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def preprocess(text: str) -> str:
+    return normalize_separators(normalize(translate_symbols(text)))
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def extended_normalize(text: str) -> str:
+    return NON_WORD.sub('', preprocess(text))
+
+def get_acronym(text: str) -> str:
+    words = normalize(text).split()
+    return ''.join(w[0] for w in words if w)
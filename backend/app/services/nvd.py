@@ -1,49 +1,208 @@
 # app/services/nvd.py
 
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 import requests
-from app.config.urls import NVD_API_URL # Asegúrate de que NVD_API_URL apunte a la v2.0
+from requests.adapters import HTTPAdapter
+from app.config.urls import NVD_API_URL
 from app.config.secrets import NVD_API_KEY
-from datetime import datetime, timedelta
 
-HEADERS = {"apiKey": NVD_API_KEY} if NVD_API_KEY else {}
+# Ventana móvil de NVD: 50 peticiones / 30 s con API key, 5 / 30 s sin ella
+NVD_RATE_WINDOW = 30
+NVD_RATE_LIMIT_WITH_KEY = 50
+NVD_RATE_LIMIT_ANONYMOUS = 5
+
+NVD_TIMEOUT = 60
+# Páginas pedidas a la vez (siempre dentro del presupuesto del limitador)
+NVD_MAX_CONCURRENCY = 4
+NVD_MAX_RETRIES = 5
+NVD_BACKOFF_BASE = 2.0
+NVD_BACKOFF_MAX = 60.0
+# Rango máximo de lastModStartDate/lastModEndDate admitido por la API
+NVD_MAX_DATE_RANGE_DAYS = 120
+# 403 es la respuesta de NVD al superar el límite de peticiones
+RETRY_STATUS = {403, 429, 500, 502, 503, 504}
+
+
+class SlidingWindowLimiter:
+    """
+    Limitador de ventana móvil, como el que aplica NVD: como mucho `limit`
+    peticiones en cualquier intervalo de `window` segundos. Guarda la hora de
+    las últimas peticiones y acquire() bloquea hasta que la más antigua sale de
+    la ventana. Seguro entre hilos.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.window:
+                    self._sent.popleft()
+                if len(self._sent) < self.limit:
+                    self._sent.append(now)
+                    return
+                wait = self.window - (now - self._sent[0])
+            time.sleep(wait)
+
+
+class NvdClient:
+    """
+    Cliente de la API de CVEs de NVD v2.0: sesión HTTP con conexiones
+    reutilizadas, límite de peticiones según haya API key o no, timeouts y
+    reintentos con backoff exponencial y jitter ante 403/429/5xx y errores de red.
+    """
+
+    def __init__(
+        self,
+        base_url: str = NVD_API_URL,
+        api_key: str | None = NVD_API_KEY,
+        rate_limit: int | None = None,
+        rate_window: float = NVD_RATE_WINDOW,
+        max_concurrency: int = NVD_MAX_CONCURRENCY,
+        max_retries: int = NVD_MAX_RETRIES,
+        backoff_base: float = NVD_BACKOFF_BASE,
+        timeout: float = NVD_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        if rate_limit is None:
+            rate_limit = NVD_RATE_LIMIT_WITH_KEY if api_key else NVD_RATE_LIMIT_ANONYMOUS
+        self.limiter = SlidingWindowLimiter(rate_limit, rate_window)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if api_key:
+            self.session.headers["apiKey"] = api_key
+
+    def _backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Full jitter: evita que los hilos reintenten todos a la vez
+        return random.uniform(0, min(NVD_BACKOFF_MAX, self.backoff_base * 2 ** attempt))
+
+    def request(self, params: dict) -> requests.Response:
+        """GET a la API con limitador y reintentos. Devuelve la última respuesta (puede no ser 200)."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(self.base_url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                wait = self._backoff(attempt)
+                print(f"🔁 NVD: error de red ({e.__class__.__name__}), reintento {attempt + 1} en {wait:.1f}s")
+                time.sleep(wait)
+                continue
+
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                return response
+            wait = self._backoff(attempt, response.headers.get("Retry-After"))
+            print(f"🔁 NVD: HTTP {response.status_code}, reintento {attempt + 1} en {wait:.1f}s")
+            response.close()
+            time.sleep(wait)
+        return response
+
+    def get_json(self, params: dict) -> dict:
+        response = self.request(params)
+        response.raise_for_status()
+        return response.json()
+
+    def get_page(self, start_index: int, results_per_page: int, **params) -> dict:
+        return self.get_json({**params, "startIndex": start_index, "resultsPerPage": results_per_page})
+
+    def iter_pages(self, results_per_page: int = 2000, should_stop=None, **params):
+        """
+        Todas las páginas de una consulta, en orden. La primera da totalResults;
+        el resto se piden en paralelo (como mucho max_concurrency en vuelo).
+        """
+        first = self.get_page(0, results_per_page, **params)
+        yield first
+        total = first.get("totalResults", 0)
+        starts = range(results_per_page, total, results_per_page)
+        if not starts:
+            return
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="nvd") as pool:
+            pending = deque()
+            try:
+                for start in starts:
+                    if should_stop and should_stop():
+                        return
+                    pending.append(pool.submit(self.get_page, start, results_per_page, **params))
+                    if len(pending) >= self.max_concurrency:
+                        yield pending.popleft().result()
+                while pending:
+                    if should_stop and should_stop():
+                        return
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+# Cliente compartido por todo el proceso (una sola cuota de NVD)
+client = NvdClient()
 
-# Asegúrate de que NVD_API_URL sea 'https://services.nvd.nist.gov/rest/json/cves/2.0'
-# Si no lo es, cámbialo en app/config/urls.py o usa la URL directamente aquí.
 
-# Mantener las funciones existentes:
 def get_cves_by_page(start_index: int = 0, results_per_page: int = 2000):
-    params = {
-        "startIndex": start_index,
-        "resultsPerPage": results_per_page,
-    }
-    response = requests.get(NVD_API_URL, headers=HEADERS, params=params)
-    response.raise_for_status()
-    return response.json()
+    return client.get_page(start_index, results_per_page)
+
+
+def iter_cve_pages(results_per_page: int = 2000, should_stop=None, **params):
+    return client.iter_pages(results_per_page, should_stop=should_stop, **params)
+
+
+def nvd_datetime(value: datetime) -> str:
+    """Fecha UTC (naive) en el formato ISO-8601 con desfase que espera la API."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S.000+00:00")
+
+
+def iter_modified_cve_pages(since: datetime, until: datetime, results_per_page: int = 2000, should_stop=None):
+    """
+    Páginas de CVEs cuya fecha lastModified está entre `since` y `until` (UTC),
+    troceando el intervalo en ventanas de como mucho NVD_MAX_DATE_RANGE_DAYS.
+    """
+    start = since
+    while start < until:
+        if should_stop and should_stop():
+            return
+        end = min(until, start + timedelta(days=NVD_MAX_DATE_RANGE_DAYS))
+        yield from client.iter_pages(
+            results_per_page,
+            should_stop=should_stop,
+            lastModStartDate=nvd_datetime(start),
+            lastModEndDate=nvd_datetime(end),
+        )
+        start = end
+
 
 def get_cves_by_keyword(keyword: str, results_per_page: int = 10):
-    headers = {"apiKey": NVD_API_KEY} if NVD_API_KEY else {}
-    params = {
-        "keywordSearch": keyword,
-        "resultsPerPage": results_per_page,
-    }
-    response = requests.get(NVD_API_URL, headers=headers, params=params)
-    response.raise_for_status()
-    return response.json()
-
-# Esta función ya existe y hace una petición por CVE ID
+    return client.get_json({"keywordSearch": keyword, "resultsPerPage": results_per_page})
+
+
 def get_cve_details_from_nvd(cve_id: str) -> dict:
-    url = f"https://services.nvd.nist.gov/rest/json/cves/2.0?cveId={cve_id}" # Using cveId parameter
-    headers = {
-        "apiKey": NVD_API_KEY,
-        "Content-Type": "application/json"
-    }
-    response = requests.get(url, headers=headers)
+    response = client.request({"cveId": cve_id})
 
     if response.status_code == 200:
         data = response.json()
         vulnerabilities = data.get("vulnerabilities")
         if vulnerabilities:
-            return vulnerabilities[0] # Return the first vulnerability found
+            return vulnerabilities[0]
         else:
             print(f"❌ El CVE {cve_id} no fue encontrado en los resultados (aunque el status fue 200).")
             return None
@@ -55,73 +214,24 @@ def get_cve_details_from_nvd(cve_id: str) -> dict:
         print(f"❌ Error al traer el CVE {cve_id}: {response.status_code} {response.text}")
         return None
 
-def get_all_cve_ids(results_per_page=2000):
-    from backend.app.services.import_status_cve import _stop_event
-
-    print("📞 Entrando en get_all_cve_ids()")
-    url = "https://services.nvd.nist.gov/rest/json/cves/2.0"
-    total = get_total_cve_count_from_nvd()
-    total_pages = (total // results_per_page) + 1
-
-    for page in range(total_pages):
-        if _stop_event.is_set():
-            print("🛑 Detención solicitada en get_all_cve_ids - se cancela descarga")
-            break
-
-        start_index = page * results_per_page
-        print(f"🌐 Solicitando página {page + 1}/{total_pages} (startIndex={start_index})")
-        params = {
-            "startIndex": start_index,
-            "resultsPerPage": results_per_page,
-        }
-        response = requests.get(url, params=params, headers=HEADERS)
-
-        if response.status_code == 200:
-            print("📥 Respuesta recibida - Status 200")
-            data = response.json()
-            page_ids = []
-            for item in data.get("vulnerabilities", []):
-                cve = item.get("cve", {})
-                cve_id = cve.get("id")
-                if cve_id:
-                    page_ids.append(cve_id.strip().upper())
-            yield page_ids
-        else:
-            print(f"❌ Error al solicitar CVEs: {response.status_code}")
-            break
 
-# ¡FUNCIÓN CLAVE A REVERTIR PARA LLAMAR INDIVIDUALMENTE!
-def get_cves_by_id(cve_ids: list[str]) -> dict:
+def get_cves_by_id(cve_ids: list[str], max_workers: int | None = None) -> dict:
     """
-    Obtiene los detalles de una lista de CVEs desde NVD API v2.0.
-    Hace peticiones individuales para cada CVE ID usando get_cve_details_from_nvd.
-    Esto es para manejar casos donde los lotes de cveIds no funcionan.
+    Obtiene los detalles de una lista de CVEs desde NVD API v2.0. La API no
+    admite varios cveId en la misma consulta, así que se hace una petición por
+    CVE, en paralelo y dentro de la cuota del limitador. Solo para CVEs sueltos:
+    los lotes grandes se traen por páginas (iter_cve_pages).
     """
-    all_vulnerabilities = []
-    
-    for cve_id in cve_ids:
-        # Usamos la función existente para obtener detalles de un solo CVE
-        # Esto imprimirá '🌐 Fetching CVE individually: CVE-XXXX-XXXX' si esa función lo hace
-        # O 'ℹ️ El CVE {cve_id} no fue encontrado...' para 404s
-        details = get_cve_details_from_nvd(cve_id)
-        if details:
-            all_vulnerabilities.append(details)
-        # No hay necesidad de manejar el 404 aquí, get_cve_details_from_nvd ya lo hace.
-        # Simplemente no añadimos el CVE si no se pudo obtener.
-
-    return {"vulnerabilities": all_vulnerabilities}
+    if not cve_ids:
+        return {"vulnerabilities": []}
+    workers = max(1, min(len(cve_ids), max_workers or client.max_concurrency))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nvd-id") as pool:
+        details = list(pool.map(get_cve_details_from_nvd, cve_ids))
+    return {"vulnerabilities": [item for item in details if item]}
 
 
 def get_total_cve_count_from_nvd() -> int:
-    url = "https://services.nvd.nist.gov/rest/json/cves/2.0"
-    params = {'startIndex': 0, 'resultsPerPage': 1}
-    response = requests.get(url, params=params, headers=HEADERS)
+    response = client.request({"startIndex": 0, "resultsPerPage": 1})
     if response.status_code == 200:
-        data = response.json()
-        return data.get('totalResults', 0)
+        return response.json().get("totalResults", 0)
     return 0
-
-# Si tenías get_cves_modified_since, mantenla para futuras extensiones
-# def get_cves_modified_since(start_date: datetime, results_per_page: int = 2000):
-#     # ... (código existente para buscar por fechas) ...
-#     pass
\ No newline at end of file
@@ -1,7 +1,15 @@
 import os
+import re
 import gzip
 import shutil
 import json
+from packaging.version import Version, InvalidVersion
+
+# Los ':' escapados (\:) forman parte del valor y no separan componentes
+CPE_SEPARATOR = re.compile(r'(?<!\\):')
+CPE_COMPONENTS = ("part", "vendor", "product", "version", "target_sw", "target_hw")
+# Tokens numéricos y alfabéticos de versiones que no siguen PEP 440 (8.0(1), 12.2(55)SE, r12...)
+VERSION_TOKENS = re.compile(r'\d+|[a-z]+')
 
 def extract_cvss_data_from_feed(metrics: dict) -> dict:
     try:
@@ -154,4 +162,97 @@ def decompress_once(filepath: str) -> str:
         with gzip.open(filepath, 'rb') as f_in:
             with open(json_path, 'wb') as f_out:
                 shutil.copyfileobj(f_in, f_out)
-    return json_path
\ No newline at end of file
+    return json_path
+
+
+def parse_cpe_components(uri: str) -> dict:
+    """
+    Separa un CPE 2.3 (cpe:2.3:part:vendor:product:version:update:edition:
+    language:sw_edition:target_sw:target_hw:other) en las columnas indexadas.
+    """
+    parts = CPE_SEPARATOR.split(uri or "")
+    if len(parts) < 13:
+        return {key: None for key in CPE_COMPONENTS}
+    return {
+        "part": parts[2],
+        "vendor": parts[3],
+        "product": parts[4],
+        "version": parts[5],
+        "target_sw": parts[10],
+        "target_hw": parts[11],
+    }
+
+
+def _sortable_number(n: int) -> str:
+    # Prefijo con el número de dígitos: el orden lexicográfico coincide con el numérico
+    digits = str(n)
+    return f"{len(digits):02d}{digits}"
+
+
+def _release_key(release) -> str:
+    release = list(release)
+    while release and release[-1] == 0:
+        release.pop()
+    return "".join(f".{_sortable_number(n)}" for n in release)
+
+
+def version_sort_key(version: str) -> str | None:
+    """
+    Clave normalizada de una versión que se ordena lexicográficamente igual que
+    packaging.version.Version (sin la parte local). Las versiones que no son
+    PEP 440 se descomponen en tokens numéricos/alfabéticos y se ordenan justo
+    después de su parte numérica inicial. Las claves deben compararse byte a
+    byte (collation "C" en PostgreSQL).
+    """
+    version = (version or "").strip()
+    if not version or version in ("*", "-"):
+        return None
+
+    try:
+        parsed = Version(version)
+    except InvalidVersion:
+        parsed = None
+
+    if parsed is not None:
+        key = _sortable_number(parsed.epoch) + _release_key(parsed.release)
+        # Todos los marcadores son < '.' para que 1.0rc1/1.0.post1 queden por debajo de 1.0.1
+        if parsed.pre is not None:
+            letter, number = parsed.pre
+            key += "%" + {"a": "a", "b": "b", "rc": "c"}[letter] + _sortable_number(number)
+        elif parsed.dev is not None and parsed.post is None:
+            key += "$"
+        else:
+            key += "("
+        key += ")" if parsed.post is None else "*" + _sortable_number(parsed.post)
+        key += "\"" if parsed.dev is None else "!" + _sortable_number(parsed.dev)
+        return key
+
+    tokens = VERSION_TOKENS.findall(version.lower())
+    release = []
+    while tokens and tokens[0].isdigit():
+        release.append(int(tokens.pop(0)))
+    key = _sortable_number(0) + _release_key(release)
+    if not tokens:
+        return key + "()\""
+    key += "-"
+    for token in tokens:
+        key += f".{_sortable_number(int(token))}" if token.isdigit() else f"/{token} "
+    return key
+
+
+def version_range_keys(start_including=None, start_excluding=None, end_including=None, end_excluding=None) -> dict:
+    """Límites de versión de un cve_cpe precalculados como claves ordenables."""
+    start_key = version_sort_key(start_excluding)
+    start_inclusive = start_key is None
+    if start_key is None:
+        start_key = version_sort_key(start_including)
+    end_key = version_sort_key(end_excluding)
+    end_inclusive = end_key is None
+    if end_key is None:
+        end_key = version_sort_key(end_including)
+    return {
+        "version_start_key": start_key,
+        "version_start_inclusive": start_inclusive if start_key is not None else None,
+        "version_end_key": end_key,
+        "version_end_inclusive": end_inclusive if end_key is not None else None,
+    }
@@ -0,0 +1,159 @@
+# backend/benchmarks/synthetic.py
+"""
+Generadores de datos sintéticos para el benchmark de matching: diccionario CPE
+(platforms + cpe_titles), CVEs con rangos de versión (vulnerabilities + cve_cpe)
+e inventarios con la forma de system_config.json.
+"""
+import random
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.models.device import Device
+from app.models.device_config import DeviceConfig
+from app.models.platform import Platform
+from app.models.cpe_title import CpeTitle
+from app.models.vulnerability import Vulnerability
+from app.models.cve_cpe import CveCpe
+from app.crud import platform_products as crud_platform_products
+from app.services.utils import parse_cpe_components, version_range_keys
+
+INSERT_BATCH_SIZE = 10000
+
+SYLLABLES = [
+    "ab", "ac", "al", "an", "ar", "ba", "be", "bi", "co", "da", "de", "di", "el", "en", "fa", "fi",
+    "ga", "ge", "in", "ka", "ki", "la", "le", "lo", "ma", "me", "mi", "mo", "na", "ne", "no", "or",
+    "pa", "pe", "po", "ra", "re", "ri", "ro", "sa", "se", "si", "so", "ta", "te", "ti", "to", "va",
+    "ve", "vi", "xa", "ze", "zo",
+]
+PRODUCT_WORDS = [
+    "studio", "server", "client", "manager", "agent", "viewer", "editor", "player", "browser",
+    "office", "suite", "tools", "runtime", "sdk", "driver", "gateway", "console", "desktop",
+    "cloud", "sync", "backup", "reader", "writer", "monitor", "toolkit", "framework", "engine",
+]
+VENDOR_SUFFIXES = ["Inc.", "LLC", "Corporation", "Ltd", "GmbH", "S.A.", "Software", ""]
+TYPE_MAP = {"hardware": "h", "os": "o", "applications": "a"}
+
+
+def _word(rng: random.Random, syllables: int) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+
+def _version(rng: random.Random) -> str:
+    return f"{rng.randint(1, 30)}.{rng.randint(0, 20)}.{rng.randint(0, 9999)}"
+
+
+def generate_catalogue(platforms: int, seed: int = 1, versions_per_product: int = 10) -> list[dict]:
+    """
+    Catálogo de productos sintéticos: [{vendor, product, title, versions}].
+    El número total de versiones es aproximadamente `platforms`.
+    """
+    rng = random.Random(seed)
+    products = max(1, platforms // versions_per_product)
+    vendors = [_word(rng, rng.randint(2, 4)) for _ in range(max(1, products // 8))]
+
+    catalogue = []
+    seen = set()
+    while len(catalogue) < products:
+        vendor = rng.choice(vendors)
+        product = "_".join([_word(rng, 2)] + rng.sample(PRODUCT_WORDS, rng.randint(0, 2)))
+        if (vendor, product) in seen:
+            continue
+        seen.add((vendor, product))
+        title = f"{vendor.capitalize()} {product.replace('_', ' ').title()}"
+        versions = sorted({_version(rng) for _ in range(versions_per_product)})
+        catalogue.append({"vendor": vendor, "product": product, "title": title, "versions": versions})
+    return catalogue
+
+
+def load_catalogue(db: Session, catalogue: list[dict], cve_ratio: float = 0.3, seed: int = 1) -> dict:
+    """Carga platforms, cpe_titles, vulnerabilities y cve_cpe; regenera el catálogo de matching."""
+    rng = random.Random(seed)
+    platform_rows, title_rows, cve_rows, cve_cpe_rows = [], [], [], []
+    platform_id = 0
+    for item in catalogue:
+        for version in item["versions"]:
+            platform_id += 1
+            uri = f"cpe:2.3:a:{item['vendor']}:{item['product']}:{version}:*:*:*:*:*:*:*"
+            platform_rows.append({"id": platform_id, "cpe_uri": uri, **parse_cpe_components(uri), "deprecated": False})
+            title_rows.append({"platform_id": platform_id, "lang": "en", "value": f"{item['title']} {version}"})
+
+        if rng.random() < cve_ratio:
+            cve_id = f"CVE-2099-{len(cve_rows) + 1:07d}"
+            low, high = item["versions"][0], item["versions"][-1]
+            uri = f"cpe:2.3:a:{item['vendor']}:{item['product']}:*:*:*:*:*:*:*:*"
+            cve_rows.append({"cve_id": cve_id})
+            cve_cpe_rows.append({
+                "cve_name": cve_id,
+                "cpe_uri": uri,
+                "version_start_including": low,
+                "version_end_excluding": high,
+                **parse_cpe_components(uri),
+                **version_range_keys(low, None, None, high),
+            })
+
+    for model, rows in ((Platform, platform_rows), (CpeTitle, title_rows), (Vulnerability, cve_rows), (CveCpe, cve_cpe_rows)):
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            db.execute(insert(model), rows[start:start + INSERT_BATCH_SIZE])
+    db.commit()
+    products = crud_platform_products.refresh_platform_products(db)
+    return {"platforms": len(platform_rows), "products": products, "cves": len(cve_rows)}
+
+
+def generate_inventory(catalogue: list[dict], configs: int, hit_ratio: float = 0.7, seed: int = 2) -> dict:
+    """
+    Inventario con la forma de system_config.json ({hardware, os, applications}).
+    hit_ratio es la fracción de aplicaciones que corresponden a productos del
+    catálogo, escritas como las reporta Windows (sufijos de empresa, arquitectura...).
+    """
+    rng = random.Random(seed)
+    applications = []
+    for _ in range(max(0, configs - 2)):
+        if catalogue and rng.random() < hit_ratio:
+            item = rng.choice(catalogue)
+            suffix = rng.choice(["", " (x64)", " (x64 en-US)", f" {item['versions'][0].split('.')[0]}"])
+            applications.append({
+                "vendor": f"{item['vendor'].capitalize()} {rng.choice(VENDOR_SUFFIXES)}".strip(),
+                "product": f"{item['title']}{suffix}",
+                "version": rng.choice(item["versions"]),
+            })
+        else:
+            applications.append({
+                "vendor": f"{_word(rng, 3).capitalize()} {rng.choice(VENDOR_SUFFIXES)}".strip(),
+                "product": f"{_word(rng, 3).capitalize()} {rng.choice(PRODUCT_WORDS).title()}",
+                "version": _version(rng),
+            })
+    return {
+        "hardware": [{"vendor": "GenuineIntel", "product": "Intel(R) Core(TM) i7-9700 CPU", "version": ""}],
+        "os": [{"vendor": "Microsoft", "product": "Windows 11 Pro", "version": "23H2"}],
+        "applications": applications,
+    }
+
+
+def load_inventory(db: Session, user_id: int, inventory: dict, alias: str) -> int:
+    """Crea un dispositivo con las configuraciones del inventario, como POST /devices."""
+    device = Device(user_id=user_id, alias=alias, type="pc", os_name="Windows")
+    db.add(device)
+    db.flush()
+    rows = [
+        {
+            "device_id": device.id,
+            "type": TYPE_MAP[section],
+            "vendor": entry.get("vendor", ""),
+            "product": entry.get("product", ""),
+            "version": entry.get("version", None),
+        }
+        for section in ("hardware", "os", "applications")
+        for entry in inventory.get(section, [])
+    ]
+    db.execute(insert(DeviceConfig), rows)
+    db.commit()
+    return device.id
+
+
+def get_benchmark_user(db: Session) -> int:
+    user = db.query(User).filter_by(username="benchmark").first()
+    if user is None:
+        user = User(username="benchmark", email="benchmark@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+    return user.id
@@ -0,0 +1,84 @@
+# backend/tests/test_cpe_download.py
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from app.services import cpe_importer
+
+CPE_XML = (
+    b'<?xml version="1.0" encoding="UTF-8"?>'
+    b'<cpe-list xmlns="http://cpe.mitre.org/dictionary/2.0" xmlns:cpe-23="http://scap.nist.gov/schema/cpe-extension/2.3">'
+    + b"".join(
+        b'<cpe-item name="cpe:/a:acme:widget:%d"><title xml:lang="en-US">Acme Widget %d</title>'
+        b'<cpe-23:cpe23-item name="cpe:2.3:a:acme:widget:%d:*:*:*:*:*:*:*"/></cpe-item>' % (i, i, i)
+        for i in range(2000)
+    )
+    + b"</cpe-list>"
+)
+
+
+class FakeNvdHandler(BaseHTTPRequestHandler):
+    payload = gzip.compress(CPE_XML)
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(dict(self.headers))
+        if self.headers.get("If-Modified-Since"):
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-gzip")
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        # Trozos pequeños para que el cliente reciba la descarga por partes
+        for start in range(0, len(self.payload), 4096):
+            self.wfile.write(self.payload[start:start + 4096])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_nvd():
+    FakeNvdHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNvdHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/official-cpe-dictionary_v2.3.xml.gz"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_decompresses_in_chunks(fake_nvd, tmp_path, monkeypatch):
+    monkeypatch.setattr(cpe_importer, "DOWNLOAD_CHUNK_SIZE", 1024)
+    path = str(tmp_path / "cpe.xml")
+
+    cpe_importer.download_cpe_xml_if_needed(url=fake_nvd, path=path)
+    with open(path, "rb") as f:
+        assert f.read() == CPE_XML
+    assert not (tmp_path / "cpe.xml.part").exists()
+
+    # Con el XML local ya descargado se pide con If-Modified-Since y no se reescribe
+    cpe_importer.download_cpe_xml_if_needed(url=fake_nvd, path=path)
+    assert "If-Modified-Since" in FakeNvdHandler.requests[-1]
+    with open(path, "rb") as f:
+        assert f.read() == CPE_XML
+
+
+def test_parser_reads_from_the_download(fake_nvd, tmp_path):
+    path = str(tmp_path / "cpe.xml")
+
+    with cpe_importer.open_cpe_xml(url=fake_nvd, path=path) as xml_file:
+        items = list(cpe_importer.iter_cpe_items(xml_file))
+        assert cpe_importer.read_fraction(xml_file) == 1.0
+
+    assert len(items) == 2000
+    assert items[5]["cpe_uri"] == "cpe:2.3:a:acme:widget:5:*:*:*:*:*:*:*"
+    assert items[5]["titles"] == [("en-US", "Acme Widget 5")]
+    with open(path, "rb") as f:
+        assert f.read() == CPE_XML
+
+    # Segunda vez: sin versión nueva se parsea el XML local
+    with cpe_importer.open_cpe_xml(url=fake_nvd, path=path) as xml_file:
+        assert sum(1 for _ in cpe_importer.iter_cpe_items(xml_file)) == 2000
@@ -0,0 +1,69 @@
+# backend/tests/test_cpe_import.py
+import io
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+import app.models  # noqa: F401 (registra todos los modelos en Base.metadata)
+from app.models import Platform
+from app.services import cpe_importer
+from tests.test_cpe_download import CPE_XML
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine, autoflush=False)
+    engine.dispose()
+
+
+def test_chunks_are_capped_at_chunk_bytes():
+    chunk_bytes = 4096
+    chunks = list(cpe_importer.iter_cpe_chunks(io.BytesIO(CPE_XML), chunk_bytes=chunk_bytes, read_size=64 * 1024))
+
+    # Lecturas mayores que chunk_bytes se reparten en varios trozos, ninguno por encima del límite
+    header_and_footer = CPE_XML.index(b'<cpe-item') - CPE_XML.index(b'<cpe-list') + len(b'</cpe-list>')
+    assert len(chunks) > len(CPE_XML) // (64 * 1024)
+    assert all(len(chunk) <= chunk_bytes + header_and_footer for chunk in chunks)
+    assert sum(len(cpe_importer.parse_cpe_chunk(chunk)) for chunk in chunks) == 2000
+
+
+def test_oversized_item_gets_its_own_chunk():
+    chunks = list(cpe_importer.iter_cpe_chunks(io.BytesIO(CPE_XML), chunk_bytes=16, read_size=1024))
+    assert [len(cpe_importer.parse_cpe_chunk(chunk)) for chunk in chunks] == [1] * 2000
+
+
+def test_pool_batches_follow_batch_size():
+    batches = list(cpe_importer.iter_parsed_batches(io.BytesIO(CPE_XML), workers=2, batch_size=300, chunk_bytes=50_000))
+
+    assert [len(batch) for batch in batches] == [300] * 6 + [200]
+    uris = [item["cpe_uri"] for batch in batches for item in batch]
+    assert uris == [f"cpe:2.3:a:acme:widget:{i}:*:*:*:*:*:*:*" for i in range(2000)]
+
+
+def test_stopped_pipeline_skips_the_refresh(session_factory, tmp_path, monkeypatch):
+    path = tmp_path / "cpe.xml"
+    path.write_bytes(CPE_XML)
+    monkeypatch.setattr(cpe_importer, "SessionLocal", session_factory)
+    refreshed, events, loaded = [], [], []
+    monkeypatch.setattr(cpe_importer.CpeImportPipeline, "refresh", lambda self, db: refreshed.append(True))
+
+    pipeline = cpe_importer.CpeImportPipeline(
+        filepath=str(path), batch_size=500, workers=1,
+        progress=events.append, should_stop=lambda: len(loaded) == 2,
+    )
+    original_load = pipeline.load
+    pipeline.load = lambda db, batch: (loaded.append(len(batch)), original_load(db, batch))
+    stats = pipeline.run()
+
+    assert stats["stopped"] and stats["processed"] == 1000
+    assert refreshed == []
+    assert events[-1]["label"] == "cpe.aborted_by_user" and events[-1]["stage"] == "stopped"
+    assert session_factory().query(Platform).count() == 1000
+
+    # Sin detener: se completa y se regenera el catálogo
+    pipeline = cpe_importer.CpeImportPipeline(filepath=str(path), batch_size=500, workers=1)
+    assert not pipeline.run()["stopped"]
+    assert refreshed == [True]
@@ -0,0 +1,88 @@
+# backend/tests/test_cpe_loader.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+import app.models  # noqa: F401 (registra todos los modelos en Base.metadata)
+from app.models import CPEReference, CpeDeprecatedBy, CpeTitle, Platform
+from app.services import cpe_loader
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def cpe_item(n: int, title: str = None, content_hash: str = "h0", deprecated_by: tuple = ()) -> dict:
+    return {
+        "cpe_uri": f"cpe:2.3:a:acme:widget:{n}:*:*:*:*:*:*:*",
+        "deprecated": bool(deprecated_by),
+        "titles": [("en", title or f"Acme Widget {n}")],
+        "references": [(f"https://example.org/{n}", "Version")],
+        "deprecated_by": list(deprecated_by),
+        "content_hash": content_hash,
+    }
+
+
+def stored(db) -> dict:
+    """{cpe_uri: (títulos, referencias, deprecated-by)} leídos a través de platform_id."""
+    result = {}
+    for platform in db.query(Platform):
+        result[platform.cpe_uri] = (
+            [t.value for t in db.query(CpeTitle).filter_by(platform_id=platform.id)],
+            [r.ref for r in db.query(CPEReference).filter_by(platform_id=platform.id)],
+            [d.cpe_uri for d in db.query(CpeDeprecatedBy).filter_by(platform_id=platform.id)],
+        )
+    return result
+
+
+def test_children_follow_their_platform_ids(db, monkeypatch):
+    monkeypatch.setattr(cpe_loader, "RETURNING_CHUNK_SIZE", 3)
+    cpe_loader.load_cpe_batch(db, [cpe_item(0)])
+    # 0 ya existe y 5 está repetido dentro del bloque: no deben desplazar las filas hijas del resto
+    batch = [cpe_item(n) for n in range(8)] + [cpe_item(5, "Repetido")]
+    batch[3] = cpe_item(3, deprecated_by=("cpe:2.3:a:acme:widget:4:*:*:*:*:*:*:*",))
+
+    counts = cpe_loader.load_cpe_batch(db, batch)
+
+    assert counts == {"platforms": 7, "titles": 7, "references": 7, "deprecated_by": 1}
+    assert stored(db) == {
+        f"cpe:2.3:a:acme:widget:{n}:*:*:*:*:*:*:*": (
+            [f"Acme Widget {n}"],
+            [f"https://example.org/{n}"],
+            ["cpe:2.3:a:acme:widget:4:*:*:*:*:*:*:*"] if n == 3 else [],
+        )
+        for n in range(8)
+    }
+
+
+def test_delta_rewrites_only_changed_items(db):
+    cpe_loader.load_cpe_batch(db, [cpe_item(n) for n in range(3)])
+    ids = {p.cpe_uri: p.id for p in db.query(Platform)}
+    unchanged_at = db.query(Platform).filter_by(cpe_uri=cpe_item(0)["cpe_uri"]).one().imported_at
+
+    changed = cpe_item(1, "Acme Widget Uno", content_hash="h1")
+    changed["references"] = [("https://example.org/uno", "Advisory")]
+    batch = [cpe_item(0, "Ignorado"), changed, cpe_item(2), cpe_item(3)]
+
+    counts = cpe_loader.load_cpe_batch(db, batch, delta=True)
+
+    assert counts == {"platforms": 2, "titles": 2, "references": 2, "deprecated_by": 0}
+    db.expire_all()
+    assert stored(db) == {
+        cpe_item(0)["cpe_uri"]: (["Acme Widget 0"], ["https://example.org/0"], []),
+        cpe_item(1)["cpe_uri"]: (["Acme Widget Uno"], ["https://example.org/uno"], []),
+        cpe_item(2)["cpe_uri"]: (["Acme Widget 2"], ["https://example.org/2"], []),
+        cpe_item(3)["cpe_uri"]: (["Acme Widget 3"], ["https://example.org/3"], []),
+    }
+    # Las actualizadas conservan su id; las que no cambian ni se tocan
+    platforms = {p.cpe_uri: p for p in db.query(Platform)}
+    assert {uri: platforms[uri].id for uri in ids} == ids
+    assert platforms[cpe_item(0)["cpe_uri"]].imported_at == unchanged_at
+    assert platforms[cpe_item(1)["cpe_uri"]].content_hash == "h1"
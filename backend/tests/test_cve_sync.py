@@ -0,0 +1,196 @@
+# backend/tests/test_cve_sync.py
+import asyncio
+import json
+import time
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+import app.models  # noqa: F401 (registra todos los modelos en Base.metadata)
+from app.models import CpeTitle, Device, DeviceConfig, DeviceMatch, Platform, User
+from app.models.cve_cpe import CveCpe
+from app.models.cve_description import CveDescription
+from app.crud import sync_watermarks as crud_watermarks
+from app.services import cve_importer, match_cache, nvd
+from app.services.matching_index import invalidate_matching_index
+from app.services.matching_service import match_platforms_for_device
+from app.services.nvd import NvdClient
+from tests.test_nvd_client import CVE_IDS, fake_nvd  # noqa: F401 (fixture del NVD de pruebas)
+
+CHROME = "cpe:2.3:a:google:chrome:*:*:*:*:*:*:*:*"
+FIREFOX = "cpe:2.3:a:mozilla:firefox:*:*:*:*:*:*:*:*"
+
+
+def nvd_item(cve_id: str, cpes: list, description: str = "desc", last_modified: str = "2024-06-01T00:00:00.000") -> dict:
+    return {"cve": {
+        "id": cve_id,
+        "lastModified": last_modified,
+        "descriptions": [{"lang": "en", "value": description}],
+        "references": [{"url": f"https://example.org/{cve_id}"}],
+        "configurations": [{"nodes": [{"cpeMatch": [
+            {"vulnerable": True, "criteria": uri, **bounds} for uri, bounds in cpes
+        ]}]}],
+    }}
+
+
+def upsert(db, *items):
+    return cve_importer.upsert_cves_to_db(db, cve_importer.parse_cves_from_nvd({"vulnerabilities": list(items)}))
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    # Sin esto SQLite no aplica ON DELETE CASCADE
+    event.listen(engine, "connect", lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False)()
+    invalidate_matching_index()
+    match_cache.clear_match_cache()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def chrome_config(db):
+    user = User(username="u", email="u@example.org", hashed_password="x")
+    db.add(user)
+    db.flush()
+    platform = Platform(cpe_uri="cpe:2.3:a:google:chrome:126.0:*:*:*:*:*:*:*", vendor="google", product="chrome", version="126.0")
+    db.add(platform)
+    db.flush()
+    db.add(CpeTitle(platform_id=platform.id, lang="en", value="Google Chrome 126.0"))
+    device = Device(user_id=user.id, alias="pc")
+    db.add(device)
+    db.flush()
+    config = DeviceConfig(device_id=device.id, type="a", vendor="Google LLC", product="Google Chrome", version="126.0.6478.127")
+    db.add(config)
+    db.commit()
+    return config
+
+
+def test_upsert_inserts_then_updates(db):
+    assert upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})], "old")) == {"new": 1, "updated": 0}
+    assert upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})], "new"), nvd_item("CVE-2024-0002", [])) == {"new": 1, "updated": 1}
+    assert [d.value for d in db.query(CveDescription).order_by(CveDescription.value)] == ["desc", "new"]
+
+
+def test_upsert_keeps_unchanged_matches_and_drops_stale_ones(db, chrome_config):
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {}), (FIREFOX, {})]), nvd_item("CVE-2024-0002", [(CHROME, {})]))
+    for cve_name, cpe_uri in (("CVE-2024-0001", CHROME), ("CVE-2024-0001", FIREFOX), ("CVE-2024-0002", CHROME)):
+        db.add(DeviceMatch(device_config_id=chrome_config.id, cve_name=cve_name, cpe_uri=cpe_uri, solved=True))
+    db.commit()
+    unchanged_at = db.get(CveCpe, ("CVE-2024-0001", CHROME)).imported_at
+
+    # 0001: chrome igual, firefox ya no aparece; 0002: chrome con un rango nuevo
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})]), nvd_item("CVE-2024-0002", [(CHROME, {"versionEndExcluding": "0.1"})]))
+
+    db.expire_all()
+    assert [(m.cve_name, m.cpe_uri, m.solved) for m in db.query(DeviceMatch)] == [("CVE-2024-0001", CHROME, True)]
+    assert db.get(CveCpe, ("CVE-2024-0001", CHROME)).imported_at == unchanged_at
+    assert db.get(CveCpe, ("CVE-2024-0001", FIREFOX)) is None
+    changed = db.get(CveCpe, ("CVE-2024-0002", CHROME))
+    assert changed.version_end_excluding == "0.1"
+    assert changed.imported_at > unchanged_at
+
+
+def test_rematch_after_range_change(db, chrome_config):
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {"versionEndExcluding": "999.0"})]))
+    match_platforms_for_device(chrome_config.device_id, db)
+    assert db.query(DeviceMatch).count() == 1
+
+    # El nuevo rango deja fuera la versión instalada: ni el rematch incremental ni el completo la devuelven
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {"versionEndExcluding": "0.1"})]))
+    match_platforms_for_device(chrome_config.device_id, db, incremental=True)
+    assert db.query(DeviceMatch).count() == 0
+    match_platforms_for_device(chrome_config.device_id, db)
+    assert db.query(DeviceMatch).count() == 0
+
+    # Si vuelve a aplicar, el rematch incremental la recupera
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {"versionEndExcluding": "200.0"})]))
+    match_platforms_for_device(chrome_config.device_id, db, incremental=True)
+    assert [m.cve_name for m in db.query(DeviceMatch)] == ["CVE-2024-0001"]
+
+
+def test_sync_modified_cves_persists_the_watermark(db, monkeypatch):
+    calls = []
+    page = {"startIndex": 0, "totalResults": 2, "vulnerabilities": [nvd_item("CVE-2024-0001", []), nvd_item("CVE-2024-0002", [])]}
+
+    def fake_pages(since, until, results_per_page, should_stop=None):
+        calls.append((since, until))
+        return iter([page])
+
+    monkeypatch.setattr(cve_importer, "iter_modified_cve_pages", fake_pages)
+    since = datetime(2024, 5, 1)
+
+    progress = list(cve_importer.sync_modified_cves(db, since))
+
+    assert progress[-1]["new"] == 2 and progress[-1]["window_fraction"] == 1.0
+    (called_since, until), = calls
+    assert called_since == since
+    # La marca de agua es la hora de inicio de la sincronización, no la de fin
+    assert crud_watermarks.get_watermark(db, cve_importer.CVE_SYNC_WATERMARK) == until
+
+    # Una sincronización detenida no mueve la marca de agua
+    list(cve_importer.sync_modified_cves(db, until, should_stop=lambda: True))
+    assert crud_watermarks.get_watermark(db, cve_importer.CVE_SYNC_WATERMARK) == until
+    assert calls[-1][0] == until
+
+
+@pytest.mark.parametrize("nvd_total", [2, 3])
+def test_first_page_pass_updates_modified_cves_before_the_watermark(db, monkeypatch, nvd_total):
+    # Guardados antes de existir la marca de agua; 0001 se ha modificado en NVD después
+    upsert(db, nvd_item("CVE-2024-0001", [], "old", last_modified="2024-01-01T00:00:00.000"))
+    upsert(db, nvd_item("CVE-2024-0002", [], "same", last_modified="2024-01-01T00:00:00.000"))
+    items = [
+        nvd_item("CVE-2024-0001", [], "new", last_modified="2024-06-01T00:00:00.000"),
+        nvd_item("CVE-2024-0002", [], "same", last_modified="2024-01-01T00:00:00.000"),
+        nvd_item("CVE-2024-0003", [], "added"),
+    ][:nvd_total]
+    monkeypatch.setattr(cve_importer, "SessionLocal", sessionmaker(bind=db.get_bind(), autoflush=False))
+    monkeypatch.setattr(cve_importer, "get_total_cve_count_from_nvd", lambda: len(items))
+    monkeypatch.setattr(cve_importer, "iter_cve_pages", lambda *args, **kwargs: iter([{"vulnerabilities": items}]))
+
+    before = datetime.utcnow()
+    done = json.loads(list(cve_importer.iter_cve_import_events(results_per_page=2000))[-1])
+
+    # También con el mismo número de CVEs en NVD y en la BD se hace la pasada
+    assert (done["imported"], done["updated"]) == (nvd_total - 2, 1)
+    db.expire_all()
+    assert sorted(d.value for d in db.query(CveDescription)) == sorted(["new", "same", "added"][:nvd_total])
+    assert crud_watermarks.get_watermark(db, cve_importer.CVE_SYNC_WATERMARK) >= before
+
+
+def test_import_keeps_the_event_loop_responsive(db, fake_nvd, monkeypatch):
+    # Limitador estricto: la importación pasa la mayor parte del tiempo esperando turno
+    monkeypatch.setattr(nvd, "client", NvdClient(base_url=fake_nvd, api_key=None, rate_limit=2, rate_window=0.4,
+                                                 max_concurrency=2, backoff_base=0.01))
+    monkeypatch.setattr(cve_importer, "SessionLocal", sessionmaker(bind=db.get_bind(), autoflush=False))
+
+    async def run():
+        gaps, running = [], True
+
+        async def ticker():
+            last = time.monotonic()
+            while running:
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        tick = asyncio.create_task(ticker())
+        events = [json.loads(event) async for event in cve_importer.import_all_cves_stream(results_per_page=20)]
+        running = False
+        await tick
+        return events, gaps
+
+    start = time.monotonic()
+    events, gaps = asyncio.run(run())
+
+    assert events[-1] == {"type": "done", "imported": len(CVE_IDS), "label": "Importación completada."}
+    # 6 peticiones a 2 por 0,4 s: al menos dos esperas del limitador...
+    assert time.monotonic() - start >= 0.8
+    # ...durante las que el loop sigue atendiendo otras tareas
+    assert max(gaps) < 0.2
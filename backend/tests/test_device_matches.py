@@ -0,0 +1,111 @@
+# backend/tests/test_device_matches.py
+from datetime import datetime, timezone
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+import app.models  # noqa: F401 (registra todos los modelos en Base.metadata)
+from app.models import Device, DeviceConfig, DeviceMatch, User, Vulnerability
+from app.models.cve_cpe import CveCpe
+from app.crud import device_matches as crud_device_matches
+from app.migrations import dedupe_device_matches
+
+CPE = "cpe:2.3:a:google:chrome:*:*:*:*:*:*:*:*"
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine, autoflush=False)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def configs(db):
+    user = User(username="u", email="u@example.org", hashed_password="x")
+    db.add(user)
+    db.flush()
+    device = Device(user_id=user.id, alias="pc")
+    db.add(device)
+    db.flush()
+    configs = [DeviceConfig(device_id=device.id, type="a", vendor="Google", product="Chrome", version=str(n)) for n in range(2)]
+    db.add_all(configs)
+    for n in range(5):
+        db.add(Vulnerability(cve_id=f"CVE-2024-000{n}"))
+        db.add(CveCpe(cve_name=f"CVE-2024-000{n}", cpe_uri=CPE))
+    db.commit()
+    return configs
+
+
+def match_row(config_id: int, cve_name: str, match_score: float = 80.0) -> dict:
+    return {
+        "device_config_id": config_id, "cve_name": cve_name, "cpe_uri": CPE,
+        "matched_vendor": "google", "matched_product": "chrome", "match_type": "product_match",
+        "match_score": match_score, "needs_review": False, "timestamp": datetime.now(timezone.utc),
+    }
+
+
+def test_upsert_keeps_solved_and_id(db, configs):
+    crud_device_matches.upsert_matches(db, [match_row(configs[0].id, "CVE-2024-0000", 70.0)])
+    db.commit()
+    match = db.query(DeviceMatch).one()
+    match.solved = True
+    db.commit()
+    match_id = match.id
+
+    crud_device_matches.upsert_matches(db, [match_row(configs[0].id, "CVE-2024-0000", 90.0)])
+    db.commit()
+
+    db.expire_all()
+    match = db.query(DeviceMatch).one()
+    assert (match.id, match.solved, match.match_score) == (match_id, True, 90.0)
+
+
+def test_same_cve_cpe_for_two_configs_gives_two_rows(db, configs):
+    crud_device_matches.upsert_matches(db, [match_row(c.id, "CVE-2024-0000") for c in configs])
+    db.commit()
+    assert sorted(m.device_config_id for m in db.query(DeviceMatch)) == sorted(c.id for c in configs)
+
+
+def test_upsert_in_chunks(db, configs, monkeypatch):
+    monkeypatch.setattr(crud_device_matches, "UPSERT_CHUNK_SIZE", 2)
+    rows = [match_row(configs[0].id, f"CVE-2024-000{n}") for n in range(5)]
+
+    assert crud_device_matches.upsert_matches(db, rows) == 5
+    db.commit()
+    assert db.query(DeviceMatch).count() == 5
+    # Repetir el bloque no duplica filas
+    crud_device_matches.upsert_matches(db, rows)
+    db.commit()
+    assert db.query(DeviceMatch).count() == 5
+
+
+def test_dedupe_migration_keeps_oldest_row_and_ors_solved(engine, db, configs):
+    # Estado anterior a la migración: sin índice único y con coincidencias repetidas
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_device_matches_config_cve_cpe"))
+    config_id = configs[0].id
+    for solved in (False, True, False):
+        db.add(DeviceMatch(device_config_id=config_id, cve_name="CVE-2024-0000", cpe_uri=CPE, solved=solved))
+    db.add(DeviceMatch(device_config_id=config_id, cve_name="CVE-2024-0001", cpe_uri=CPE, solved=False))
+    db.add(DeviceMatch(device_config_id=configs[1].id, cve_name="CVE-2024-0000", cpe_uri=CPE, solved=False))
+    db.commit()
+    oldest = min(m.id for m in db.query(DeviceMatch).filter_by(device_config_id=config_id, cve_name="CVE-2024-0000"))
+
+    dedupe_device_matches(engine)
+
+    db.expire_all()
+    rows = {(m.device_config_id, m.cve_name): (m.id, m.solved) for m in db.query(DeviceMatch)}
+    assert len(rows) == db.query(DeviceMatch).count() == 3
+    assert rows[(config_id, "CVE-2024-0000")] == (oldest, True)
+    assert rows[(config_id, "CVE-2024-0001")][1] is False
+    assert rows[(configs[1].id, "CVE-2024-0000")][1] is False
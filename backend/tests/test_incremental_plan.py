@@ -0,0 +1,78 @@
+# backend/tests/test_incremental_plan.py
+from datetime import datetime, timedelta
+from app.models import DeviceConfig, DeviceMatch, PlatformProduct
+from app.models.cve_cpe import CveCpe
+from app.services.matching_service import (
+    IMPORT_COMMIT_SLACK, config_fingerprint, match_platforms_for_device,
+    plan_incremental_configs, record_matched_configs,
+)
+from tests.test_cve_sync import CHROME, chrome_config, db, nvd_item, upsert  # noqa: F401 (fixtures)
+
+
+def add_config(db, device_id: int, product: str, last_matched_at=None, fingerprint=True) -> DeviceConfig:
+    config = DeviceConfig(device_id=device_id, type="a", vendor="Google", product=product, version="1.0")
+    if last_matched_at is not None:
+        config.last_matched_at = last_matched_at
+        config.fingerprint = config_fingerprint(config) if fingerprint else "otra"
+    db.add(config)
+    db.flush()
+    return config
+
+
+def test_plan_groups(db, chrome_config):
+    now = datetime.utcnow()
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})]))
+    imported_at = db.get(CveCpe, ("CVE-2024-0001", CHROME)).imported_at
+    device_id = chrome_config.device_id
+
+    never = add_config(db, device_id, "never")
+    edited = add_config(db, device_id, "edited", now, fingerprint=False)
+    before_import = add_config(db, device_id, "before", imported_at - timedelta(hours=1))
+    after_import = add_config(db, device_id, "after", imported_at + IMPORT_COMMIT_SLACK + timedelta(seconds=1))
+    db.commit()
+
+    since_by_config, skipped = plan_incremental_configs([never, edited, before_import, after_import], db)
+
+    assert since_by_config == {
+        never.id: None,
+        edited.id: None,
+        before_import.id: before_import.last_matched_at - IMPORT_COMMIT_SLACK,
+    }
+    assert skipped == [after_import]
+
+    # Regenerar el diccionario después del último matching obliga al matching completo
+    db.add(PlatformProduct(vendor="google", product="chrome", refreshed_at=imported_at + timedelta(days=1)))
+    db.commit()
+    since_by_config, skipped = plan_incremental_configs([before_import, after_import], db)
+    assert since_by_config == {before_import.id: None, after_import.id: None} and skipped == []
+
+
+def test_record_matched_configs_drops_matches_of_edited_configs(db, chrome_config):
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})]))
+    edited = add_config(db, chrome_config.device_id, "edited", datetime.utcnow(), fingerprint=False)
+    db.add_all([
+        DeviceMatch(device_config_id=edited.id, cve_name="CVE-2024-0001", cpe_uri=CHROME),
+        DeviceMatch(device_config_id=chrome_config.id, cve_name="CVE-2024-0001", cpe_uri=CHROME),
+    ])
+    db.commit()
+    matched_at = datetime.utcnow()
+
+    record_matched_configs([edited, chrome_config], matched_at, db)
+    db.commit()
+
+    assert [m.device_config_id for m in db.query(DeviceMatch)] == [chrome_config.id]
+    assert edited.fingerprint == config_fingerprint(edited) and edited.last_matched_at == matched_at
+    assert chrome_config.last_matched_at == matched_at
+
+
+def test_incremental_rematch_sees_rows_committed_after_the_previous_run_started(db, chrome_config):
+    upsert(db, nvd_item("CVE-2024-0001", [(CHROME, {})]))
+    imported_at = db.get(CveCpe, ("CVE-2024-0001", CHROME)).imported_at
+    # El matching anterior empezó después de fijar imported_at pero antes del commit: no vio la fila
+    chrome_config.last_matched_at = imported_at + timedelta(seconds=30)
+    chrome_config.fingerprint = config_fingerprint(chrome_config)
+    db.commit()
+
+    match_platforms_for_device(chrome_config.device_id, db, incremental=True)
+
+    assert [m.cve_name for m in db.query(DeviceMatch)] == ["CVE-2024-0001"]
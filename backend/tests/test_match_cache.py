@@ -0,0 +1,48 @@
+# backend/tests/test_match_cache.py
+import pytest
+from app.services import match_cache
+
+
+@pytest.fixture(autouse=True)
+def small_cache(monkeypatch):
+    monkeypatch.setattr(match_cache, "MATCH_CACHE_MAX_SIZE", 3)
+    match_cache.clear_match_cache()
+    yield
+    match_cache.clear_match_cache()
+
+
+def tag(index_generation: int = 0) -> tuple:
+    return (index_generation, match_cache.get_cve_generation())
+
+
+def test_bumping_the_cve_generation_misses():
+    old_tag = tag()
+    match_cache.store_match(("google", "chrome", "126"), old_tag, {"cpe_uri": "x"})
+    assert match_cache.get_cached_match(("google", "chrome", "126"), old_tag) == {"cpe_uri": "x"}
+
+    match_cache.bump_cve_generation()
+
+    assert tag() != old_tag
+    assert match_cache.get_cached_match(("google", "chrome", "126"), tag()) is None
+    # Una entrada guardada con la generación anterior tampoco vale con la nueva
+    match_cache.store_match(("google", "chrome", "126"), old_tag, {"cpe_uri": "x"})
+    assert match_cache.get_cached_match(("google", "chrome", "126"), tag()) is None
+    assert match_cache.get_cache_stats()["size"] == 0
+
+
+def test_index_generation_is_part_of_the_tag():
+    match_cache.store_match(("google", "chrome", "126"), tag(0), {})
+    assert match_cache.get_cached_match(("google", "chrome", "126"), tag(1)) is None
+
+
+def test_lru_evicts_the_least_recently_used():
+    for n in range(3):
+        match_cache.store_match((f"v{n}",), tag(), {"n": n})
+    # Leer v0 lo pasa al final: el siguiente en salir es v1
+    assert match_cache.get_cached_match(("v0",), tag()) == {"n": 0}
+
+    match_cache.store_match(("v3",), tag(), {"n": 3})
+    match_cache.store_match(("v4",), tag(), {"n": 4})
+
+    assert [match_cache.get_cached_match((f"v{n}",), tag()) for n in range(5)] == [{"n": 0}, None, None, {"n": 3}, {"n": 4}]
+    assert match_cache.get_cache_stats()["evictions"] >= 2
@@ -0,0 +1,53 @@
+# backend/tests/test_matching_index.py
+from app.services.matching_index import PhraseTrie, ProductCandidates
+
+
+def test_longest_phrase_wins():
+    trie = PhraseTrie()
+    trie.add("red", ["red"])
+    trie.add("red hat", ["redhat"])
+    trie.add("enterprise linux", ["linux"])
+
+    assert trie.longest_match("red hat enterprise linux server".split()) == ["redhat"]
+    assert trie.longest_match("red enterprise".split()) == ["red"]
+    assert trie.longest_match("blue hat".split()) is None
+
+
+def test_equal_length_phrases_prefer_the_earliest():
+    trie = PhraseTrie()
+    trie.add("mozilla", ["mozilla"])
+    trie.add("firefox", ["firefox"])
+
+    assert trie.longest_match("mozilla firefox".split()) == ["mozilla"]
+    assert trie.longest_match("firefox by mozilla".split()) == ["firefox"]
+
+
+def test_shortlist_keeps_the_exact_product():
+    candidates = ProductCandidates()
+    for n in range(300):
+        candidates.add(f"office {n}", f"office_{n}")
+    candidates.add("office", "office")
+    candidates.add("office 7", "repetido")
+
+    shortlist = candidates.shortlist("office", limit=10)
+
+    # Todos comparten los n-gramas de "office"; el idéntico a la consulta no se queda fuera
+    assert len(candidates.choices) == 301
+    assert candidates.choices.index("office") in shortlist
+    assert shortlist == sorted(shortlist) and len(shortlist) <= 11
+
+
+def test_shortlist_prefers_rare_grams():
+    candidates = ProductCandidates()
+    for n in range(100):
+        candidates.add(f"widget {n}", f"widget_{n}")
+    candidates.add("acrobat reader", "acrobat_reader")
+
+    shortlist = candidates.shortlist("acrobat", limit=5)
+
+    assert [candidates.products[i] for i in shortlist][:1] == ["acrobat_reader"]
+    # Con pocos candidatos se devuelven todos
+    few = ProductCandidates()
+    few.add("reader", "reader")
+    few.add("widget", "widget")
+    assert few.shortlist("acrobat") == [0, 1]
@@ -0,0 +1,99 @@
+# backend/tests/test_matching_jobs.py
+import threading
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.services import import_status_matching, matching_jobs, matching_service
+from app.services import matching_index
+from app.services.matching_index import MatchingIndex
+from app.services.matching_jobs import PRIORITY_FLEET, PRIORITY_INTERACTIVE, MatchingExecutor
+
+
+@pytest.fixture
+def blocked_executor():
+    """Ejecutor de un hilo cuyo primer trabajo (dispositivo 1) espera a que se libere."""
+    executor = MatchingExecutor(workers=1)
+    started, release, order = threading.Event(), threading.Event(), []
+
+    def run(job):
+        order.append(job.device_ids)
+        started.set()
+        release.wait(5)
+
+    executor._run = run
+    executor.submit([1])
+    assert started.wait(5)
+    yield executor, release, order
+    release.set()
+
+
+def test_interactive_jobs_go_before_fleet_jobs(blocked_executor):
+    executor, release, order = blocked_executor
+    executor.submit([2, 3], priority=PRIORITY_FLEET)
+    executor.submit([4], priority=PRIORITY_INTERACTIVE)
+    executor.submit([5], priority=PRIORITY_INTERACTIVE)
+    # Un dispositivo con trabajo activo no se vuelve a encolar
+    assert executor.submit([4]) is None
+
+    release.set()
+    executor._queue.join()
+
+    assert order == [[1], [4], [5], [2, 3]]
+    assert executor.get_job(4) is None
+
+
+def test_cancel_device_drops_it_from_a_fleet_job(blocked_executor):
+    executor, _, _ = blocked_executor
+    job = executor.submit([2, 3], priority=PRIORITY_FLEET)
+
+    assert executor.cancel_device(2)
+    assert job.is_dropped(2) and not job.is_dropped(3) and not job.cancelled
+    # Al retirar el último dispositivo se cancela el trabajo entero
+    assert executor.cancel_device(3)
+    assert job.cancelled
+    assert not executor.cancel_device(99)
+
+
+def test_dropped_devices_are_reported_as_cancelled(monkeypatch):
+    monkeypatch.setattr(matching_jobs, "SessionLocal", sessionmaker(bind=create_engine("sqlite://")))
+    seen = {}
+
+    def fake_match(device_ids, db, should_cancel, incremental, is_dropped):
+        seen.update({device_id: is_dropped(device_id) for device_id in device_ids})
+        return {"summary": {}, "dropped_devices": [d for d in device_ids if is_dropped(d)]}
+
+    monkeypatch.setattr(matching_service, "match_platforms_for_devices", fake_match)
+    job = matching_jobs.MatchingJob(0, [11, 12], PRIORITY_FLEET)
+    job.drop_device(11)
+
+    MatchingExecutor(workers=1)._run(job)
+
+    assert seen == {11: True, 12: False} and job.status == "done"
+    assert import_status_matching.get_matching_progress(11) == ["[CANCELLED]", "[DONE]"]
+    assert import_status_matching.get_matching_progress(12) == ["[DONE]"]
+
+
+def test_vendor_candidates_load_outside_the_lock(monkeypatch):
+    loading, release = threading.Event(), threading.Event()
+
+    def fake_products(db, vendor):
+        if vendor == "slow":
+            loading.set()
+            release.wait(5)
+        return [(vendor, vendor, None)]
+
+    monkeypatch.setattr(matching_index.crud_platform_products, "get_vendor_products", fake_products)
+    index = MatchingIndex(generation=0)
+    slow = threading.Thread(target=index.get_vendor_candidates, args=("slow", None))
+    slow.start()
+    assert loading.wait(5)
+
+    # Otro vendor se resuelve mientras el primero sigue cargando
+    fast = threading.Thread(target=index.get_vendor_candidates, args=("fast", None))
+    fast.start()
+    fast.join(2)
+    assert not fast.is_alive() and "fast" in index.vendor_candidates
+
+    release.set()
+    slow.join(5)
+    assert index.get_vendor_candidates("slow", None) is index.vendor_candidates["slow"]
@@ -0,0 +1,42 @@
+# backend/tests/test_migrations.py
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+import app.models  # noqa: F401 (registra todos los modelos en Base.metadata)
+from app.models import Vulnerability
+from app.models.cve_cpe import CveCpe
+from app.crud import sync_watermarks as crud_watermarks
+from app import migrations
+from app.services.utils import version_sort_key
+
+
+def test_version_range_keys_backfill_runs_once(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(Vulnerability(cve_id="CVE-2024-0001"))
+    # Filas anteriores a las columnas de claves: todas con las claves a NULL
+    for n in range(5):
+        db.add(CveCpe(cve_name="CVE-2024-0001", cpe_uri=f"cpe:2.3:a:acme:widget{n}:*:*:*:*:*:*:*:*",
+                      version_start_including="1.0", version_end_excluding=f"{n + 2}.0"))
+    db.add(CveCpe(cve_name="CVE-2024-0001", cpe_uri="cpe:2.3:a:acme:wildcard:*:*:*:*:*:*:*:*", version_end_including="*"))
+    db.commit()
+    monkeypatch.setattr(migrations, "BACKFILL_BATCH_SIZE", 2)
+
+    migrations.backfill_version_range_keys(engine)
+
+    db.expire_all()
+    keys = {row.cpe_uri: (row.version_start_key, row.version_end_key, row.version_end_inclusive) for row in db.query(CveCpe)}
+    for n in range(5):
+        assert keys[f"cpe:2.3:a:acme:widget{n}:*:*:*:*:*:*:*:*"] == (version_sort_key("1.0"), version_sort_key(f"{n + 2}.0"), False)
+    assert keys["cpe:2.3:a:acme:wildcard:*:*:*:*:*:*:*:*"] == (None, None, None)
+    assert crud_watermarks.get_watermark(db, migrations.VERSION_RANGE_KEYS_MARKER) is not None
+
+    # Con la marca guardada no se vuelve a recorrer cve_cpe
+    db.query(CveCpe).update({CveCpe.version_start_key: None, CveCpe.version_end_key: None})
+    db.commit()
+    migrations.backfill_version_range_keys(engine)
+    assert db.query(CveCpe).filter(CveCpe.version_start_key.isnot(None)).count() == 0
+    db.close()
+    engine.dispose()
@@ -0,0 +1,132 @@
+# backend/tests/test_nvd_client.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from app.services import nvd
+from app.services.nvd import NvdClient, SlidingWindowLimiter
+
+CVE_IDS = [f"CVE-2024-{n:05d}" for n in range(1, 48)]
+
+
+class FakeNvdHandler(BaseHTTPRequestHandler):
+    """NVD de pruebas: pagina CVE_IDS y responde 503 a la primera petición de cada página."""
+
+    lock = threading.Lock()
+    seen = set()
+    requests = []
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        start = int(params.get("startIndex", 0))
+        per_page = int(params.get("resultsPerPage", 2000))
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append((time.monotonic(), params, self.headers.get("apiKey")))
+            first_time = start not in cls.seen
+            cls.seen.add(start)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if first_time and start > 0:
+                self.send_response(503)
+                self.end_headers()
+                return
+            time.sleep(0.05)
+            if "cveId" in params:
+                found = [cve_id for cve_id in CVE_IDS if cve_id == params["cveId"]]
+                body = json.dumps({"totalResults": len(found), "vulnerabilities": [{"cve": {"id": cve_id}} for cve_id in found]}).encode()
+            else:
+                body = json.dumps({
+                    "startIndex": start,
+                    "resultsPerPage": per_page,
+                    "totalResults": len(CVE_IDS),
+                    "vulnerabilities": [{"cve": {"id": cve_id}} for cve_id in CVE_IDS[start:start + per_page]],
+                }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_nvd():
+    FakeNvdHandler.seen = set()
+    FakeNvdHandler.requests = []
+    FakeNvdHandler.in_flight = FakeNvdHandler.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNvdHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/rest/json/cves/2.0"
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_pages_with_retries(fake_nvd):
+    client = NvdClient(base_url=fake_nvd, api_key="test-key", rate_limit=100, rate_window=1,
+                       max_concurrency=3, backoff_base=0.01)
+
+    pages = list(client.iter_pages(results_per_page=10))
+
+    ids = [item["cve"]["id"] for page in pages for item in page["vulnerabilities"]]
+    assert ids == CVE_IDS
+    assert [page["startIndex"] for page in pages] == [0, 10, 20, 30, 40]
+    # Cada página salvo la primera falla una vez con 503 y se reintenta
+    assert len(FakeNvdHandler.requests) == 1 + 4 * 2
+    assert all(api_key == "test-key" for _, _, api_key in FakeNvdHandler.requests)
+    assert 1 < FakeNvdHandler.max_in_flight <= 3
+
+
+def max_in_window(times: list[float], window: float) -> int:
+    """Máximo de instantes dentro de cualquier intervalo de `window` segundos."""
+    times = sorted(times)
+    return max(sum(1 for t in times[i:] if t - start < window) for i, start in enumerate(times))
+
+
+def test_rate_limit_is_respected(fake_nvd):
+    # 3 peticiones por 0,5 s: 4 páginas, 3 de ellas con un reintento = 7 peticiones en 3 ventanas
+    client = NvdClient(base_url=fake_nvd, api_key=None, rate_limit=3, rate_window=0.5,
+                       max_concurrency=4, backoff_base=0.01)
+    start = time.monotonic()
+    list(client.iter_pages(results_per_page=15))
+    assert len(FakeNvdHandler.requests) == 7
+    assert time.monotonic() - start >= 1.0
+    # Ninguna ventana de rate_window recibe más de rate_limit peticiones
+    # (20 ms de margen por la latencia entre el limitador y el servidor)
+    received = [t for t, _, _ in FakeNvdHandler.requests]
+    assert max_in_window(received, 0.5 - 0.02) <= 3
+
+
+def test_sliding_window_never_exceeds_the_limit():
+    limiter = SlidingWindowLimiter(limit=5, window=0.3)
+    times = []
+    for _ in range(12):
+        limiter.acquire()
+        times.append(time.monotonic())
+    assert max_in_window(times, 0.3) == 5
+    # 5 por ventana: la 11.ª petición ya está en la tercera ventana
+    assert times[-1] - times[0] >= 0.6
+
+
+def test_cves_by_id_are_fetched_concurrently(fake_nvd, monkeypatch):
+    monkeypatch.setattr(nvd, "client", NvdClient(base_url=fake_nvd, api_key="test-key", rate_limit=100,
+                                                 rate_window=1, max_concurrency=4, backoff_base=0.01))
+    wanted = CVE_IDS[3:11] + ["CVE-1999-99999"]
+
+    data = nvd.get_cves_by_id(wanted)
+
+    # Orden de entrada, sin el CVE inexistente
+    assert [item["cve"]["id"] for item in data["vulnerabilities"]] == CVE_IDS[3:11]
+    assert len(FakeNvdHandler.requests) == len(wanted)
+    assert 1 < FakeNvdHandler.max_in_flight <= 4
@@ -0,0 +1,28 @@
+# backend/tests/test_version_keys.py
+from itertools import product
+from packaging.version import Version
+from app.services.utils import version_sort_key, version_range_keys
+from app.services.matching_service import version_in_range
+
+
+def test_version_sort_key_follows_pep440_order():
+    versions = ["1.0.dev1", "1.0a1", "1.0b2", "1.0rc1", "1.0", "1.0.0", "1.0.post1", "1.0.1", "1.10", "2019.1", "1!0.1"]
+    for a, b in product(versions, versions):
+        assert (version_sort_key(a) < version_sort_key(b)) == (Version(a) < Version(b))
+        assert (version_sort_key(a) == version_sort_key(b)) == (Version(a) == Version(b))
+
+
+def test_version_sort_key_fallback_for_vendor_versions():
+    assert version_sort_key("8.0(1)") == version_sort_key("8.0.1")
+    assert version_sort_key("12.2.55") < version_sort_key("12.2(55)SE") < version_sort_key("12.2.56")
+    assert version_sort_key("*") is None
+    assert version_sort_key("") is None
+
+
+def test_version_range_keys_and_in_range():
+    bounds = version_range_keys("100.0", None, None, "127.0")
+    assert bounds["version_start_inclusive"] is True
+    assert bounds["version_end_inclusive"] is False
+    assert version_in_range("126.0.6478.127", "100.0", None, None, "127.0")
+    assert not version_in_range("127.0", "100.0", None, None, "127.0")
+    assert version_in_range("12.2(55)SE", None, None, "12.2.56", None)
@@ -49,6 +49,9 @@ export default function MatchingProgressModal({ deviceId, onClose }) {
         return;
       }
 
+      // Tiempos por fase del matching: no se muestran en el modal
+      if (event.data.startsWith("[TIMINGS]")) return;
+
       const match = event.data.match(/(\d+)\s*\/\s*(\d+)/);
       if (match) {
         setProgress(parseInt(match[1], 10));
@@ -66,6 +69,10 @@ export default function MatchingProgressModal({ deviceId, onClose }) {
   };
 
   const stopMatching = () => {
+    fetch(API_ROUTES.DEVICES.MATCH_CANCEL(deviceId), {
+      method: "POST",
+      credentials: "include",
+    }).catch(() => {});
     eventSourceRef.current?.close();
     localStorage.removeItem(`matching_status_${deviceId}`);
     setStatus("aborted");
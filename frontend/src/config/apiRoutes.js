@@ -48,6 +48,7 @@ export const API_ROUTES = {
     MATCH_PROGRESS: (id) => `${API_BASE_URL}/devices/${id}/match-platforms/progress`,
     MATCH_STATUS: (deviceId) => `${API_BASE_URL}/devices/${deviceId}/match-status`,
     MATCH_START: (id) => `${API_BASE_URL}/devices/${id}/match-start`,
+    MATCH_CANCEL: (id) => `${API_BASE_URL}/devices/${id}/match-cancel`,
     GET_LAST_MATCHING: (id) => `${API_BASE_URL}/devices/${id}/last-matching`,
     MATCH_DELETE: (deviceId) => `${API_BASE_URL}/devices/${deviceId}/match-platforms`,
   },